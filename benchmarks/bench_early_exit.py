@@ -0,0 +1,73 @@
+"""
+Recall/speed trade-off of early-exit inference against full inference.
+
+Calibrates exit heads on synthetic legal sentences (a mix of citing and plain ones, see
+--citation-fraction) for each --target-recall, and reports exits per layer, the share of layer
+computations done, recall and speed-up on a held-out set. With `--random-weights` a BERT-base
+sized model with random weights is used instead of the configured one (the configured tokenizer is
+still needed); the heads then only learn to imitate noise, so only the mechanics are meaningful.
+
+    python benchmarks/bench_early_exit.py --sentences 400 --target-recall 0.99 0.999
+"""
+
+import argparse
+import random
+
+from transformers import BertConfig, BertForTokenClassification
+
+from cit_parser.constants import ALL_LABELS
+from cit_parser.early_exit import calibrate, evaluate
+from cit_parser.invoke import _get_model, _get_tokenizer
+
+CITING = [
+    "The court in Brown v. Board of Education, 347 U.S. 483 (1954), rejected that view.",
+    "Plaintiff seeks relief under 42 U.S.C. § 1983 for the alleged deprivation.",
+    "Id. at 495.",
+    "See also Smith v. Jones, 12 F.3d 45, 47 (9th Cir. 1994).",
+    "Cal. Civ. Code § 1714 imposes a general duty of care.",
+]
+PLAIN = [
+    "The motion to dismiss is denied.",
+    "Defendant does not dispute these facts, which are taken from the complaint.",
+    "The parties appeared for oral argument on March 3.",
+    "We therefore affirm the judgment of the district court.",
+    "Plaintiff was employed as a warehouse supervisor for eleven years.",
+    "The record does not show that the notice was ever received.",
+]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sentences", type=int, default=400)
+    parser.add_argument("--citation-fraction", type=float, default=0.2)
+    parser.add_argument("--target-recall", type=float, nargs="+", default=[0.99])
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--random-weights", action="store_true")
+    args = parser.parse_args()
+
+    tokenizer = _get_tokenizer()
+    if args.random_weights:
+        model = BertForTokenClassification(
+            BertConfig(num_labels=len(ALL_LABELS))
+        ).eval()
+    else:
+        model = _get_model()
+
+    rng = random.Random(0)
+    sentences = [
+        rng.choice(CITING if rng.random() < args.citation_fraction else PLAIN)
+        for _ in range(args.sentences)
+    ]
+    split = len(sentences) * 4 // 5
+    train, held = sentences[:split], sentences[split:]
+
+    for target in args.target_recall:
+        heads = calibrate(
+            train, model, tokenizer, target_recall=target, batch_size=args.batch_size
+        )
+        report = evaluate(held, heads, model, tokenizer, args.batch_size)
+        print(f"target recall {target}: {report}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Effective tokens/s of packed inputs against length-sorted padded batches.
+
+Labels synthetic sentences both ways and reports real (non-padding) tokens per second. Most
+sentences are 10-30 tokens long, with a tail of longer ones (--long-fraction); pass
+--sentences-per-call to label them a document's worth at a time, as `invoke()` does. With
+`--random-weights` a BERT-base sized model with random weights is used instead of the configured
+one.
+
+    python benchmarks/bench_packing.py --sentences 300 --sentences-per-call 10 --random-weights
+"""
+
+import argparse
+import random
+import time
+from types import SimpleNamespace
+
+import torch
+from transformers import BertConfig, BertForTokenClassification
+
+from cit_parser.constants import ALL_LABELS
+from cit_parser.invoke import _get_model, _get_tokenizer
+from cit_parser.packing import predict_packed
+
+
+def predict_padded(sequences, model, tokenizer, batch_size):
+    """
+    What `infer_labels_batch` does: sort by length, pad each batch to its longest sequence.
+    """
+    order = sorted(range(len(sequences)), key=lambda i: len(sequences[i]))
+    for b in range(0, len(order), batch_size):
+        batch = [
+            [tokenizer.cls_token_id] + sequences[i] + [tokenizer.sep_token_id]
+            for i in order[b : b + batch_size]
+        ]
+        width = max(len(ids) for ids in batch)
+        input_ids = torch.full((len(batch), width), tokenizer.pad_token_id)
+        attention_mask = torch.zeros((len(batch), width), dtype=torch.long)
+        for row, ids in enumerate(batch):
+            input_ids[row, : len(ids)] = torch.tensor(ids)
+            attention_mask[row, : len(ids)] = 1
+        with torch.no_grad():
+            model(input_ids=input_ids, attention_mask=attention_mask)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sentences", type=int, default=1000)
+    parser.add_argument("--min-len", type=int, default=10)
+    parser.add_argument("--max-len", type=int, default=30)
+    parser.add_argument("--long-fraction", type=float, default=0.15)
+    parser.add_argument("--long-max-len", type=int, default=200)
+    parser.add_argument("--sentences-per-call", type=int, default=0)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--packed-rows", type=int, default=4)
+    parser.add_argument("--max-length", type=int, default=512)
+    parser.add_argument("--random-weights", action="store_true")
+    args = parser.parse_args()
+
+    if args.random_weights:
+        model = BertForTokenClassification(
+            BertConfig(num_labels=len(ALL_LABELS))
+        ).eval()
+        tokenizer = SimpleNamespace(cls_token_id=101, sep_token_id=102, pad_token_id=0)
+    else:
+        model, tokenizer = _get_model(), _get_tokenizer()
+
+    rng = random.Random(0)
+    sequences = [
+        [
+            rng.randrange(1000, 20000)
+            for _ in range(rng.randint(args.min_len, args.max_len))
+        ]
+        for _ in range(args.sentences)
+    ]
+    tokens = sum(len(s) for s in sequences)
+
+    predict_padded(sequences[:32], model, tokenizer, args.batch_size)  # warm-up
+    start = time.perf_counter()
+    predict_padded(sequences, model, tokenizer, args.batch_size)
+    padded = tokens / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    predict_packed(sequences, model, tokenizer, args.max_length, args.packed_rows)  # pyright: ignore
+    packed = tokens / (time.perf_counter() - start)
+
+    print(f"padded: {padded:>10.0f} tokens/s")
+    print(f"packed: {packed:>10.0f} tokens/s ({packed / padded:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Sequential `invoke()` against the staged pipeline, on the same synthetic corpus.
+
+Reports documents/s for both and the pipeline's per-stage busy time and overlap. Needs the spaCy
+model; with `--random-weights` a BERT-base sized model with random weights is used instead of the
+configured one (the configured tokenizer is still needed).
+
+    python benchmarks/bench_pipeline.py --docs 200 --batch-size 32
+"""
+
+import argparse
+import random
+import time
+
+from transformers import BertConfig, BertForTokenClassification
+
+from cit_parser.constants import ALL_LABELS
+from cit_parser.corpus import Document
+from cit_parser.invoke import _get_model, _get_tokenizer, invoke
+from cit_parser.pipeline import PipelineReport, run_pipeline
+
+SENTENCES = [
+    "The court in Brown v. Board of Education, 347 U.S. 483 (1954), rejected that view.",
+    "Plaintiff seeks relief under 42 U.S.C. § 1983 for the alleged deprivation.",
+    "Id. at 495.",
+    "The motion to dismiss is denied.",
+    "See also Smith v. Jones, 12 F.3d 45, 47 (9th Cir. 1994).",
+    "Defendant does not dispute these facts, which are taken from the complaint.",
+]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--docs", type=int, default=100)
+    parser.add_argument("--sentences-per-doc", type=int, default=40)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--queue-size", type=int, default=8)
+    parser.add_argument("--random-weights", action="store_true")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    docs = [
+        Document(
+            id=str(i),
+            text=" ".join(rng.choices(SENTENCES, k=args.sentences_per_doc)),
+        )
+        for i in range(args.docs)
+    ]
+    model = (
+        BertForTokenClassification(BertConfig(num_labels=len(ALL_LABELS))).eval()
+        if args.random_weights
+        else _get_model()
+    )
+    tokenizer = _get_tokenizer()
+    invoke(docs[0].text, model, tokenizer)  # warm-up
+
+    start = time.perf_counter()
+    for doc in docs:
+        invoke(doc.text, model, tokenizer, args.batch_size)
+    sequential = time.perf_counter() - start
+
+    report = PipelineReport()
+    for _ in run_pipeline(
+        docs, model, tokenizer, args.batch_size, args.queue_size, report=report
+    ):
+        pass
+
+    print(f"sequential: {args.docs / sequential:.1f} docs/s")
+    print(f"pipeline:   {args.docs / report.wall_seconds:.1f} docs/s")
+    print(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Throughput of `ModelPool` as the number of replicas grows from 1 to N.
+
+Runs forward passes of the configured model over sentence-sized inputs and reports sentences/s
+per replica count. With `--random-weights` a BERT-base sized model with random weights is used
+instead, so the benchmark runs without network access or a downloaded model.
+
+    python benchmarks/bench_pool.py --max-replicas 8 --pin
+"""
+
+import argparse
+import os
+import time
+
+import torch
+from transformers import BertConfig, BertForTokenClassification
+
+from cit_parser.constants import ALL_LABELS
+from cit_parser.pool import ModelPool
+
+
+def _forward(replica, input_ids: torch.Tensor) -> None:
+    with torch.no_grad():
+        replica.model(input_ids=input_ids)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--max-replicas", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--threads", type=int, default=1)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--seq-len", type=int, default=48)
+    parser.add_argument("--pin", action="store_true")
+    parser.add_argument("--random-weights", action="store_true")
+    args = parser.parse_args()
+
+    model = None
+    tokenizer = None
+    if args.random_weights:
+        model = BertForTokenClassification(
+            BertConfig(num_labels=len(ALL_LABELS))
+        ).eval()
+        tokenizer = object()  # only copied by the pool, never called here
+
+    input_ids = torch.randint(1000, 20000, (1, args.seq_len))
+
+    print(f"{'replicas':>8} {'threads':>7} {'sent/s':>10} {'speedup':>8}")
+    baseline = None
+    for replicas in range(1, args.max_replicas + 1):
+        with ModelPool(
+            replicas=replicas,
+            threads=args.threads,
+            pin=args.pin,
+            model=model,
+            tokenizer=tokenizer,  # pyright: ignore
+        ) as pool:
+            for f in [pool.submit(_forward, input_ids) for _ in range(replicas * 2)]:
+                f.result()  # warm-up
+
+            start = time.perf_counter()
+            futures = [pool.submit(_forward, input_ids) for _ in range(args.requests)]
+            for f in futures:
+                f.result()
+            rate = args.requests / (time.perf_counter() - start)
+
+        baseline = baseline or rate
+        print(f"{replicas:>8} {args.threads:>7} {rate:>10.1f} {rate / baseline:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+Postprocessing of label predictions: internal slotted records against Pydantic models.
+
+Decodes synthetic model output (a mix of case, statute and citation-free sentences, with
+WordPiece-like tokens) into citations both ways, then groups the citations with
+`Authorities.construct`. Reports the time per stage and the memory allocated along the way. No
+model is needed.
+
+    python benchmarks/bench_records.py --sentences 20000
+"""
+
+import argparse
+import random
+import re
+import time
+import tracemalloc
+from typing import Callable, List, Tuple
+
+from cit_parser.constants import LABEL_MAP
+from cit_parser.invoke import decode_batch, sentences_to_citations
+from cit_parser.postprocess import _aggregate, shift_citation
+from cit_parser.types import (
+    Authorities,
+    CaselawCitation,
+    LabelPrediction,
+    StatuteCitation,
+)
+
+_TOKEN = re.compile(r"\w+|[^\w\s]")
+
+# (text, label) parts of each kind of sentence; None is "O".
+_CASE = [
+    ("The court relied on", None),
+    ("{party} v. {party}", "CASE_NAME"),
+    (",", None),
+    ("{volume}", "VOLUME"),
+    ("{reporter}", "REPORTER"),
+    ("{page}", "PAGE"),
+    (",", None),
+    ("{pin}", "PIN"),
+    ("(", None),
+    ("{year}", "YEAR"),
+    (") for this point .", None),
+]
+_STATUTE = [
+    ("Relief is available under", None),
+    ("42", "TITLE"),
+    ("U.S.C.", "CODE"),
+    ("§", None),
+    ("{section}", "SECTION"),
+    ("when the defendant acted under color of law .", None),
+]
+_PLAIN = [("The parties dispute whether the contract was ever formed at all .", None)]
+
+
+def _sentence(rng: random.Random) -> Tuple[str, List[str], List[int], List[List[int]]]:
+    parts = rng.choice([_CASE, _STATUTE, _PLAIN, _PLAIN])
+    values = {
+        "party": rng.choice(["Brown", "Board", "Roe", "Wade", "Miranda", "Arizona"]),
+        "volume": rng.randint(1, 600),
+        "reporter": rng.choice(["U.S.", "F.3d", "F. Supp. 2d"]),
+        "page": rng.randint(1, 1500),
+        "pin": rng.randint(1, 1500),
+        "year": rng.randint(1900, 2024),
+        "section": rng.randint(1, 9999),
+    }
+    text = ""
+    tokens, label_ids, offsets = ["[CLS]"], [LABEL_MAP["O"]], [[0, 0]]
+    for template, label in parts:
+        part = template.format(**values)
+        base = len(text) + (1 if text else 0)
+        text = f"{text} {part}" if text else part
+        for i, match in enumerate(_TOKEN.finditer(part)):
+            # Split long words into WordPiece-like pieces of up to four characters.
+            for j in range(0, len(match.group()), 4):
+                piece = match.group()[j : j + 4]
+                tokens.append(piece if not j else f"##{piece}")
+                tag = "O" if label is None else f"{'I' if i or j else 'B'}-{label}"
+                label_ids.append(LABEL_MAP[tag])
+                start = base + match.start() + j
+                offsets.append([start, start + len(piece)])
+    tokens.append("[SEP]")
+    label_ids.append(LABEL_MAP["O"])
+    offsets.append([0, 0])
+    return text, tokens, label_ids, offsets
+
+
+def _pydantic_citations(sentences, tokens, label_ids, offsets):
+    """
+    The same work with a validated Pydantic model at every step, as before `records`.
+    """
+    predictions = [
+        [
+            LabelPrediction(token=token.replace("##", ""), label=label, start=s, end=e)
+            for token, label, (s, e) in (
+                (t, _LABELS[i], span) for t, i, span in zip(row, ids, spans)
+            )
+            if token not in ("[CLS]", "[SEP]", "[PAD]") and label != "O" and s != e
+        ]
+        for row, ids, spans in zip(tokens, label_ids, offsets)
+    ]
+    res = []
+    for (offset, text), labels in zip(sentences, predictions):
+        entities = [
+            LabelPrediction(token=e.token, label=e.label, start=e.start, end=e.end)
+            for e in _aggregate(labels, text)
+        ]
+        if any(e.label == "CASE_NAME" for e in entities):
+            cit = CaselawCitation.from_token_label_pairs(entities)
+        elif any(e.label == "SECTION" for e in entities):
+            cit = StatuteCitation.from_token_label_pairs(entities)
+        else:
+            cit = None
+        if cit:
+            res.append(shift_citation(cit, offset))
+    return res
+
+
+def _record_citations(sentences, tokens, label_ids, offsets):
+    return sentences_to_citations(sentences, decode_batch(tokens, label_ids, offsets))
+
+
+_LABELS = {i: label for label, i in LABEL_MAP.items()}
+
+
+def _measure(label: str, n: int, fn: Callable[[], object]) -> object:
+    start = time.perf_counter()
+    res = fn()
+    elapsed = time.perf_counter() - start
+    # A second, traced run for memory: tracing slows allocation down too much to time it.
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(
+        f"{label:<26} {elapsed:8.3f}s {n / elapsed:12,.0f} sentences/s "
+        f"{peak / 2**20:8.1f} MB peak"
+    )
+    return res
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sentences", type=int, default=20_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    sentences, tokens, label_ids, offsets = [], [], [], []
+    position = 0
+    for _ in range(args.sentences):
+        text, row, ids, spans = _sentence(rng)
+        sentences.append((position, text))
+        tokens.append(row)
+        label_ids.append(ids)
+        offsets.append(spans)
+        position += len(text) + 1
+    inputs = (sentences, tokens, label_ids, offsets)
+    n = args.sentences
+
+    print(f"{n} sentences, {sum(map(len, tokens))} tokens")
+    # Untimed warm-up, e.g. of the normalization caches.
+    _pydantic_citations(*inputs)
+    _record_citations(*inputs)
+
+    baseline = _measure(
+        "pydantic: decode+build", n, lambda: _pydantic_citations(*inputs)
+    )
+    records = _measure("records: decode+build", n, lambda: _record_citations(*inputs))
+    assert [c.model_dump() for c in baseline] == [c.model_dump() for c in records]  # pyright: ignore
+    _measure("construct authorities", n, lambda: Authorities.construct(records))  # pyright: ignore
+    print(f"{len(records)} citations")  # pyright: ignore
+
+
+if __name__ == "__main__":
+    main()
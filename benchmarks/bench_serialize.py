@@ -0,0 +1,94 @@
+"""
+JSONL export/import of citations: `serialize` versus per-object Pydantic.
+
+    python benchmarks/bench_serialize.py --n 200000
+"""
+
+import argparse
+import io
+import random
+import time
+from typing import Callable, List
+
+from pydantic import TypeAdapter
+
+from cit_parser import CaselawCitation, StatuteCitation
+from cit_parser.serialize import read_citations, write_citations
+from cit_parser.types import Citation
+
+
+def _citations(n: int) -> List[Citation]:
+    rng = random.Random(0)
+    res: List[Citation] = []
+    for i in range(n):
+        if i % 2:
+            res.append(
+                CaselawCitation(
+                    case_name="Brown v. Board of Education",
+                    volume=rng.randint(1, 999),
+                    reporter=rng.choice(["U.S.", "F.3d", "F. Supp. 2d"]),
+                    starting_page=rng.randint(1, 2000),
+                    year=rng.randint(1900, 2024),
+                    start=i * 10,
+                    end=i * 10 + 9,
+                )
+            )
+        else:
+            res.append(
+                StatuteCitation(
+                    title="42",
+                    code="U.S.C.",
+                    section=str(rng.randint(1, 9999)),
+                    start=i * 10,
+                    end=i * 10 + 9,
+                )
+            )
+    return res
+
+
+def _time(label: str, n: int, fn: Callable[[], object]) -> float:
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {elapsed:8.3f}s {n / elapsed:12,.0f} cit/s")
+    return elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--n", type=int, default=100_000)
+    args = parser.parse_args()
+
+    citations = _citations(args.n)
+    adapter: TypeAdapter[Citation] = TypeAdapter(Citation)
+
+    def pydantic_write() -> str:
+        return "".join(c.model_dump_json() + "\n" for c in citations)
+
+    def fast_write() -> str:
+        buf = io.StringIO()
+        write_citations(citations, buf)
+        return buf.getvalue()
+
+    slow_out = pydantic_write()
+    fast_out = fast_write()
+
+    write_slow = _time("write (model_dump_json)", args.n, pydantic_write)
+    write_fast = _time("write (serialize)", args.n, fast_write)
+    read_slow = _time(
+        "read (validate_json)",
+        args.n,
+        lambda: [adapter.validate_json(line) for line in slow_out.splitlines()],
+    )
+    read_fast = _time(
+        "read (serialize)",
+        args.n,
+        lambda: list(read_citations(io.StringIO(fast_out))),
+    )
+    print(
+        f"speedup: write {write_slow / write_fast:.1f}x, read {read_slow / read_fast:.1f}x"
+    )
+
+
+if __name__ == "__main__":
+    main()
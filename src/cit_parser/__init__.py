@@ -1,3 +1,5 @@
 from .types import *  # noqa
 from .invoke import *  # noqa
 from .postprocess import *  # noqa
+from .windowing import *  # noqa
+from .cascade import *  # noqa
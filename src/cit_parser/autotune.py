@@ -0,0 +1,425 @@
+"""
+Batch sizes tuned to the machine: probe, save, reuse.
+
+The batch size that maximizes throughput depends on the number of cores, the memory bandwidth, the
+device and the sequence length, so a single hardcoded value is too small on big hosts and runs
+out of memory on small ones. `autotune` probes the model with synthetic batches for a few
+sequence-length buckets, doubling the batch size while throughput still improves, and keeps per
+bucket the fastest batch size whose latency stays within the SLO and whose peak memory stays
+below the ceiling. The resulting `BatchProfile` is saved as JSON and reused across runs.
+
+`infer_labels_tuned` then cuts every length-sorted run of sentences into batches sized for their
+longest sentence, and `observe` halves a bucket's batch size online if live batches breach the SLO.
+"""
+
+import os
+import resource
+import statistics
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple, Union
+
+import torch
+from pydantic import BaseModel
+from transformers import AutoModelForTokenClassification, PreTrainedTokenizerFast
+from wasabi import msg
+
+from . import metrics
+from .checkpoint import atomic_open, model_revision
+from .corpus import Backend
+from .invoke import (
+    DEVICE,
+    _cached,
+    _get_model,
+    _get_tokenizer,
+    _is_truncated,
+    _record_batch,
+    _special_ids,
+    batch_tokens,
+    decode_batch,
+    predict_batch,
+    segment,
+    sentences_to_citations,
+)
+from .metrics import timed
+from .records import Label, label_models
+from .types import Citation, LabelPrediction
+from .windowing import _max_length
+
+PathLike = Union[str, os.PathLike]
+
+DEFAULT_BUCKETS = (16, 32, 64, 128, 256, 512)
+DEFAULT_SLO_MS = 250.0
+DEFAULT_MAX_BATCH_SIZE = 256
+
+# Doubling the batch size must improve throughput by this much to count as an improvement.
+_MIN_GAIN = 1.05
+
+# Replicas share one profile; `observe` must not let two of them halve a bucket from the same value.
+_OBSERVE_LOCK = threading.Lock()
+
+
+class BucketProfile(BaseModel):
+    """
+    The batch size chosen for sequences of up to `max_tokens` tokens, and what it measured.
+    """
+
+    max_tokens: int
+    batch_size: int
+    latency_ms: float
+    tokens_per_second: float
+    peak_memory_mb: float
+    within_limits: bool = True
+
+
+class BatchProfile(BaseModel):
+    """
+    Tuned batch sizes per sequence-length bucket, and the conditions they were tuned under.
+    """
+
+    model_revision: str
+    device: str
+    threads: int
+    slo_ms: float
+    memory_limit_mb: Optional[float] = None
+    buckets: List[BucketProfile]
+
+    def bucket(self, n_tokens: int) -> BucketProfile:
+        """
+        The smallest bucket holding `n_tokens`-token sequences (the largest for longer ones).
+        """
+        for bucket in self.buckets:
+            if n_tokens <= bucket.max_tokens:
+                return bucket
+        return self.buckets[-1]
+
+    def batch_size(self, n_tokens: int) -> int:
+        return self.bucket(n_tokens).batch_size
+
+    def observe(self, n_tokens: int, batch_size: int, latency_ms: float) -> None:
+        """
+        Online correction: a full-size batch slower than the SLO halves its bucket's batch size.
+        Safe to call from several replicas at once.
+        """
+        bucket = self.bucket(n_tokens)
+        with _OBSERVE_LOCK:
+            if (
+                latency_ms > self.slo_ms
+                and batch_size >= bucket.batch_size
+                and bucket.batch_size > 1
+            ):
+                bucket.batch_size //= 2
+                msg.warn(
+                    f"Batch of {batch_size} x {n_tokens} tokens took {latency_ms:.0f}ms; "
+                    f"batch size for <= {bucket.max_tokens} tokens lowered to "
+                    f"{bucket.batch_size}."
+                )
+
+    def matches(
+        self, model: AutoModelForTokenClassification, threads: Optional[int] = None
+    ) -> bool:
+        """
+        Whether the profile was tuned for this model, on this device and with the `threads`
+        torch threads the replicas will run with (by default, the current thread count).
+        """
+        if threads is None:
+            threads = torch.get_num_threads()
+        return (self.model_revision, self.device, self.threads) == (
+            model_revision(model),
+            str(DEVICE),
+            threads,
+        )
+
+    @classmethod
+    def load(cls, path: PathLike) -> "BatchProfile":
+        return cls.model_validate_json(Path(path).read_text())
+
+    def save(self, path: PathLike) -> None:
+        with atomic_open(path) as f:
+            f.write(self.model_dump_json(indent=2))
+
+    def __str__(self) -> str:
+        rows = [
+            f"<= {b.max_tokens:>4} tokens: batch {b.batch_size:>4}, {b.latency_ms:8.1f}ms, "
+            f"{b.tokens_per_second:10.0f} tokens/s, {b.peak_memory_mb:8.0f}MB peak"
+            + ("" if b.within_limits else " (over limits even at batch size 1)")
+            for b in self.buckets
+        ]
+        return "\n".join(rows)
+
+
+def _reset_peak_memory() -> None:
+    if DEVICE.type == "cuda":
+        torch.cuda.reset_peak_memory_stats()
+        return
+    # Linux: writing 5 resets the peak RSS (VmHWM) of the process.
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def peak_memory_mb() -> float:
+    """
+    Peak memory since the last reset: allocated device memory on CUDA, otherwise the peak RSS of
+    the process (since start-up where it cannot be reset).
+    """
+    if DEVICE.type == "cuda":
+        return torch.cuda.max_memory_allocated() / 2**20
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 2**10
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS.
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+def _probe(
+    model: AutoModelForTokenClassification,
+    tokenizer: PreTrainedTokenizerFast,
+    n_tokens: int,
+    batch_size: int,
+    repeats: int,
+) -> Tuple[float, float]:
+    """
+    Median latency (ms) and peak memory (MB) of a forward pass over a synthetic batch.
+    """
+    vocab = [
+        i for i in range(tokenizer.vocab_size) if i not in tokenizer.all_special_ids
+    ]
+    generator = torch.Generator().manual_seed(n_tokens * 1000 + batch_size)
+    input_ids = torch.tensor(vocab)[
+        torch.randint(len(vocab), (batch_size, n_tokens), generator=generator)
+    ]
+    cls_id, sep_id, _ = _special_ids(tokenizer)
+    input_ids[:, 0], input_ids[:, -1] = cls_id, sep_id
+    tokenized_input = {
+        "input_ids": input_ids.to(DEVICE),
+        "attention_mask": torch.ones_like(input_ids).to(DEVICE),
+    }
+
+    _reset_peak_memory()
+    latencies = []
+    for _ in range(repeats + 1):  # the first pass only warms up
+        start = time.perf_counter()
+        with torch.no_grad():
+            model(**tokenized_input)  # pyright: ignore
+        if DEVICE.type == "cuda":
+            torch.cuda.synchronize()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return statistics.median(latencies[1:]), peak_memory_mb()
+
+
+def _tune_bucket(
+    model: AutoModelForTokenClassification,
+    tokenizer: PreTrainedTokenizerFast,
+    n_tokens: int,
+    slo_ms: float,
+    memory_limit_mb: Optional[float],
+    max_batch_size: int,
+    repeats: int,
+) -> BucketProfile:
+    best: Optional[BucketProfile] = None
+    first: Optional[BucketProfile] = None
+    batch_size = 1
+    while batch_size <= max_batch_size:
+        latency_ms, peak_mb = _probe(model, tokenizer, n_tokens, batch_size, repeats)
+        candidate = BucketProfile(
+            max_tokens=n_tokens,
+            batch_size=batch_size,
+            latency_ms=latency_ms,
+            tokens_per_second=batch_size * n_tokens / latency_ms * 1000,
+            peak_memory_mb=peak_mb,
+        )
+        first = first or candidate
+        if latency_ms > slo_ms or (
+            memory_limit_mb is not None and peak_mb > memory_limit_mb
+        ):
+            break
+        if (
+            best is not None
+            and candidate.tokens_per_second < best.tokens_per_second * _MIN_GAIN
+        ):
+            # Throughput has levelled off; larger batches only add latency and memory.
+            if candidate.tokens_per_second > best.tokens_per_second:
+                best = candidate
+            break
+        best = candidate
+        batch_size *= 2
+
+    if best is None:
+        first.within_limits = False  # pyright: ignore
+        return first  # pyright: ignore
+    return best
+
+
+def autotune(
+    model: Optional[AutoModelForTokenClassification] = None,
+    tokenizer: Optional[PreTrainedTokenizerFast] = None,
+    slo_ms: float = DEFAULT_SLO_MS,
+    memory_limit_mb: Optional[float] = None,
+    buckets: Sequence[int] = DEFAULT_BUCKETS,
+    max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+    repeats: int = 3,
+) -> BatchProfile:
+    """
+    Probes every length bucket (capped at the model's maximum length) with batch sizes 1, 2, 4, ...
+    and returns the fastest that keep a forward pass within `slo_ms` milliseconds and peak memory
+    below `memory_limit_mb`.
+    """
+    model = model if model is not None else _cached(_get_model, "model")
+    tokenizer = tokenizer or _cached(_get_tokenizer, "tokenizer")
+    max_length = _max_length(tokenizer, model)
+    lengths = sorted({min(b, max_length) for b in buckets})
+
+    profiles = []
+    for n_tokens in lengths:
+        profile = _tune_bucket(
+            model, tokenizer, n_tokens, slo_ms, memory_limit_mb, max_batch_size, repeats
+        )
+        msg.info(
+            f"<= {n_tokens} tokens: batch size {profile.batch_size} "
+            f"({profile.tokens_per_second:.0f} tokens/s)."
+        )
+        profiles.append(profile)
+
+    return BatchProfile(
+        model_revision=model_revision(model),
+        device=str(DEVICE),
+        threads=torch.get_num_threads(),
+        slo_ms=slo_ms,
+        memory_limit_mb=memory_limit_mb,
+        buckets=profiles,
+    )
+
+
+def plan_batches(lengths: List[int], profile: BatchProfile) -> List[List[int]]:
+    """
+    Cuts sequences, given by their token lengths in ascending order, into consecutive batches no
+    larger than the profile's batch size for the longest sequence in each.
+    """
+    batches: List[List[int]] = []
+    current: List[int] = []
+    for i, n_tokens in enumerate(lengths):
+        if current and len(current) + 1 > profile.batch_size(n_tokens):
+            batches.append(current)
+            current = []
+        current.append(i)
+    if current:
+        batches.append(current)
+    return batches
+
+
+def infer_labels_tuned(
+    texts: List[str],
+    model: AutoModelForTokenClassification,
+    profile: BatchProfile,
+    tokenizer: Optional[PreTrainedTokenizerFast] = None,
+) -> List[List[LabelPrediction]]:
+    """
+    Like `infer_labels_batch`, with batch sizes from `profile` for each batch's sequence length.
+    """
+    return label_models(_infer_labels_tuned(texts, model, profile, tokenizer))
+
+
+def _infer_labels_tuned(
+    texts: List[str],
+    model: AutoModelForTokenClassification,
+    profile: BatchProfile,
+    tokenizer: Optional[PreTrainedTokenizerFast] = None,
+) -> List[List[Label]]:
+    tokenizer = tokenizer or _cached(_get_tokenizer, "tokenizer")
+    res: List[List[Label]] = [[] for _ in texts]
+    if not texts:
+        return res
+    _, _, pad_id = _special_ids(tokenizer)
+
+    with timed("tokenization"):
+        encoding = tokenizer(texts, return_offsets_mapping=True, truncation=True)
+    input_ids: List[List[int]] = encoding["input_ids"]  # pyright: ignore
+    offset_mapping: List[List[List[int]]] = encoding["offset_mapping"]  # pyright: ignore
+    for text, offsets in zip(texts, offset_mapping):
+        if _is_truncated(offsets, text):
+            metrics.TRUNCATED.inc()
+
+    order = sorted(range(len(texts)), key=lambda i: len(input_ids[i]))
+    for positions in plan_batches([len(input_ids[i]) for i in order], profile):
+        indices = [order[p] for p in positions]
+        width = len(input_ids[indices[-1]])
+        ids = torch.full((len(indices), width), pad_id)
+        attention_mask = torch.zeros((len(indices), width), dtype=torch.long)
+        for row, i in enumerate(indices):
+            ids[row, : len(input_ids[i])] = torch.tensor(input_ids[i])
+            attention_mask[row, : len(input_ids[i])] = 1
+        tokenized_input = {
+            "input_ids": ids.to(DEVICE),
+            "attention_mask": attention_mask.to(DEVICE),
+        }
+        _record_batch(tokenized_input["attention_mask"])
+
+        start = time.perf_counter()
+        predictions = predict_batch(tokenized_input, model)
+        profile.observe(width, len(indices), (time.perf_counter() - start) * 1000)
+
+        tokens = batch_tokens(tokenized_input, tokenizer)
+        labels = decode_batch(tokens, predictions, [offset_mapping[i] for i in indices])
+        for i, row in zip(indices, labels):
+            res[i] = row
+    return res
+
+
+def invoke_tuned(
+    text: str,
+    profile: BatchProfile,
+    model: Optional[AutoModelForTokenClassification] = None,
+    tokenizer: Optional[PreTrainedTokenizerFast] = None,
+) -> List[Citation]:
+    """
+    Like `invoke()`, with batch sizes from `profile`.
+    """
+    metrics.DOCUMENTS.inc()
+    model = model if model is not None else _cached(_get_model, "model")
+    sentences = segment(text)
+    predictions = _infer_labels_tuned(
+        [sentence for _, sentence in sentences], model, profile, tokenizer
+    )
+    return sentences_to_citations(sentences, predictions)
+
+
+def load_profile(
+    path: PathLike,
+    model: AutoModelForTokenClassification,
+    threads: Optional[int] = None,
+) -> Optional[BatchProfile]:
+    """
+    The profile saved at `path`, or None (with a warning) if there is none or it was tuned for
+    another model, device or thread count. `threads` is the torch thread count the replicas will
+    run with, e.g. the `threads` passed to `ModelPool`.
+    """
+    if not Path(path).exists():
+        return None
+    profile = BatchProfile.load(path)
+    if not profile.matches(model, threads):
+        msg.warn(
+            f"Batch profile '{path}' was tuned for {profile.model_revision} on "
+            f"{profile.device} with {profile.threads} thread(s); run `cit-parser autotune` again."
+        )
+        return None
+    return profile
+
+
+def tuned_backend(profile: BatchProfile) -> Backend:
+    """
+    The sentence backend with batch sizes from `profile` instead of a fixed batch size, to pass
+    as `backend_fn` to `extract_documents`, `run_job`, `WatchDaemon` or `run_worker`.
+    """
+    return lambda replica, text, batch_size: invoke_tuned(
+        text, profile, replica.model, replica.tokenizer
+    )
@@ -0,0 +1,105 @@
+"""
+Cascaded extraction: deterministic rules first, the model only for what they cannot resolve.
+
+Each sentence first goes through `rules.extract_canonical`. If nothing citation-like is left
+once the canonical citations are blanked out, the sentence is done without a forward pass;
+otherwise the residue (with the canonical spans blanked, so offsets still line up) is sent to the
+model.
+"""
+
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel
+from transformers import AutoModelForTokenClassification, PreTrainedTokenizerFast
+
+from . import metrics
+from .invoke import (
+    DEFAULT_BATCH_SIZE,
+    _cached,
+    _get_model,
+    _infer_labels_batch,
+    segment,
+)
+from .metrics import timed
+from .postprocess import labels_to_cit, shift_citation
+from .rules import extract_canonical, needs_model
+from .types import Citation
+
+TIERS = ("rules", "skipped", "model")
+
+
+class CascadeReport(BaseModel):
+    """
+    How many sentences each tier served: `rules` resolved by the rule extractor alone, `skipped`
+    had nothing citation-like at all, `model` needed a forward pass.
+    """
+
+    sentences: int = 0
+    rules: int = 0
+    skipped: int = 0
+    model: int = 0
+
+    def record(self, tier: str) -> None:
+        setattr(self, tier, getattr(self, tier) + 1)
+        self.sentences += 1
+        metrics.CASCADE_SENTENCES.inc(tier=tier)
+
+    @property
+    def fractions(self) -> Dict[str, float]:
+        if not self.sentences:
+            return {tier: 0.0 for tier in TIERS}
+        return {tier: getattr(self, tier) / self.sentences for tier in TIERS}
+
+    def __str__(self) -> str:
+        parts = ", ".join(f"{k}={v:.1%}" for k, v in self.fractions.items())
+        return f"{self.sentences} sentence(s): {parts}"
+
+
+def invoke_cascade(
+    text: str,
+    model: Optional[AutoModelForTokenClassification] = None,
+    tokenizer: Optional[PreTrainedTokenizerFast] = None,
+    report: Optional[CascadeReport] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> List[Citation]:
+    """
+    Like `invoke()`, but canonical citations are extracted by rules and only sentences with
+    unresolved citation-like text reach the model. Pass a `CascadeReport` to accumulate tier
+    counts across calls.
+    """
+    metrics.DOCUMENTS.inc()
+    report = report if report is not None else CascadeReport()
+    sentences = segment(text)
+    resolved: List[List[Citation]] = []
+    pending: List[int] = []
+    residues: List[str] = []
+
+    for i, (_, sentence) in enumerate(sentences):
+        with timed("rules"):
+            cits, residue = extract_canonical(sentence)
+        resolved.append(cits)
+
+        if not needs_model(residue):
+            report.record("rules" if cits else "skipped")
+            continue
+
+        report.record("model")
+        pending.append(i)
+        residues.append(residue)
+
+    if pending:
+        if model is None:
+            model = _cached(_get_model, "model")
+        predictions = _infer_labels_batch(residues, model, tokenizer, batch_size)
+        for i, labels in zip(pending, predictions):
+            with timed("postprocess"):
+                cit = labels_to_cit(labels, sentences[i][1])
+            if cit:
+                resolved[i].append(cit)
+                resolved[i].sort(key=lambda c: c.start)
+
+    return [
+        shift_citation(cit, offset)
+        for (offset, _), cits in zip(sentences, resolved)
+        for cit in cits
+    ]
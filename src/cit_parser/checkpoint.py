@@ -0,0 +1,298 @@
+"""
+Resumable corpus jobs.
+
+A job directory holds the extracted citations as numbered JSONL parts, plus a `manifest.json`
+recording for every finished document the SHA-256 of its content and the part that holds its
+citations, together with the model revision and backend the job runs with. Results are committed
+every few documents: the part is written first, then the manifest, each atomically (written to a
+temporary file and renamed over the target), so a crash at any point loses at most the documents
+since the last commit and never leaves a half-written file behind.
+
+Re-running the same job skips every document whose content is unchanged. Documents that are new or
+changed are processed again; the citations for their old content stay in older parts but are no
+longer referenced by the manifest, and `read_job` ignores them. A different model revision or
+backend invalidates every entry.
+"""
+
+import hashlib
+import os
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from pydantic import BaseModel
+from transformers import AutoModelForTokenClassification, PreTrainedTokenizerFast
+from wasabi import msg
+
+from .corpus import Backend, Document, check_unique, extract_documents
+from .dedupe import DedupeIndex
+from .invoke import DEFAULT_BATCH_SIZE, _cached, _get_model
+from .serialize import read_citation_records, write_citations
+from .types import Citation
+
+MANIFEST_FILE = "manifest.json"
+
+PathLike = Union[str, os.PathLike]
+
+
+@contextmanager
+def atomic_path(path: PathLike) -> Iterator[Path]:
+    """
+    Yields a temporary path next to `path` to write to. Once the block exits without error the
+    temporary file replaces `path` in a single rename; on error it is removed.
+    """
+    path = Path(path)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    os.close(fd)
+    try:
+        yield Path(tmp)
+        os.replace(tmp, path)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+
+
+@contextmanager
+def atomic_open(path: PathLike, mode: str = "w") -> Iterator[Any]:
+    """
+    Like `open(path, mode)`, through `atomic_path`. The data is flushed to disk before the rename.
+    """
+    with atomic_path(path) as tmp:
+        with open(tmp, mode) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def model_revision(model: AutoModelForTokenClassification) -> str:
+    """
+    Identifies the model weights a job runs with: the hub name (or local path) and, for hub
+    models, the commit they were downloaded at.
+    """
+    config = model.config  # pyright: ignore
+    name = getattr(config, "_name_or_path", None) or type(model).__name__
+    commit = getattr(config, "_commit_hash", None)
+    return f"{name}@{commit}" if commit else name
+
+
+class ManifestEntry(BaseModel):
+    sha256: str
+    part: str
+    citations: int
+    size: Optional[int] = None
+    mtime_ns: Optional[int] = None
+
+
+class Manifest(BaseModel):
+    model_revision: str
+    backend: str
+    documents: Dict[str, ManifestEntry] = {}
+    next_part: int = 0
+
+    @classmethod
+    def load(cls, job_dir: PathLike) -> Optional["Manifest"]:
+        path = Path(job_dir) / MANIFEST_FILE
+        if not path.exists():
+            return None
+        return cls.model_validate_json(path.read_text())
+
+    def save(self, job_dir: PathLike) -> None:
+        with atomic_open(Path(job_dir) / MANIFEST_FILE) as f:
+            f.write(self.model_dump_json())
+
+
+class JobReport(BaseModel):
+    """
+    What a job run did: `processed` documents went through the model, `skipped` were already
+    finished with the same content, model and backend.
+    """
+
+    processed: int = 0
+    skipped: int = 0
+    citations: int = 0
+    parts: int = 0
+    seconds: float = 0.0
+
+
+def _stat(path: Optional[Path]) -> Tuple[Optional[int], Optional[int]]:
+    if path is None:
+        return None, None
+    st = path.stat()
+    return st.st_size, st.st_mtime_ns
+
+
+def _pending(
+    inputs: Iterable[Tuple[str, Optional[Path]]],
+    manifest: Manifest,
+    fingerprints: Dict[str, ManifestEntry],
+    report: JobReport,
+    trust_mtime: bool = False,
+) -> Iterator[Document]:
+    """
+    Yields the documents that still need processing, recording their fingerprint along the way.
+    With `trust_mtime`, files whose size and modification time match the manifest are skipped
+    without being read; otherwise every file is hashed.
+    """
+    for doc_id, path in inputs:
+        entry = manifest.documents.get(doc_id)
+        size, mtime_ns = _stat(path)
+        if (
+            trust_mtime
+            and entry is not None
+            and size is not None
+            and (entry.size, entry.mtime_ns) == (size, mtime_ns)
+        ):
+            report.skipped += 1
+            continue
+
+        text = (
+            path.read_text(errors="replace") if path is not None else sys.stdin.read()
+        )
+        sha256 = content_hash(text)
+        if entry is not None and entry.sha256 == sha256:
+            entry.size, entry.mtime_ns = size, mtime_ns
+            report.skipped += 1
+            continue
+
+        fingerprints[doc_id] = ManifestEntry(
+            sha256=sha256, part="", citations=0, size=size, mtime_ns=mtime_ns
+        )
+        yield Document(id=doc_id, text=text, path=path)
+
+
+def _commit(
+    job_dir: Path,
+    manifest: Manifest,
+    results: List[Tuple[Document, List[Citation]]],
+    fingerprints: Dict[str, ManifestEntry],
+    report: JobReport,
+) -> None:
+    if not results:
+        return
+    part = f"part-{manifest.next_part:05d}.jsonl"
+    with atomic_open(job_dir / part) as f:
+        for doc, citations in results:
+            write_citations(citations, f, extra={"doc_id": doc.id})
+
+    for doc, citations in results:
+        entry = fingerprints.pop(doc.id)
+        entry.part = part
+        entry.citations = len(citations)
+        manifest.documents[doc.id] = entry
+    manifest.next_part += 1
+    manifest.save(job_dir)
+    report.parts += 1
+
+
+def _remove_orphans(job_dir: Path, manifest: Manifest) -> None:
+    referenced = {entry.part for entry in manifest.documents.values()}
+    for path in job_dir.glob("part-*.jsonl"):
+        if path.name not in referenced:
+            path.unlink()
+
+
+def run_job(
+    inputs: List[Tuple[str, Optional[Path]]],
+    job_dir: PathLike,
+    backend: str = "sentence",
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    workers: int = 1,
+    model: Optional[AutoModelForTokenClassification] = None,
+    tokenizer: Optional[PreTrainedTokenizerFast] = None,
+    checkpoint_every: int = 100,
+    on_document: Optional[Callable[[Document, List[Citation]], None]] = None,
+    dedupe: Optional[DedupeIndex] = None,
+    backend_fn: Optional[Backend] = None,
+    trust_mtime: bool = False,
+) -> JobReport:
+    """
+    Extracts citations from the resolved `inputs` (see `corpus.resolve_inputs`) into `job_dir`,
+    committing every `checkpoint_every` documents and skipping documents finished by a previous
+    run. `on_document` is called for every processed document, e.g. to report progress. With a
+    `DedupeIndex`, near-duplicates among the processed documents are deduplicated. `backend_fn`
+    replaces the backend's function, as in `extract_documents`.
+
+    Finished documents are recognized by the SHA-256 of their content. `trust_mtime=True` skips
+    files whose size and modification time are unchanged without reading them, which is faster
+    but misses edits that keep both (e.g. a copy with preserved timestamps).
+
+    The manifest is keyed by document id, so the ids must be unique; `resolve_inputs` ensures it.
+    """
+    check_unique(inputs)
+    start = time.perf_counter()
+    job_dir = Path(job_dir)
+    job_dir.mkdir(parents=True, exist_ok=True)
+    model = model if model is not None else _cached(_get_model, "model")
+    revision = model_revision(model)
+
+    manifest = Manifest.load(job_dir)
+    if manifest is None:
+        manifest = Manifest(model_revision=revision, backend=backend)
+    elif (manifest.model_revision, manifest.backend) != (revision, backend):
+        msg.warn(
+            f"Job was run with model '{manifest.model_revision}' and backend "
+            f"'{manifest.backend}'; reprocessing every document."
+        )
+        manifest = Manifest(
+            model_revision=revision, backend=backend, next_part=manifest.next_part
+        )
+
+    report = JobReport()
+    fingerprints: Dict[str, ManifestEntry] = {}
+    pending = _pending(inputs, manifest, fingerprints, report, trust_mtime)
+    results: List[Tuple[Document, List[Citation]]] = []
+
+    for doc, citations in extract_documents(
+        pending, backend, batch_size, workers, model, tokenizer, dedupe, backend_fn
+    ):
+        results.append((doc, citations))
+        report.processed += 1
+        report.citations += len(citations)
+        if on_document is not None:
+            on_document(doc, citations)
+        if len(results) >= checkpoint_every:
+            _commit(job_dir, manifest, results, fingerprints, report)
+            results = []
+
+    _commit(job_dir, manifest, results, fingerprints, report)
+    # Also keeps sizes and modification times refreshed for touched but unchanged files.
+    manifest.save(job_dir)
+    _remove_orphans(job_dir, manifest)
+
+    report.seconds = time.perf_counter() - start
+    return report
+
+
+def read_job(job_dir: PathLike) -> Iterator[Tuple[Citation, Dict[str, Any]]]:
+    """
+    Streams the current citations of a job with their extra fields (`doc_id`), skipping records
+    left over from earlier versions of a document.
+    """
+    job_dir = Path(job_dir)
+    manifest = Manifest.load(job_dir)
+    if manifest is None:
+        raise FileNotFoundError(f"No job manifest in '{job_dir}'.")
+
+    for part in sorted({entry.part for entry in manifest.documents.values()}):
+        with open(job_dir / part) as f:
+            for citation, extra in read_citation_records(f):
+                entry = manifest.documents.get(extra.get("doc_id", ""))
+                if entry is not None and entry.part == part:
+                    yield citation, extra
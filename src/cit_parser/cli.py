@@ -0,0 +1,703 @@
+"""
+The `cit-parser` command line tool.
+
+    cit-parser extract corpus/ -o citations.jsonl --workers 4 --backend cascade
+    cit-parser extract "opinions/**/*.txt" --format parquet -o citations.parquet
+    cat brief.txt | cit-parser extract -
+    cit-parser extract corpus/ --dry-run --sample 50
+    cit-parser extract archive/ --job-dir runs/archive  # resumable
+    cit-parser extract feeds/ -o citations.jsonl --dedupe  # skip near-duplicate copies
+    cit-parser autotune -o batch-profile.json --slo-ms 200 --memory-limit-mb 4096
+    cit-parser extract corpus/ -o citations.jsonl --batch-profile batch-profile.json
+    cit-parser calibrate-exits corpus/ -o exit-heads.pt --target-recall 0.995
+    cit-parser watch /srv/filings -o /srv/citations --workers 2  # long-running
+    cit-parser shard init archive/ --job-dir /shared/backfill  # then, on every host:
+    cit-parser shard work --job-dir /shared/backfill --workers 4
+    cit-parser shard reduce --job-dir /shared/backfill
+"""
+
+import random
+import signal
+import sys
+import threading
+import time
+from contextlib import redirect_stdout
+from enum import Enum
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, TextIO, Tuple
+
+import typer
+from wasabi import msg
+
+from .autotune import (
+    DEFAULT_MAX_BATCH_SIZE,
+    DEFAULT_SLO_MS,
+    autotune,
+    load_profile,
+    tuned_backend,
+)
+from .checkpoint import atomic_path, run_job
+from .corpus import (
+    DEFAULT_PATTERN,
+    Document,
+    extract_documents,
+    read_documents,
+    resolve_inputs,
+    total_size,
+)
+from .corpus import Backend as BackendFn
+from .dedupe import DEFAULT_THRESHOLD, DedupeIndex
+from .early_exit import DEFAULT_TARGET_RECALL, calibrate, evaluate
+from .invoke import DEFAULT_BATCH_SIZE, _cached, _get_model, _get_tokenizer, segment
+from .serialize import ParquetCitationWriter, write_citations
+from .shards import (
+    DEFAULT_LEASE_SECONDS,
+    DEFAULT_MAX_ATTEMPTS,
+    DEFAULT_SHARD_SIZE,
+    ShardQueue,
+    reduce_job,
+    run_worker,
+)
+from .summary import AuthoritySummary
+from .types import Citation
+from .watch import DEFAULT_BATCH_WINDOW, DEFAULT_MAX_BATCH, WatchDaemon
+
+app = typer.Typer(help="Extract legal citations from documents.")
+shard_app = typer.Typer(help="Process a corpus in shards on any number of hosts.")
+app.add_typer(shard_app, name="shard")
+
+
+class Backend(str, Enum):
+    SENTENCE = "sentence"
+    WINDOW = "window"
+    CASCADE = "cascade"
+    PACKED = "packed"
+
+
+class OutputFormat(str, Enum):
+    JSONL = "jsonl"
+    PARQUET = "parquet"
+
+
+BATCH_PROFILE = typer.Option(
+    None,
+    help="Batch sizes tuned by `cit-parser autotune`, used instead of --batch-size "
+    "(sentence backend only).",
+)
+
+
+def _tuned_backend(path: Optional[Path], backend: str, model) -> Optional[BackendFn]:
+    """
+    The backend function for the batch profile at `path`, or None (with a warning) if the
+    profile was tuned for another setup.
+    """
+    if path is None:
+        return None
+    if backend != Backend.SENTENCE.value:
+        msg.fail("--batch-profile only applies to the sentence backend.", exits=1)
+    if not path.exists():
+        msg.fail(f"No batch profile at '{path}'.", exits=1)
+    profile = load_profile(path, model)
+    return None if profile is None else tuned_backend(profile)
+
+
+def _duration(seconds: float) -> str:
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}h{seconds % 3600 // 60:02d}m"
+    if seconds >= 60:
+        return f"{seconds // 60}m{seconds % 60:02d}s"
+    return f"{seconds}s"
+
+
+class Progress:
+    """
+    A single status line on stderr with throughput and, when the total is known, an ETA.
+    """
+
+    def __init__(
+        self, total_docs: int, total_bytes: Optional[int], interval: float = 0.5
+    ):
+        self.total_docs = total_docs
+        self.total_bytes = total_bytes
+        self.interval = interval
+        self.docs = 0
+        self.bytes = 0
+        self.citations = 0
+        self.start = time.perf_counter()
+        self._last = 0.0
+
+    def update(self, size: int, citations: int) -> None:
+        self.docs += 1
+        self.bytes += size
+        self.citations += citations
+        now = time.perf_counter()
+        if now - self._last >= self.interval or self.docs == self.total_docs:
+            self._last = now
+            typer.echo(f"\r{self.status(now)}", err=True, nl=False)
+
+    def status(self, now: Optional[float] = None) -> str:
+        elapsed = max((now or time.perf_counter()) - self.start, 1e-9)
+        line = (
+            f"{self.docs}/{self.total_docs} docs, {self.citations} citations, "
+            f"{self.docs / elapsed:.1f} docs/s, {self.bytes / elapsed / 1e6:.2f} MB/s"
+        )
+        if self.total_bytes and self.bytes:
+            remaining = elapsed * (self.total_bytes - self.bytes) / self.bytes
+            line += f", ETA {_duration(remaining)}"
+        return line
+
+    def close(self) -> None:
+        typer.echo(err=True)
+
+
+@app.callback()
+def cli() -> None:
+    """
+    Extract legal citations from documents.
+    """
+
+
+@app.command()
+def extract(
+    inputs: List[str] = typer.Argument(
+        ..., help="Files, directories, glob patterns, or - for standard input."
+    ),
+    output: Optional[Path] = typer.Option(
+        None, "--output", "-o", help="Output file. JSONL goes to stdout if omitted."
+    ),
+    format: OutputFormat = typer.Option(OutputFormat.JSONL, "--format", "-f"),
+    pattern: str = typer.Option(
+        DEFAULT_PATTERN, help="File name pattern to search directories for."
+    ),
+    backend: Backend = typer.Option(Backend.SENTENCE, help="Extraction strategy."),
+    batch_size: int = typer.Option(
+        DEFAULT_BATCH_SIZE,
+        min=1,
+        help="Sentences, windows or packed rows per forward pass.",
+    ),
+    batch_profile: Optional[Path] = BATCH_PROFILE,
+    workers: int = typer.Option(1, min=1, help="Number of model replicas."),
+    dry_run: bool = typer.Option(
+        False, help="Time a sample of the inputs and estimate the full run."
+    ),
+    sample: int = typer.Option(20, min=1, help="Documents to time in a dry run."),
+    job_dir: Optional[Path] = typer.Option(
+        None,
+        help="Write a resumable job to this directory instead of a single output file. "
+        "Re-running skips documents already finished.",
+    ),
+    checkpoint_every: int = typer.Option(
+        100, min=1, help="Documents per job checkpoint."
+    ),
+    fast_resume: bool = typer.Option(
+        False,
+        help="When resuming a job, skip files whose size and modification time are unchanged "
+        "without hashing their content.",
+    ),
+    dedupe: bool = typer.Option(
+        False,
+        help="Reuse the citations of an earlier near-duplicate document instead of "
+        "running the model on it again.",
+    ),
+    dedupe_threshold: float = typer.Option(
+        DEFAULT_THRESHOLD,
+        min=0.0,
+        max=1.0,
+        help="Estimated word 5-gram Jaccard similarity from which two documents are "
+        "near-duplicates.",
+    ),
+    summary: Optional[Path] = typer.Option(
+        None,
+        help="Also write a count-only table of authorities (citations, citing documents, "
+        "first and last position) to this file.",
+    ),
+    verbose: bool = typer.Option(False, help="Keep per-document log messages."),
+) -> None:
+    """
+    Extract citations from every input document. Each output record is one citation with
+    document-absolute offsets and the id of its document.
+    """
+    # Citations may be going to stdout, so everything else goes to stderr.
+    stdout = sys.stdout
+    with redirect_stdout(sys.stderr):
+        _extract(
+            inputs,
+            output,
+            format,
+            pattern,
+            backend,
+            batch_size,
+            batch_profile,
+            workers,
+            dry_run,
+            sample,
+            job_dir,
+            checkpoint_every,
+            fast_resume,
+            DedupeIndex(dedupe_threshold) if dedupe else None,
+            summary,
+            verbose,
+            stdout,
+        )
+
+
+def _extract(
+    inputs: List[str],
+    output: Optional[Path],
+    format: OutputFormat,
+    pattern: str,
+    backend: Backend,
+    batch_size: int,
+    batch_profile: Optional[Path],
+    workers: int,
+    dry_run: bool,
+    sample: int,
+    job_dir: Optional[Path],
+    checkpoint_every: int,
+    fast_resume: bool,
+    dedupe: Optional[DedupeIndex],
+    summary_path: Optional[Path],
+    verbose: bool,
+    stdout: TextIO,
+) -> None:
+    try:
+        resolved = resolve_inputs(inputs, pattern)
+    except (FileNotFoundError, ValueError) as e:
+        msg.fail(str(e), exits=1)
+    if not resolved:
+        msg.fail("No input documents found.", exits=1)
+    if dry_run and total_size(resolved) is None:
+        msg.fail("A dry run cannot read from standard input.", exits=1)
+    if job_dir is not None and (output is not None or format != OutputFormat.JSONL):
+        msg.fail(
+            "A job directory holds its own JSONL output; drop --output/--format.",
+            exits=1,
+        )
+    if format == OutputFormat.PARQUET and output is None and not dry_run:
+        msg.fail("Parquet output needs --output.", exits=1)
+    if job_dir is not None and summary_path is not None:
+        msg.fail("--summary cannot be combined with --job-dir.", exits=1)
+
+    start = time.perf_counter()
+    model = _cached(_get_model, "model")
+    tokenizer = _cached(_get_tokenizer, "tokenizer")
+    load_seconds = time.perf_counter() - start
+    backend_fn = _tuned_backend(batch_profile, backend.value, model)
+
+    if dry_run:
+        _dry_run(
+            resolved, backend, batch_size, workers, sample, model, tokenizer, backend_fn
+        )
+        msg.info(f"Model load: {load_seconds:.1f}s (paid once per run).")
+        return
+
+    progress = Progress(len(resolved), total_size(resolved))
+    summary = AuthoritySummary() if summary_path is not None else None
+    verbosity = msg.no_print
+    msg.no_print = not verbose
+    try:
+        if job_dir is not None:
+            report = run_job(
+                resolved,
+                job_dir,
+                backend.value,
+                batch_size,
+                workers,
+                model,
+                tokenizer,
+                checkpoint_every,
+                on_document=lambda doc, cits: progress.update(doc.size, len(cits)),
+                dedupe=dedupe,
+                backend_fn=backend_fn,
+                trust_mtime=fast_resume,
+            )
+        else:
+            results = extract_documents(
+                read_documents(resolved),
+                backend.value,
+                batch_size,
+                workers,
+                model,
+                tokenizer,
+                dedupe,
+                backend_fn,
+            )
+            if summary is not None:
+                results = _summarized(results, summary)
+            _write(results, output, format, stdout, progress)
+    finally:
+        msg.no_print = verbosity
+        progress.close()
+
+    if job_dir is not None:
+        msg.good(
+            f"{report.processed} document(s) processed, {report.skipped} already done; "
+            f"job in '{job_dir}'."
+        )
+    else:
+        msg.good(progress.status())
+    if dedupe is not None:
+        msg.info(str(dedupe.report))
+    if summary is not None:
+        summary.save(summary_path)  # pyright: ignore
+        msg.info(
+            f"{len(summary)} authorities cited {summary.n_citations} time(s) "
+            f"summarized in '{summary_path}'."
+        )
+
+
+def _summarized(
+    results: Iterable[Tuple[Document, List[Citation]]], summary: AuthoritySummary
+) -> Iterator[Tuple[Document, List[Citation]]]:
+    for doc, citations in results:
+        summary.add_citations(doc.id, citations)
+        yield doc, citations
+
+
+def _write(
+    results: Iterable[Tuple[Document, List[Citation]]],
+    output: Optional[Path],
+    format: OutputFormat,
+    stdout: TextIO,
+    progress: Progress,
+) -> None:
+    if output is None:
+        for doc, citations in results:
+            write_citations(citations, stdout, {"doc_id": doc.id})
+            progress.update(doc.size, len(citations))
+        return
+
+    # The output only appears, complete, once every document is done.
+    with atomic_path(output) as tmp:
+        if format == OutputFormat.PARQUET:
+            with ParquetCitationWriter(tmp, extra_fields=["doc_id"]) as writer:
+                for doc, citations in results:
+                    writer.write(citations, {"doc_id": doc.id})
+                    progress.update(doc.size, len(citations))
+        else:
+            with open(tmp, "w") as fp:
+                for doc, citations in results:
+                    write_citations(citations, fp, {"doc_id": doc.id})
+                    progress.update(doc.size, len(citations))
+
+
+def _dry_run(
+    resolved: List[Tuple[str, Optional[Path]]],
+    backend: Backend,
+    batch_size: int,
+    workers: int,
+    sample: int,
+    model,
+    tokenizer,
+    backend_fn: Optional[BackendFn] = None,
+) -> None:
+    step = max(1, len(resolved) // sample)
+    sampled = resolved[::step][:sample]
+    total_bytes = total_size(resolved) or 0
+
+    verbosity = msg.no_print
+    msg.no_print = True
+    try:
+        start = time.perf_counter()
+        sampled_bytes = 0
+        citations = 0
+        for doc, cits in extract_documents(
+            read_documents(sampled),
+            backend.value,
+            batch_size,
+            workers,
+            model,
+            tokenizer,
+            None,
+            backend_fn,
+        ):
+            sampled_bytes += doc.size
+            citations += len(cits)
+        elapsed = time.perf_counter() - start
+    finally:
+        msg.no_print = verbosity
+
+    rate = sampled_bytes / elapsed if elapsed else 0.0
+    estimate = total_bytes / rate if rate else 0.0
+    msg.info(
+        f"Timed {len(sampled)} of {len(resolved)} document(s) "
+        f"({sampled_bytes / 1e6:.2f} of {total_bytes / 1e6:.2f} MB) in {elapsed:.1f}s: "
+        f"{rate / 1e6:.2f} MB/s, {citations / len(sampled):.1f} citations/doc."
+    )
+    msg.good(
+        f"Estimated time for all inputs with backend '{backend.value}' and {workers} "
+        f"worker(s): {_duration(estimate)}."
+    )
+
+
+@app.command(name="autotune")
+def autotune_command(
+    output: Path = typer.Option(
+        ..., "--output", "-o", help="Where to save the batch profile (JSON)."
+    ),
+    slo_ms: float = typer.Option(
+        DEFAULT_SLO_MS, min=1.0, help="Latency limit for one forward pass."
+    ),
+    memory_limit_mb: Optional[float] = typer.Option(
+        None, min=1.0, help="Peak memory limit (RSS, or device memory on CUDA)."
+    ),
+    max_batch_size: int = typer.Option(DEFAULT_MAX_BATCH_SIZE, min=1),
+) -> None:
+    """
+    Find the fastest batch size per sequence length on this machine, within a latency SLO and
+    memory ceiling, and save them for `autotune.load_profile`.
+    """
+    with redirect_stdout(sys.stderr):
+        model = _cached(_get_model, "model")
+        tokenizer = _cached(_get_tokenizer, "tokenizer")
+        profile = autotune(
+            model,
+            tokenizer,
+            slo_ms=slo_ms,
+            memory_limit_mb=memory_limit_mb,
+            max_batch_size=max_batch_size,
+        )
+        profile.save(output)
+        msg.good(f"Batch profile saved to '{output}':\n{profile}")
+
+
+@app.command(name="calibrate-exits")
+def calibrate_exits_command(
+    inputs: List[str] = typer.Argument(
+        ..., help="Files, directories or glob patterns of representative documents."
+    ),
+    output: Path = typer.Option(
+        ..., "--output", "-o", help="Where to save the exit heads."
+    ),
+    pattern: str = typer.Option(
+        DEFAULT_PATTERN, help="File name pattern to search directories for."
+    ),
+    target_recall: float = typer.Option(
+        DEFAULT_TARGET_RECALL,
+        min=0.0,
+        max=1.0,
+        help="Share of the sentences with entities that must reach the full model.",
+    ),
+    layers: Optional[List[int]] = typer.Option(
+        None,
+        "--layer",
+        min=1,
+        help="Exit layer (repeatable). Defaults to 1/4, 1/2, 3/4.",
+    ),
+    holdout: float = typer.Option(
+        0.2, min=0.0, max=0.9, help="Share of sentences held out for the report."
+    ),
+    batch_size: int = typer.Option(DEFAULT_BATCH_SIZE, min=1),
+) -> None:
+    """
+    Train and calibrate early-exit heads on the sentences of the input documents, report recall
+    and speed on held-out sentences, and save the heads for `ExitHeads.load`.
+    """
+    with redirect_stdout(sys.stderr):
+        try:
+            resolved = resolve_inputs(inputs, pattern)
+        except (FileNotFoundError, ValueError) as e:
+            msg.fail(str(e), exits=1)
+        if not resolved:
+            msg.fail("No input documents found.", exits=1)
+
+        sentences = [
+            sentence
+            for doc in read_documents(resolved)
+            for _, sentence in segment(doc.text)
+        ]
+        random.Random(0).shuffle(sentences)
+        n_held = int(len(sentences) * holdout)
+        held, train = sentences[:n_held], sentences[n_held:]
+        if not train:
+            msg.fail("No sentences to calibrate on.", exits=1)
+
+        model = _cached(_get_model, "model")
+        tokenizer = _cached(_get_tokenizer, "tokenizer")
+        heads = calibrate(
+            train, model, tokenizer, layers, target_recall, batch_size=batch_size
+        )
+        heads.save(output)
+        msg.good(
+            f"Exit heads for layer(s) {', '.join(str(h.layer) for h in heads.heads)} "
+            f"calibrated on {len(train)} sentence(s) and saved to '{output}'."
+        )
+        if held:
+            report = evaluate(held, heads, model, tokenizer, batch_size)
+            msg.info(f"Held-out sentences: {report}")
+
+
+@app.command()
+def watch(
+    directories: List[Path] = typer.Argument(..., help="Directories to watch."),
+    output_dir: Optional[Path] = typer.Option(
+        None,
+        "--output-dir",
+        "-o",
+        help="Mirror outputs under this directory instead of writing them next to the inputs.",
+    ),
+    pattern: str = typer.Option(
+        DEFAULT_PATTERN, help="File name pattern of the files to process."
+    ),
+    backend: Backend = typer.Option(Backend.SENTENCE, help="Extraction strategy."),
+    batch_size: int = typer.Option(DEFAULT_BATCH_SIZE, min=1),
+    batch_profile: Optional[Path] = BATCH_PROFILE,
+    workers: int = typer.Option(1, min=1, help="Number of model replicas."),
+    batch_window: float = typer.Option(
+        DEFAULT_BATCH_WINDOW,
+        min=0.0,
+        help="Seconds to collect newly arrived files into one batch.",
+    ),
+    max_batch: int = typer.Option(DEFAULT_MAX_BATCH, min=1, help="Files per batch."),
+    poll_interval: Optional[float] = typer.Option(
+        None,
+        min=0.01,
+        help="Poll every this many seconds instead of using inotify (e.g. on network "
+        "filesystems).",
+    ),
+) -> None:
+    """
+    Keep the model loaded and extract citations from every file that arrives in the watched
+    directories, writing `<file name>.citations.jsonl` for each. Stops on SIGINT or SIGTERM.
+    """
+    with redirect_stdout(sys.stderr):
+        model = _cached(_get_model, "model")
+        try:
+            daemon = WatchDaemon(
+                directories,
+                output_dir,
+                pattern,
+                backend.value,
+                batch_size,
+                workers,
+                model,
+                _cached(_get_tokenizer, "tokenizer"),
+                batch_window,
+                max_batch,
+                poll_interval,
+                backend_fn=_tuned_backend(batch_profile, backend.value, model),
+            )
+        except (FileNotFoundError, ValueError) as e:
+            msg.fail(str(e), exits=1)
+
+        stop = threading.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: stop.set())
+        report = daemon.run(stop)
+        msg.good(f"Stopped. {report}")
+
+
+JOB_DIR = typer.Option(
+    ..., help="Job directory, on a filesystem shared by every worker host."
+)
+
+
+@shard_app.command("init")
+def shard_init(
+    inputs: List[str] = typer.Argument(
+        ...,
+        help="Files, directories or glob patterns (paths must be valid on every host).",
+    ),
+    job_dir: Path = JOB_DIR,
+    pattern: str = typer.Option(
+        DEFAULT_PATTERN, help="File name pattern to search directories for."
+    ),
+    shard_size: int = typer.Option(
+        DEFAULT_SHARD_SIZE, min=1, help="Documents per shard."
+    ),
+    backend: Backend = typer.Option(Backend.SENTENCE, help="Extraction strategy."),
+    batch_size: int = typer.Option(DEFAULT_BATCH_SIZE, min=1),
+    max_attempts: int = typer.Option(
+        DEFAULT_MAX_ATTEMPTS, min=1, help="Attempts per shard before giving up on it."
+    ),
+) -> None:
+    """
+    Split the inputs into shards and queue them in the job directory.
+    """
+    try:
+        resolved = resolve_inputs(inputs, pattern)
+        ShardQueue.create(
+            job_dir, resolved, shard_size, backend.value, batch_size, max_attempts
+        )
+    except (FileNotFoundError, FileExistsError, ValueError) as e:
+        msg.fail(str(e), exits=1)
+    msg.good(
+        f"Queued {len(resolved)} document(s) in {-(-len(resolved) // shard_size)} "
+        f"shard(s) in '{job_dir}'."
+    )
+
+
+@shard_app.command("work")
+def shard_work(
+    job_dir: Path = JOB_DIR,
+    workers: int = typer.Option(1, min=1, help="Number of model replicas."),
+    lease_seconds: float = typer.Option(
+        DEFAULT_LEASE_SECONDS,
+        min=1.0,
+        help="Seconds without a heartbeat after which a shard goes to another worker.",
+    ),
+    worker_id: Optional[str] = typer.Option(None, help="Defaults to <host>:<pid>."),
+    batch_profile: Optional[Path] = BATCH_PROFILE,
+) -> None:
+    """
+    Claim and process shards until none are left. Run one per host, as many as you like.
+    """
+    queue = ShardQueue(job_dir)
+    if not queue.path.exists():
+        msg.fail(f"No job queue in '{job_dir}'.", exits=1)
+    with redirect_stdout(sys.stderr):
+        model = _cached(_get_model, "model")
+        try:
+            report = run_worker(
+                job_dir,
+                model,
+                _cached(_get_tokenizer, "tokenizer"),
+                workers,
+                worker_id,
+                lease_seconds,
+                backend_fn=_tuned_backend(
+                    batch_profile, queue.meta()["backend"], model
+                ),
+            )
+        except (FileNotFoundError, ValueError) as e:
+            msg.fail(str(e), exits=1)
+        msg.good(f"No shards left. This worker: {report}")
+
+
+@shard_app.command("status")
+def shard_status(job_dir: Path = JOB_DIR) -> None:
+    """
+    Show how many shards are pending, leased, done and failed.
+    """
+    queue = ShardQueue(job_dir)
+    if not queue.path.exists():
+        msg.fail(f"No job queue in '{job_dir}'.", exits=1)
+    typer.echo(", ".join(f"{state}: {n}" for state, n in queue.status().items()))
+    for shard_id, error in queue.failures().items():
+        typer.echo(f"shard {shard_id} failed: {error}")
+
+
+@shard_app.command("reduce")
+def shard_reduce(job_dir: Path = JOB_DIR) -> None:
+    """
+    Merge the shards' outputs into citations.jsonl and authorities.jsonl in the job directory.
+    """
+    if not ShardQueue(job_dir).path.exists():
+        msg.fail(f"No job queue in '{job_dir}'.", exits=1)
+    try:
+        authorities, n_citations = reduce_job(job_dir)
+    except RuntimeError as e:
+        msg.fail(str(e), exits=1)
+    msg.good(
+        f"{n_citations} citation(s) of {len(authorities.caselaw)} case(s) and "
+        f"{len(authorities.statutes)} statute(s) merged in '{job_dir}'."
+    )
+
+
+def main() -> None:
+    app()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+"""
+Extraction over whole corpora: collecting input documents, choosing an extraction backend and
+fanning documents out over a `ModelPool`.
+"""
+
+import glob
+import sys
+import time
+from collections import deque
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from pydantic import BaseModel
+from transformers import AutoModelForTokenClassification, PreTrainedTokenizerFast
+
+from .cascade import invoke_cascade
+from .dedupe import DedupeIndex
+from .invoke import DEFAULT_BATCH_SIZE, invoke
+from .packing import invoke_packed
+from .pool import ModelPool, Replica
+from .types import Citation
+from .windowing import invoke_windowed
+
+STDIN = "-"
+DEFAULT_PATTERN = "*.txt"
+
+
+class Document(BaseModel):
+    """
+    One input document. `id` is its path as given (relative to the input directory when that is
+    the only input), or "-" for standard input.
+    """
+
+    id: str
+    text: str
+    path: Optional[Path] = None
+
+    @property
+    def size(self) -> int:
+        return len(self.text.encode())
+
+
+def resolve_inputs(
+    inputs: Iterable[str], pattern: str = DEFAULT_PATTERN
+) -> List[Tuple[str, Optional[Path]]]:
+    """
+    Expands files, directories (searched recursively for `pattern`) and glob patterns into
+    `(document id, path)` pairs, in a stable order. "-" stands for standard input and has no path.
+
+    Files found in a directory are identified by their path relative to it if it is the only
+    input, and by their path as given otherwise, so that `a/x.txt` and `b/x.txt` stay apart. An
+    input that resolves to the same id twice is rejected.
+    """
+    inputs = list(inputs)
+    res: List[Tuple[str, Optional[Path]]] = []
+    for item in inputs:
+        if item == STDIN:
+            res.append((STDIN, None))
+            continue
+
+        path = Path(item)
+        if path.is_dir():
+            res.extend(
+                (str(p.relative_to(path)) if len(inputs) == 1 else str(p), p)
+                for p in sorted(path.rglob(pattern))
+                if p.is_file()
+            )
+        elif path.is_file():
+            res.append((str(path), path))
+        else:
+            matches = sorted(glob.glob(item, recursive=True))
+            if not matches:
+                raise FileNotFoundError(f"No input matches '{item}'.")
+            res.extend((m, Path(m)) for m in matches if Path(m).is_file())
+    check_unique(res)
+    return res
+
+
+def check_unique(inputs: Iterable[Tuple[str, Optional[Path]]]) -> None:
+    """
+    Raises ValueError if two resolved inputs share a document id.
+    """
+    seen = set()
+    for doc_id, _ in inputs:
+        if doc_id in seen:
+            raise ValueError(
+                f"Document id '{doc_id}' is given more than once; "
+                "list each input only once."
+            )
+        seen.add(doc_id)
+
+
+def total_size(inputs: Iterable[Tuple[str, Optional[Path]]]) -> Optional[int]:
+    """
+    The total size in bytes of the resolved inputs, or None if one of them is standard input.
+    """
+    total = 0
+    for _, path in inputs:
+        if path is None:
+            return None
+        total += path.stat().st_size
+    return total
+
+
+def read_documents(inputs: Iterable[Tuple[str, Optional[Path]]]) -> Iterator[Document]:
+    """
+    Lazily reads the resolved inputs, one document at a time.
+    """
+    for doc_id, path in inputs:
+        if path is None:
+            yield Document(id=doc_id, text=sys.stdin.read())
+        else:
+            yield Document(id=doc_id, text=path.read_text(errors="replace"), path=path)
+
+
+Backend = Callable[[Replica, str, int], List[Citation]]
+
+BACKENDS: Dict[str, Backend] = {
+    "sentence": lambda r, text, batch_size: invoke(
+        text, r.model, r.tokenizer, batch_size
+    ),
+    "window": lambda r, text, batch_size: invoke_windowed(
+        text, r.model, r.tokenizer, batch_size=batch_size
+    ),
+    "cascade": lambda r, text, batch_size: invoke_cascade(
+        text, r.model, r.tokenizer, batch_size=batch_size
+    ),
+    # Here `batch_size` counts packed rows, each holding many sentences.
+    "packed": lambda r, text, batch_size: invoke_packed(
+        text, r.model, r.tokenizer, batch_size
+    ),
+}
+
+
+def _timed_call(
+    replica: Replica, fn: Backend, text: str, batch_size: int
+) -> Tuple[List[Citation], float]:
+    start = time.perf_counter()
+    citations = fn(replica, text, batch_size)
+    return citations, time.perf_counter() - start
+
+
+def extract_documents(
+    docs: Iterable[Document],
+    backend: str = "sentence",
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    workers: int = 1,
+    model: Optional[AutoModelForTokenClassification] = None,
+    tokenizer: Optional[PreTrainedTokenizerFast] = None,
+    dedupe: Optional[DedupeIndex] = None,
+    backend_fn: Optional[Backend] = None,
+) -> Iterator[Tuple[Document, List[Citation]]]:
+    """
+    Runs `backend` over `docs` on a pool of `workers` replicas, yielding each document with its
+    citations (offsets relative to the document) in input order.
+
+    With a `DedupeIndex`, near-duplicates of an earlier document skip the model and reuse its
+    citations where the texts align; see `dedupe.report` for what that saved.
+
+    `backend_fn` runs in place of the backend's own function, e.g. `autotune.tuned_backend` for
+    the sentence backend with tuned batch sizes.
+
+    Only a few documents per worker are read ahead, so memory stays flat however large the corpus.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(
+            f"Unknown backend '{backend}', expected one of {sorted(BACKENDS)}."
+        )
+    fn = backend_fn or BACKENDS[backend]
+
+    with ModelPool(replicas=workers, model=model, tokenizer=tokenizer) as pool:
+        # (document, its result if it goes through the model, its dedupe key and whether that
+        # is the key of the canonical copy it duplicates)
+        in_flight: Deque[Tuple[Document, Optional[Future], int, bool]] = deque()
+
+        def resolve() -> Tuple[Document, List[Citation]]:
+            doc, future, key, duplicate = in_flight.popleft()
+            if future is None:
+                # Its canonical copy came earlier, so it has been resolved already.
+                citations = dedupe.reuse(key, doc.text)  # pyright: ignore
+                if citations is not None:
+                    return doc, citations
+                future = pool.submit(_timed_call, fn, doc.text, batch_size)
+            citations, seconds = future.result()
+            if dedupe is not None and not duplicate:
+                dedupe.store(key, citations, seconds)
+            return doc, citations
+
+        for doc in docs:
+            key, duplicate = dedupe.match(doc.text) if dedupe else (0, False)
+            future = (
+                None
+                if duplicate
+                else pool.submit(_timed_call, fn, doc.text, batch_size)
+            )
+            in_flight.append((doc, future, key, duplicate))
+            if len(in_flight) >= 2 * workers:
+                yield resolve()
+        while in_flight:
+            yield resolve()
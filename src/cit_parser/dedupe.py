@@ -0,0 +1,293 @@
+"""
+Near-duplicate documents: find them with MinHash/LSH and reuse the citations of the copy already
+processed.
+
+Court feeds deliver the same opinion many times (slip opinion, reporter version, re-scrapes) with
+only whitespace or header differences. Every document processed gets a MinHash signature over its
+word 5-grams, indexed by locality-sensitive hashing. A later document whose estimated Jaccard
+similarity to an indexed one reaches the threshold is a duplicate of it: instead of running the
+model, the canonical copy's citations are carried over by aligning the two texts word by word and
+re-basing every citation's offsets.
+
+Citations are only carried over when they are all that could be found: the duplicate is processed
+normally if any citation cannot be found at its aligned position with the same text, or if the
+words only the duplicate has (plus the words on either side of them) contain a citation signal (a digit,
+"§", Id. or supra, see `rules.needs_model`), since these could hold a citation the canonical copy
+does not have.
+"""
+
+import bisect
+import difflib
+import re
+import time
+import zlib
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+from pydantic import BaseModel
+
+from .rules import needs_model
+from .types import Citation
+
+DEFAULT_THRESHOLD = 0.8
+DEFAULT_NUM_PERM = 128
+DEFAULT_BANDS = 32
+SHINGLE_SIZE = 5
+# Aligned words on either side of a changed passage that are checked for a citation signal along
+# with it, for citations that are only partly inside the change (e.g. a new case name in front of
+# an unchanged "410 U.S. 113").
+CONTEXT_WORDS = 1
+
+# A prime just below 2**32: with 32-bit shingle hashes and coefficients below it, `a * x + b`
+# never overflows uint64.
+_PRIME = np.uint64(4294967291)
+
+_WORD = re.compile(r"\w+")
+_TOKEN = re.compile(r"\S+")
+
+
+def shingles(text: str, k: int = SHINGLE_SIZE) -> Set[int]:
+    """
+    Hashes of the lowercased word `k`-grams of `text`, so that whitespace, case and punctuation
+    changes do not count as differences.
+    """
+    words = _WORD.findall(text.lower())
+    if len(words) < k:
+        return {zlib.crc32(" ".join(words).encode())} if words else set()
+    return {
+        zlib.crc32(" ".join(words[i : i + k]).encode())
+        for i in range(len(words) - k + 1)
+    }
+
+
+class MinHasher:
+    """
+    `num_perm` universal hash functions `(a * x + b) mod p`; a signature is the minimum of each
+    over a document's shingles.
+    """
+
+    def __init__(self, num_perm: int = DEFAULT_NUM_PERM, seed: int = 1):
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, int(_PRIME), size=(num_perm, 1), dtype=np.uint64)
+        self.b = rng.integers(0, int(_PRIME), size=(num_perm, 1), dtype=np.uint64)
+
+    def signature(self, hashes: Set[int]) -> np.ndarray:
+        x = np.fromiter(hashes, dtype=np.uint64, count=len(hashes))[None, :]
+        return ((self.a * x + self.b) % _PRIME).min(axis=1).astype(np.uint32)
+
+
+def similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """
+    The Jaccard similarity of two documents, estimated from their signatures.
+    """
+    return float(np.mean(a == b))
+
+
+def _words(text: str) -> Tuple[List[str], List[int]]:
+    matches = list(_TOKEN.finditer(text))
+    return [m.group() for m in matches], [m.start() for m in matches]
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.split())
+
+
+def rebase_citations(
+    citations: List[Citation], source: str, target: str
+) -> Optional[List[Citation]]:
+    """
+    Moves `citations` found in `source` to the same text in `target`, which differs from `source`
+    in whitespace or a few inserted or removed passages. Returns None if any citation does not
+    align, i.e. its words are not in an unchanged run of `target` or its text (up to whitespace)
+    differs there, or if a passage only `target` has may hold a citation of its own.
+    """
+    if source == target:
+        return list(citations)
+
+    source_words, source_starts = _words(source)
+    target_words, target_starts = _words(target)
+    matcher = difflib.SequenceMatcher(None, source_words, target_words, autojunk=False)
+    aligned: Dict[int, int] = {}
+    for i, j, n in matcher.get_matching_blocks():
+        for k in range(n):
+            aligned[i + k] = j + k
+
+    kept = set(aligned.values())
+    # The words only `target` has, widened by CONTEXT_WORDS on both sides.
+    near = {
+        k
+        for j in range(len(target_words))
+        if j not in kept
+        for k in range(
+            max(0, j - CONTEXT_WORDS), min(len(target_words), j + CONTEXT_WORDS + 1)
+        )
+    }
+    if near and needs_model(" ".join(target_words[k] for k in sorted(near))):
+        return None
+
+    def move(pos: int) -> Optional[int]:
+        # The word containing `pos`, and `pos`'s distance from its first character.
+        i = bisect.bisect_right(source_starts, pos) - 1
+        if i < 0 or i not in aligned:
+            return None
+        return target_starts[aligned[i]] + pos - source_starts[i]
+
+    res = []
+    for cit in citations:
+        start, end = move(cit.start), move(cit.end - 1)
+        if start is None or end is None:
+            return None
+        end += 1
+        if _normalize(target[start:end]) != _normalize(source[cit.start : cit.end]):
+            return None
+        res.append(cit.model_copy(update={"start": start, "end": end}))
+    return res
+
+
+class DedupeReport(BaseModel):
+    """
+    What deduplication did: of `documents`, `duplicates` matched an earlier copy. Of those,
+    `rebased` reused its citations and `reprocessed` did not align and went through the model.
+    `seconds_saved` is the model time of the canonical copies behind the rebased duplicates;
+    `overhead_seconds` the time spent hashing and aligning.
+    """
+
+    documents: int = 0
+    duplicates: int = 0
+    rebased: int = 0
+    reprocessed: int = 0
+    seconds_saved: float = 0.0
+    overhead_seconds: float = 0.0
+
+    @property
+    def ratio(self) -> float:
+        return self.duplicates / self.documents if self.documents else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"{self.duplicates} of {self.documents} document(s) were near-duplicates "
+            f"({self.ratio:.1%}); {self.rebased} reused, {self.reprocessed} reprocessed. "
+            f"Saved {self.seconds_saved - self.overhead_seconds:.2f}s "
+            f"({self.seconds_saved:.2f}s of inference, {self.overhead_seconds:.2f}s overhead)."
+        )
+
+
+class _Entry:
+    def __init__(self, signature: np.ndarray, bands: List[bytes], text: str):
+        self.signature = signature
+        self.bands = bands
+        self.text = text
+        self.citations: Optional[List[Citation]] = None
+        self.seconds = 0.0
+
+
+class DedupeIndex:
+    """
+    The canonical documents seen so far, their signatures in an LSH index of `bands` bands, and
+    their citations once known.
+
+    Only the `cache_size` most recent canonical documents are kept (text and citations included);
+    a copy of an evicted one is processed, and becomes canonical, again.
+    """
+
+    def __init__(
+        self,
+        threshold: float = DEFAULT_THRESHOLD,
+        num_perm: int = DEFAULT_NUM_PERM,
+        bands: int = DEFAULT_BANDS,
+        cache_size: int = 10_000,
+        seed: int = 1,
+    ):
+        if num_perm % bands:
+            raise ValueError(
+                f"num_perm ({num_perm}) must be a multiple of bands ({bands})."
+            )
+        self.threshold = threshold
+        self.rows = num_perm // bands
+        self.cache_size = max(1, cache_size)
+        self.hasher = MinHasher(num_perm, seed)
+        self.report = DedupeReport()
+        self._buckets: List[Dict[bytes, Set[int]]] = [{} for _ in range(bands)]
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        self._next_key = 0
+
+    def match(self, text: str) -> Tuple[int, bool]:
+        """
+        Looks up `text`. Returns the key of its canonical copy and True if it is a near-duplicate
+        of one, and otherwise indexes it as canonical under a new key and returns that and False.
+        Call `store` with the citations of every new canonical document.
+        """
+        start = time.perf_counter()
+        try:
+            self.report.documents += 1
+            hashes = shingles(text)
+            if not hashes:
+                return self._add(None, [], text), False
+
+            signature = self.hasher.signature(hashes)
+            bands = [
+                signature[b * self.rows : (b + 1) * self.rows].tobytes()
+                for b in range(len(self._buckets))
+            ]
+            candidates: Set[int] = set()
+            for bucket, band in zip(self._buckets, bands):
+                candidates |= bucket.get(band, set())
+
+            best, best_similarity = None, self.threshold
+            for key in candidates:
+                s = similarity(signature, self._entries[key].signature)
+                if s >= best_similarity:
+                    best, best_similarity = key, s
+            if best is not None:
+                self.report.duplicates += 1
+                return best, True
+            return self._add(signature, bands, text), False
+        finally:
+            self.report.overhead_seconds += time.perf_counter() - start
+
+    def _add(
+        self, signature: Optional[np.ndarray], bands: List[bytes], text: str
+    ) -> int:
+        key = self._next_key
+        self._next_key += 1
+        self._entries[key] = _Entry(signature, bands, text)  # pyright: ignore
+        for bucket, band in zip(self._buckets, bands):
+            bucket.setdefault(band, set()).add(key)
+        while len(self._entries) > self.cache_size:
+            self._evict()
+        return key
+
+    def _evict(self) -> None:
+        key, entry = self._entries.popitem(last=False)
+        for bucket, band in zip(self._buckets, entry.bands):
+            keys = bucket[band]
+            keys.discard(key)
+            if not keys:
+                del bucket[band]
+
+    def store(self, key: int, citations: List[Citation], seconds: float) -> None:
+        """
+        Records the citations of canonical document `key`, and how long the model took on it.
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            entry.citations, entry.seconds = citations, seconds
+
+    def reuse(self, key: int, text: str) -> Optional[List[Citation]]:
+        """
+        The citations of canonical document `key` re-based onto its duplicate `text`, or None if
+        they are unknown or do not align (and `text` must be processed after all).
+        """
+        start = time.perf_counter()
+        entry = self._entries.get(key)
+        res = None
+        if entry is not None and entry.citations is not None:
+            res = rebase_citations(entry.citations, entry.text, text)
+        self.report.overhead_seconds += time.perf_counter() - start
+        if res is None:
+            self.report.reprocessed += 1
+        else:
+            self.report.rebased += 1
+            self.report.seconds_saved += entry.seconds  # pyright: ignore
+        return res
@@ -0,0 +1,148 @@
+"""
+Detection-only mode: where are the citations, without building them.
+
+Routing and redaction only need to know whether text contains citations and roughly where. This
+mode runs the same segmentation and model as `invoke()` but decodes the predicted label ids
+straight into `(label, start, end)` spans with plain tuples, skipping `LabelPrediction` objects,
+entity aggregation, citation construction and Pydantic validation altogether.
+
+Spans are raw BIO entities: an "O" token or a new "B-" label ends a span, and nothing checks that
+the entities add up to a complete citation. A sentence flagged here may therefore yield no
+citation in `invoke()`, but `invoke()` never finds a citation in a sentence not flagged here.
+"""
+
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from transformers import AutoModelForTokenClassification, PreTrainedTokenizerFast
+
+from . import metrics
+from .constants import ALL_LABELS
+from .invoke import (
+    DEFAULT_BATCH_SIZE,
+    _cached,
+    _get_model,
+    _get_tokenizer,
+    encode_batch,
+    predict_batch,
+    segment,
+)
+
+# (label, start, end), with document-absolute offsets
+Span = Tuple[str, int, int]
+
+ENTITY_LABELS = sorted({label[2:] for label in ALL_LABELS if label != "O"})
+_ENTITY_INDEX: Dict[str, int] = {label: i for i, label in enumerate(ENTITY_LABELS)}
+
+_BEGIN, _INSIDE, _OUTSIDE = 0, 1, 2
+# For every label id: whether it begins, continues or is outside an entity, and its entity label.
+_DECODE: List[Tuple[int, Optional[str]]] = [
+    (_OUTSIDE, None)
+    if label == "O"
+    else (_BEGIN if label.startswith("B-") else _INSIDE, label[2:])
+    for label in ALL_LABELS
+]
+
+
+def decode_spans(
+    label_ids: Sequence[int], offset_mapping: Sequence[Sequence[int]], offset: int = 0
+) -> List[Span]:
+    """
+    Decodes one row of predicted label ids into BIO entity spans, shifted by `offset`.
+    """
+    res: List[Span] = []
+    current: Optional[str] = None
+    start = end = 0
+    for label_id, (token_start, token_end) in zip(label_ids, offset_mapping):
+        if token_start == token_end:  # special tokens and padding
+            continue
+        kind, label = _DECODE[label_id]
+        if kind == _INSIDE and label == current:
+            end = token_end
+            continue
+        if current is not None:
+            res.append((current, start + offset, end + offset))
+            current = None
+        if kind == _BEGIN:
+            current, start, end = label, token_start, token_end
+    if current is not None:
+        res.append((current, start + offset, end + offset))
+    return res
+
+
+def _detect_sentences(
+    text: str,
+    model: Optional[AutoModelForTokenClassification],
+    tokenizer: Optional[PreTrainedTokenizerFast],
+    batch_size: int,
+) -> List[Tuple[int, str, List[Span]]]:
+    metrics.DOCUMENTS.inc()
+    model = model if model is not None else _cached(_get_model, "model")
+    tokenizer = tokenizer or _cached(_get_tokenizer, "tokenizer")
+    sentences = segment(text)
+    spans: List[List[Span]] = [[] for _ in sentences]
+
+    order = sorted(range(len(sentences)), key=lambda i: len(sentences[i][1]))
+    for b in range(0, len(order), batch_size):
+        indices = order[b : b + batch_size]
+        tokenized_input, offset_mapping = encode_batch(
+            [sentences[i][1] for i in indices], tokenizer
+        )
+        predictions = predict_batch(tokenized_input, model)
+        for row, i in enumerate(indices):
+            spans[i] = decode_spans(
+                predictions[row], offset_mapping[row], sentences[i][0]
+            )
+
+    return [(start, sentence, s) for (start, sentence), s in zip(sentences, spans)]
+
+
+def detect(
+    text: str,
+    model: Optional[AutoModelForTokenClassification] = None,
+    tokenizer: Optional[PreTrainedTokenizerFast] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> List[Span]:
+    """
+    Returns every labeled entity in `text` as a `(label, start, end)` tuple, e.g.
+    `("REPORTER", 31, 35)`, in document order.
+    """
+    return [
+        span
+        for _, _, spans in _detect_sentences(text, model, tokenizer, batch_size)
+        for span in spans
+    ]
+
+
+def detect_array(
+    text: str,
+    model: Optional[AutoModelForTokenClassification] = None,
+    tokenizer: Optional[PreTrainedTokenizerFast] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> np.ndarray:
+    """
+    Like `detect`, as an `(n, 3)` int32 array of `(label index, start, end)` rows, where the label
+    index points into `ENTITY_LABELS`.
+    """
+    spans = detect(text, model, tokenizer, batch_size)
+    res = np.empty((len(spans), 3), dtype=np.int32)
+    for row, (label, start, end) in enumerate(spans):
+        res[row] = (_ENTITY_INDEX[label], start, end)
+    return res
+
+
+def detect_sentences(
+    text: str,
+    model: Optional[AutoModelForTokenClassification] = None,
+    tokenizer: Optional[PreTrainedTokenizerFast] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> List[Tuple[int, int, bool]]:
+    """
+    Returns `(start, end, has_entities)` for every sentence of `text`.
+    """
+    return [
+        (start, start + len(sentence), bool(spans))
+        for start, sentence, spans in _detect_sentences(
+            text, model, tokenizer, batch_size
+        )
+    ]
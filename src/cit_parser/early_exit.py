@@ -0,0 +1,518 @@
+"""
+Early-exit inference: stop at an intermediate layer for sentences that are confidently all "O".
+
+Most sentences in a legal document contain no citation at all, yet each goes through every
+encoder layer. Here a small logistic head on each of a few intermediate layers scores every token
+with the probability that the full model labels it something other than "O". A sentence whose
+highest token score at an exit layer is at or below that layer's threshold leaves the batch there,
+labeled all "O"; the rest continue, and whatever reaches the top layer is labeled by the model's
+own classifier as usual.
+
+Heads are trained and thresholds calibrated offline by `calibrate` against the full model's own
+predictions, so no annotated data is needed. Each threshold is set so that at most a small share of
+the calibration sentences in which the full model finds entities would exit, which bounds the
+recall lost. `evaluate` measures the actual recall and speed on held-out text.
+"""
+
+import os
+import time
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import torch
+from pydantic import BaseModel
+from transformers import AutoModelForTokenClassification, PreTrainedTokenizerFast
+from wasabi import msg
+
+from . import metrics
+from .checkpoint import model_revision
+from .constants import ALL_LABELS
+from .invoke import (
+    DEFAULT_BATCH_SIZE,
+    _cached,
+    _get_model,
+    _get_tokenizer,
+    batch_tokens,
+    decode_batch,
+    encode_batch,
+    predict_batch,
+    segment,
+    sentences_to_citations,
+)
+from .metrics import timed
+from .records import Label, label_models
+from .types import Citation, LabelPrediction
+
+PathLike = Union[str, os.PathLike]
+
+O_ID = ALL_LABELS.index("O")
+
+DEFAULT_TARGET_RECALL = 0.99
+
+# O tokens kept per calibration sentence to train the heads on; entity tokens are all kept.
+_O_TOKENS_PER_SENTENCE = 4
+
+
+class ExitHead:
+    """
+    A logistic "is not O" classifier on the output of encoder layer `layer` (1-based), and the
+    sentence-level exit threshold on its scores.
+    """
+
+    def __init__(self, layer: int, weight: torch.Tensor, bias: float, threshold: float):
+        self.layer = layer
+        self.weight = weight
+        self.bias = bias
+        self.threshold = threshold
+
+    def scores(self, hidden: torch.Tensor) -> torch.Tensor:
+        return torch.sigmoid(hidden @ self.weight.to(hidden) + self.bias)
+
+
+class ExitHeads:
+    """
+    The calibrated exit heads of one model, by layer.
+    """
+
+    def __init__(self, heads: List[ExitHead], model_revision: str):
+        self.heads = sorted(heads, key=lambda head: head.layer)
+        self.model_revision = model_revision
+
+    def by_layer(self) -> Dict[int, ExitHead]:
+        return {head.layer: head for head in self.heads}
+
+    def save(self, path: PathLike) -> None:
+        torch.save(
+            {
+                "model_revision": self.model_revision,
+                "heads": [
+                    {
+                        "layer": h.layer,
+                        "weight": h.weight,
+                        "bias": h.bias,
+                        "threshold": h.threshold,
+                    }
+                    for h in self.heads
+                ],
+            },
+            path,
+        )
+
+    @classmethod
+    def load(
+        cls, path: PathLike, model: Optional[AutoModelForTokenClassification] = None
+    ) -> "ExitHeads":
+        """
+        The heads saved at `path`. With `model`, raises ValueError if they were calibrated for
+        another one.
+        """
+        data = torch.load(path, weights_only=True)
+        heads = cls([ExitHead(**h) for h in data["heads"]], data["model_revision"])
+        if model is not None:
+            heads.check_model(model)
+        return heads
+
+    def check_model(self, model: AutoModelForTokenClassification) -> None:
+        """
+        Raises ValueError unless the heads were calibrated for `model`: another model's hidden
+        states mean nothing to them.
+        """
+        revision = model_revision(model)
+        if revision != self.model_revision:
+            raise ValueError(
+                f"Exit heads were calibrated for model revision '{self.model_revision}', "
+                f"not '{revision}'; run `cit-parser calibrate-exits` again."
+            )
+
+
+def _encoder(model: AutoModelForTokenClassification):
+    base = model.base_model  # pyright: ignore
+    if not (
+        hasattr(base, "embeddings")
+        and hasattr(base, "encoder")
+        and hasattr(model, "classifier")
+    ):
+        raise ValueError(
+            f"Early exit needs a BERT-style encoder, not {type(model).__name__}."
+        )
+    return base.embeddings, base.encoder.layer
+
+
+def _run_layer(layer, hidden: torch.Tensor, mask: torch.Tensor) -> torch.Tensor:
+    out = layer(hidden, attention_mask=mask)
+    # transformers 4.x returns a tuple, 5.x the hidden states.
+    return out[0] if isinstance(out, tuple) else out
+
+
+def _additive_mask(attention_mask: torch.Tensor, dtype: torch.dtype) -> torch.Tensor:
+    mask = torch.zeros(attention_mask.shape, dtype=dtype, device=attention_mask.device)
+    mask = mask.masked_fill(attention_mask == 0, torch.finfo(dtype).min)
+    return mask[:, None, None, :]
+
+
+def _real_tokens(
+    tokenized_input: Dict[str, torch.Tensor], tokenizer: PreTrainedTokenizerFast
+) -> torch.Tensor:
+    special = torch.tensor(
+        tokenizer.all_special_ids, device=tokenized_input["input_ids"].device
+    )
+    return (tokenized_input["attention_mask"] == 1) & ~torch.isin(
+        tokenized_input["input_ids"], special
+    )
+
+
+def predict_batch_early_exit(
+    tokenized_input: Dict[str, torch.Tensor],
+    model: AutoModelForTokenClassification,
+    heads: ExitHeads,
+    tokenizer: PreTrainedTokenizerFast,
+) -> Tuple[List[List[int]], List[int]]:
+    """
+    Like `predict_batch`, exiting rows early where the heads allow. Also returns the number of
+    layers each row went through.
+    """
+    embeddings, layers = _encoder(model)
+    exits = heads.by_layer()
+    input_ids = tokenized_input["input_ids"]
+    n_rows, width = input_ids.shape
+    predictions = torch.full((n_rows, width), O_ID, dtype=torch.long)
+    depth = [len(layers)] * n_rows
+
+    with timed("inference"), torch.no_grad():
+        hidden = embeddings(
+            input_ids=input_ids, token_type_ids=tokenized_input.get("token_type_ids")
+        )
+        mask = _additive_mask(tokenized_input["attention_mask"], hidden.dtype)
+        real = _real_tokens(tokenized_input, tokenizer)
+        rows = torch.arange(n_rows)
+
+        for i, layer in enumerate(layers, 1):
+            hidden = _run_layer(layer, hidden, mask)
+            head = exits.get(i)
+            if head is None or i == len(layers):
+                continue
+            scores = head.scores(hidden).masked_fill(~real, 0.0)
+            leave = scores.max(dim=1).values <= head.threshold
+            if not leave.any():
+                continue
+            for row in rows[leave.cpu()].tolist():
+                depth[row] = i
+            metrics.EARLY_EXITS.inc(int(leave.sum()), layer=str(i))
+            stay = ~leave
+            rows, hidden, mask, real = (
+                rows[stay.cpu()],
+                hidden[stay],
+                mask[stay],
+                real[stay],
+            )
+            if not len(rows):
+                break
+
+        if len(rows):
+            logits = model.classifier(hidden)  # pyright: ignore
+            predictions[rows] = torch.argmax(logits, dim=-1).cpu()
+
+    return predictions.tolist(), depth
+
+
+def infer_labels_early_exit(
+    texts: List[str],
+    model: AutoModelForTokenClassification,
+    heads: ExitHeads,
+    tokenizer: Optional[PreTrainedTokenizerFast] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> List[List[LabelPrediction]]:
+    """
+    Like `infer_labels_batch`, with early exits.
+    """
+    return label_models(
+        _infer_labels_early_exit(texts, model, heads, tokenizer, batch_size)
+    )
+
+
+def _infer_labels_early_exit(
+    texts: List[str],
+    model: AutoModelForTokenClassification,
+    heads: ExitHeads,
+    tokenizer: Optional[PreTrainedTokenizerFast] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> List[List[Label]]:
+    heads.check_model(model)
+    tokenizer = tokenizer or _cached(_get_tokenizer, "tokenizer")
+    res: List[List[Label]] = [[] for _ in texts]
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+    for b in range(0, len(order), batch_size):
+        indices = order[b : b + batch_size]
+        tokenized_input, offset_mapping = encode_batch(
+            [texts[i] for i in indices], tokenizer
+        )
+        predictions, _ = predict_batch_early_exit(
+            tokenized_input, model, heads, tokenizer
+        )
+        tokens = batch_tokens(tokenized_input, tokenizer)
+        for i, labels in zip(
+            indices, decode_batch(tokens, predictions, offset_mapping)
+        ):
+            res[i] = labels
+    return res
+
+
+def invoke_early_exit(
+    text: str,
+    heads: ExitHeads,
+    model: Optional[AutoModelForTokenClassification] = None,
+    tokenizer: Optional[PreTrainedTokenizerFast] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> List[Citation]:
+    """
+    Like `invoke()`, with early exits.
+    """
+    metrics.DOCUMENTS.inc()
+    model = model if model is not None else _cached(_get_model, "model")
+    sentences = segment(text)
+    predictions = _infer_labels_early_exit(
+        [sentence for _, sentence in sentences], model, heads, tokenizer, batch_size
+    )
+    return sentences_to_citations(sentences, predictions)
+
+
+def _hidden_states(
+    texts: List[str],
+    model: AutoModelForTokenClassification,
+    tokenizer: PreTrainedTokenizerFast,
+    layers: Sequence[int],
+    batch_size: int,
+):
+    """
+    Yields, per batch, the real-token mask, the full model's "is not O" labels, and the hidden
+    states after each of `layers`.
+
+    The layers are run one by one, as in `predict_batch_early_exit`: asking the model for
+    `output_hidden_states` would leave transformers' capturing hooks on it, and a model with
+    those can no longer be pickled, e.g. to start a worker process.
+    """
+    embeddings, encoder_layers = _encoder(model)
+    for b in range(0, len(texts), batch_size):
+        tokenized_input, _ = encode_batch(texts[b : b + batch_size], tokenizer)
+        hidden_states = {}
+        with torch.no_grad():
+            hidden = embeddings(
+                input_ids=tokenized_input["input_ids"],
+                token_type_ids=tokenized_input.get("token_type_ids"),
+            )
+            mask = _additive_mask(tokenized_input["attention_mask"], hidden.dtype)
+            for i, layer in enumerate(encoder_layers, 1):
+                hidden = _run_layer(layer, hidden, mask)
+                if i in layers:
+                    hidden_states[i] = hidden
+            logits = model.classifier(hidden)  # pyright: ignore
+        entity = torch.argmax(logits, dim=-1) != O_ID
+        real = _real_tokens(tokenized_input, tokenizer)
+        yield real, entity & real, hidden_states
+
+
+def _train_head(
+    features: torch.Tensor, labels: torch.Tensor
+) -> Tuple[torch.Tensor, float]:
+    """
+    L2-regularized logistic regression, with the classes weighted to count equally.
+    """
+    features, labels = features.double(), labels.double()
+    weight = torch.zeros(features.shape[1], dtype=torch.double, requires_grad=True)
+    bias = torch.zeros(1, dtype=torch.double, requires_grad=True)
+    positives = labels.sum().clamp(min=1)
+    pos_weight = (len(labels) - positives).clamp(min=1) / positives
+    loss_fn = torch.nn.BCEWithLogitsLoss(pos_weight=pos_weight)
+    optimizer = torch.optim.LBFGS(
+        [weight, bias], max_iter=200, line_search_fn="strong_wolfe"
+    )
+
+    def closure():
+        optimizer.zero_grad()
+        loss = loss_fn(features @ weight + bias, labels) + 1e-4 * weight.square().sum()
+        loss.backward()
+        return loss
+
+    with torch.enable_grad():
+        optimizer.step(closure)
+    return weight.detach().float(), float(bias.item())
+
+
+def _threshold(entity_scores: np.ndarray, budget: float) -> float:
+    """
+    The highest threshold at which at most `budget` of the sentences with these (max token)
+    scores would exit; -1 (never exit) if there are none to calibrate on.
+    """
+    if not len(entity_scores):
+        return -1.0
+    # Scores are compared in float32 at inference, so step down in float32 too.
+    ranked = np.sort(entity_scores.astype(np.float32))
+    allowed = int(np.floor(budget * len(ranked)))
+    if allowed >= len(ranked):
+        return 1.0
+    return float(np.nextafter(ranked[allowed], np.float32(-np.inf)))
+
+
+def default_exit_layers(model: AutoModelForTokenClassification) -> List[int]:
+    n = model.config.num_hidden_layers  # pyright: ignore
+    return sorted({max(1, n * k // 4) for k in (1, 2, 3)} - {n})
+
+
+def calibrate(
+    sentences: List[str],
+    model: Optional[AutoModelForTokenClassification] = None,
+    tokenizer: Optional[PreTrainedTokenizerFast] = None,
+    layers: Optional[Sequence[int]] = None,
+    target_recall: float = DEFAULT_TARGET_RECALL,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    seed: int = 0,
+) -> ExitHeads:
+    """
+    Trains an exit head on each of `layers` (by default at 1/4, 1/2 and 3/4 depth) against the
+    full model's labels on `sentences`, and sets each threshold so that the sentences with entities
+    wrongly exiting, summed over all layers, stay within `1 - target_recall`.
+    """
+    model = model if model is not None else _cached(_get_model, "model")
+    tokenizer = tokenizer or _cached(_get_tokenizer, "tokenizer")
+    layers = sorted(set(layers or default_exit_layers(model)))
+    n_layers = model.config.num_hidden_layers  # pyright: ignore
+    if not layers or layers[0] < 1 or layers[-1] >= n_layers:
+        raise ValueError(f"Exit layers must be between 1 and {n_layers - 1}.")
+    generator = torch.Generator().manual_seed(seed)
+
+    # First pass: a training set per layer of every entity token and a sample of O tokens.
+    features: Dict[int, List[torch.Tensor]] = {i: [] for i in layers}
+    labels: List[torch.Tensor] = []
+    for real, entity, hidden in _hidden_states(
+        sentences, model, tokenizer, layers, batch_size
+    ):
+        keep = entity.clone()
+        for row in range(len(real)):
+            candidates = torch.nonzero(real[row] & ~entity[row]).flatten()
+            sample = candidates[
+                torch.randperm(len(candidates), generator=generator)[
+                    :_O_TOKENS_PER_SENTENCE
+                ]
+            ]
+            keep[row, sample] = True
+        labels.append(entity[keep])
+        for i in layers:
+            features[i].append(hidden[i][keep].cpu())
+    y = torch.cat(labels).cpu()
+    trained = {i: _train_head(torch.cat(features[i]), y) for i in layers}
+
+    # Second pass: each sentence's highest token score per layer, for the sentences with entities.
+    heads = {i: ExitHead(i, weight, bias, 1.0) for i, (weight, bias) in trained.items()}
+    entity_scores: Dict[int, List[float]] = {i: [] for i in layers}
+    for real, entity, hidden in _hidden_states(
+        sentences, model, tokenizer, layers, batch_size
+    ):
+        has_entity = entity.any(dim=1)
+        for i in layers:
+            scores = (
+                heads[i].scores(hidden[i]).masked_fill(~real, 0.0).max(dim=1).values
+            )
+            entity_scores[i].extend(scores[has_entity].tolist())
+
+    budget = (1.0 - target_recall) / len(layers)
+    for i in layers:
+        heads[i].threshold = _threshold(np.array(entity_scores[i]), budget)
+        msg.info(
+            f"Layer {i}: exit threshold {heads[i].threshold:.4f} "
+            f"({len(entity_scores[i])} sentence(s) with entities)."
+        )
+    return ExitHeads(list(heads.values()), model_revision(model))
+
+
+class EarlyExitReport(BaseModel):
+    """
+    Early exit against full inference on the same sentences. Recall counts the full model's
+    sentences with entities, and citations, that early exit still finds.
+    """
+
+    sentences: int = 0
+    exits: Dict[int, int] = {}
+    layers_fraction: float = 1.0
+    entity_sentences: int = 0
+    entity_sentence_recall: float = 1.0
+    citations: int = 0
+    citation_recall: float = 1.0
+    full_seconds: float = 0.0
+    early_exit_seconds: float = 0.0
+
+    @property
+    def speedup(self) -> float:
+        return (
+            self.full_seconds / self.early_exit_seconds
+            if self.early_exit_seconds
+            else 0.0
+        )
+
+    def __str__(self) -> str:
+        exits = ", ".join(f"layer {k}: {v}" for k, v in sorted(self.exits.items()))
+        return (
+            f"{self.sentences} sentence(s); exits {exits or 'none'}; "
+            f"{self.layers_fraction:.0%} of the layer computations. "
+            f"Recall: {self.entity_sentence_recall:.2%} of {self.entity_sentences} sentence(s) "
+            f"with entities, {self.citation_recall:.2%} of {self.citations} citation(s). "
+            f"{self.full_seconds:.2f}s -> {self.early_exit_seconds:.2f}s ({self.speedup:.2f}x)."
+        )
+
+
+def evaluate(
+    sentences: List[str],
+    heads: ExitHeads,
+    model: Optional[AutoModelForTokenClassification] = None,
+    tokenizer: Optional[PreTrainedTokenizerFast] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> EarlyExitReport:
+    """
+    Runs `sentences` through the full model and with early exits, and compares the two.
+    """
+    model = model if model is not None else _cached(_get_model, "model")
+    heads.check_model(model)
+    tokenizer = tokenizer or _cached(_get_tokenizer, "tokenizer")
+    n_layers = model.config.num_hidden_layers  # pyright: ignore
+    report = EarlyExitReport(sentences=len(sentences))
+    full: List[List[Label]] = []
+    early: List[List[Label]] = []
+    depths: List[int] = []
+
+    for b in range(0, len(sentences), batch_size):
+        tokenized_input, offset_mapping = encode_batch(
+            sentences[b : b + batch_size], tokenizer
+        )
+        tokens = batch_tokens(tokenized_input, tokenizer)
+
+        start = time.perf_counter()
+        predictions = predict_batch(tokenized_input, model)
+        report.full_seconds += time.perf_counter() - start
+        full.extend(decode_batch(tokens, predictions, offset_mapping))
+
+        start = time.perf_counter()
+        predictions, depth = predict_batch_early_exit(
+            tokenized_input, model, heads, tokenizer
+        )
+        report.early_exit_seconds += time.perf_counter() - start
+        early.extend(decode_batch(tokens, predictions, offset_mapping))
+        depths.extend(depth)
+
+    for depth in depths:
+        if depth < n_layers:
+            report.exits[depth] = report.exits.get(depth, 0) + 1
+    report.layers_fraction = sum(depths) / (n_layers * len(depths)) if depths else 1.0
+
+    found = [i for i, labels in enumerate(full) if labels]
+    report.entity_sentences = len(found)
+    if found:
+        report.entity_sentence_recall = sum(1 for i in found if early[i]) / len(found)
+
+    located = [(i, s) for i, s in enumerate(sentences)]
+    full_citations = {(c.span, str(c)) for c in sentences_to_citations(located, full)}
+    early_citations = {(c.span, str(c)) for c in sentences_to_citations(located, early)}
+    report.citations = len(full_citations)
+    if full_citations:
+        report.citation_recall = len(full_citations & early_citations) / len(
+            full_citations
+        )
+    return report
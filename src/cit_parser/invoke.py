@@ -1,10 +1,24 @@
 import os
+import sys
+import time
+from contextlib import redirect_stdout
 from functools import lru_cache
-from typing import Dict, List, Optional
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+)
 
 import spacy
 import torch
 from pydantic import BaseModel
+from spacy.tokens import Doc
 from transformers import (
     AutoModelForTokenClassification,
     AutoTokenizer,
@@ -12,8 +26,17 @@ from transformers import (
 )
 from wasabi import msg
 
+from . import metrics
 from .constants import ALL_LABELS
-from .postprocess import labels_to_cit
+from .loading import (
+    load_local_model,
+    load_local_tokenizer,
+    offline_mode,
+    resolve_local_path,
+)
+from .metrics import timed
+from .postprocess import labels_to_record
+from .records import AnyLabel, Label, label_models
 from .types import Citation, LabelPrediction
 
 
@@ -22,9 +45,28 @@ class Configuration(BaseModel):
 
     MODEL_URL: Optional[str] = os.getenv("MODEL_URL")
 
+    # Local model directory or bundle (see `loading.export_bundle`); takes precedence over the hub.
+    MODEL_PATH: Optional[str] = os.getenv("MODEL_PATH")
+
+    # Never touch the network, even when resolving HF_MODEL_NAME (uses the local HF cache only).
+    OFFLINE: bool = os.getenv("CIT_PARSER_OFFLINE", "").lower() in {"1", "true", "yes"}
+
     class Config:
         frozen = True
 
+    @property
+    def local_model_location(self) -> Optional[str]:
+        """
+        MODEL_PATH, or MODEL_URL when it points at the local filesystem.
+        """
+        if self.MODEL_PATH:
+            return self.MODEL_PATH
+        if self.MODEL_URL and (
+            self.MODEL_URL.startswith("file://") or os.path.isdir(self.MODEL_URL)
+        ):
+            return self.MODEL_URL
+        return None
+
 
 Config = Configuration()
 
@@ -46,7 +88,9 @@ def _get_device() -> torch.device:
     return device
 
 
-DEVICE = _get_device()
+# Logged to stderr, as this runs on import and must not end up in data written to stdout.
+with redirect_stdout(sys.stderr):
+    DEVICE = _get_device()
 
 
 @lru_cache(maxsize=1)
@@ -63,48 +107,254 @@ def _nlp():
 @lru_cache(maxsize=1)
 def _get_model() -> AutoModelForTokenClassification:
     """
-    Loads the model from the pretrained Hugging Face repository and moves it to the appropriate device.
+    Loads the model, from the local model directory if one is configured and otherwise from the
+    pretrained Hugging Face repository, and moves it to the appropriate device.
     """
-    model = AutoModelForTokenClassification.from_pretrained(Config.HF_MODEL_NAME)
+    location = Config.local_model_location
+    if location:
+        model = load_local_model(resolve_local_path(location))
+        # `PreTrainedModel.to` is wrapped with `functools.wraps`, whose stub hides its `self`.
+        model.to(DEVICE)  # pyright: ignore[reportArgumentType]
+        msg.info(f"Model at '{location}' moved to {DEVICE}.")
+        return model  # pyright: ignore
+
+    start = time.perf_counter()
+    if Config.OFFLINE:
+        with offline_mode():
+            model = AutoModelForTokenClassification.from_pretrained(
+                Config.HF_MODEL_NAME, local_files_only=True
+            )
+    else:
+        model = AutoModelForTokenClassification.from_pretrained(Config.HF_MODEL_NAME)
     model.to(DEVICE)
     model.eval()
-    msg.info(f"Model '{Config.HF_MODEL_NAME}' loaded and moved to {DEVICE}.")
+    elapsed = time.perf_counter() - start
+    metrics.MODEL_LOAD_SECONDS.observe(elapsed, source="hub")
+    msg.info(
+        f"Model '{Config.HF_MODEL_NAME}' loaded and moved to {DEVICE} in {elapsed:.2f}s."
+    )
     return model
 
 
 @lru_cache(maxsize=1)
 def _get_tokenizer() -> PreTrainedTokenizerFast:
     """
-    Loads the tokenizer from the pretrained Hugging Face repository.
+    Loads the tokenizer from the local model directory or the pretrained Hugging Face repository.
     """
-    tokenizer = AutoTokenizer.from_pretrained(Config.HF_MODEL_NAME)
-    assert isinstance(
-        tokenizer, PreTrainedTokenizerFast
-    ), "Tokenizer is not a PreTrainedTokenizerFast instance."
+    location = Config.local_model_location
+    if location:
+        tokenizer = load_local_tokenizer(resolve_local_path(location))
+        msg.info(f"Tokenizer at '{location}' loaded.")
+        return tokenizer
+
+    if Config.OFFLINE:
+        with offline_mode():
+            tokenizer = AutoTokenizer.from_pretrained(
+                Config.HF_MODEL_NAME, local_files_only=True
+            )
+    else:
+        tokenizer = AutoTokenizer.from_pretrained(Config.HF_MODEL_NAME)
+    assert isinstance(tokenizer, PreTrainedTokenizerFast), (
+        "Tokenizer is not a PreTrainedTokenizerFast instance."
+    )
     msg.info(f"Tokenizer for '{Config.HF_MODEL_NAME}' loaded.")
     return tokenizer
 
 
-def split_text(text: str) -> List[str]:
+def _cached(fn, cache: str):
     """
-    Splits the input text into sentences using spaCy.
+    Calls a zero-argument `lru_cache` loader, recording whether it was a cache hit.
+    """
+    hits = fn.cache_info().hits
+    res = fn()
+    metrics.record_cache_lookup(cache, fn.cache_info().hits > hits)
+    return res
+
+
+def segment(text: str) -> List[Tuple[int, str]]:
     """
-    nlp = _nlp()
-    doc = nlp(text)
-    sentences: List[str] = [sent.text for sent in doc.sents]
+    Splits the input text into sentences using spaCy, keeping each sentence's start offset.
+    """
+    sentences = next(segment_many([text]))
     msg.info(f"Text split into {len(sentences)} sentence(s).")
     return sentences
 
 
-def invoke(text: str) -> List[Citation]:
-    model = _get_model()
-    sentences = split_text(text)
+DEFAULT_SEGMENT_BATCH_SIZE = 32
+
+
+def _chunks(text: str, max_length: int) -> List[Tuple[int, str]]:
+    """
+    Cuts `text` into `(start, chunk)` pieces no longer than `max_length`, at a paragraph break,
+    line break or space where possible.
+    """
     res = []
-    for sentence in sentences:
-        predictions = infer_labels(sentence, model)
-        cit: Optional[Citation] = labels_to_cit(predictions, sentence)
-        if cit:
-            res.append(cit)
+    start = 0
+    while len(text) - start > max_length:
+        end = start + max_length
+        for sep in ("\n\n", "\n", " "):
+            cut = text.rfind(sep, start + 1, end)
+            if cut > start:
+                end = cut + len(sep)
+                break
+        res.append((start, text[start:end]))
+        start = end
+    res.append((start, text[start:]))
+    return res
+
+
+def segment_many(
+    texts: Iterable[Any],
+    batch_size: int = DEFAULT_SEGMENT_BATCH_SIZE,
+    n_process: int = 1,
+    as_tuples: bool = False,
+    max_length: Optional[int] = None,
+) -> Iterator[Any]:
+    """
+    Segments a stream of documents with `nlp.pipe`, yielding each document's `(start, sentence)`
+    pairs in input order. With `as_tuples=True`, takes `(text, context)` pairs and yields
+    `(sentences, context)`, like `nlp.pipe`.
+
+    Documents longer than `max_length` (by default spaCy's `nlp.max_length`) are cut into pieces
+    at paragraph or line breaks and segmented piece by piece; offsets stay document-relative.
+    """
+    nlp = _cached(_nlp, "spacy")
+    max_length = max_length or nlp.max_length
+    items = texts if as_tuples else ((text, None) for text in texts)
+
+    # Contexts stay in this process, so they need not be picklable when n_process > 1.
+    contexts: Dict[int, Any] = {}
+
+    def pieces() -> Iterator[Tuple[str, Tuple[int, int, int]]]:
+        # Each piece carries (document index, piece start, number of pieces in the document).
+        for index, (text, context) in enumerate(items):
+            contexts[index] = context
+            chunks = _chunks(text, max_length)
+            for start, chunk in chunks:
+                yield chunk, (index, start, len(chunks))
+
+    sentences: List[Tuple[int, str]] = []
+    seen = 0
+    docs = nlp.pipe(
+        pieces(), as_tuples=True, batch_size=batch_size, n_process=n_process
+    )
+    while True:
+        with timed("segmentation"):
+            item = next(docs, None)
+        if item is None:
+            return
+        doc, (index, offset, n_pieces) = item
+        sentences.extend((offset + sent.start_char, sent.text) for sent in doc.sents)
+        seen += 1
+        if seen == n_pieces:
+            metrics.SENTENCES.inc(len(sentences))
+            context = contexts.pop(index)
+            yield (sentences, context) if as_tuples else sentences
+            sentences, seen = [], 0
+
+
+def split_text(text: str) -> List[str]:
+    """
+    Splits the input text into sentences using spaCy.
+    """
+    return [sentence for _, sentence in segment(text)]
+
+
+DEFAULT_BATCH_SIZE = 16
+
+
+def invoke(
+    text: str,
+    model: Optional[AutoModelForTokenClassification] = None,
+    tokenizer: Optional[PreTrainedTokenizerFast] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> List[Citation]:
+    """
+    Extracts citations from `text`, with offsets relative to `text`.
+
+    Sentences go through the model `batch_size` at a time. The shared model and tokenizer are used
+    unless others are given (e.g. a replica's own, see `pool.ModelPool`).
+    """
+    return invoke_segmented(segment(text), model, tokenizer, batch_size)
+
+
+def invoke_segmented(
+    sentences: List[Tuple[int, str]],
+    model: Optional[AutoModelForTokenClassification] = None,
+    tokenizer: Optional[PreTrainedTokenizerFast] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> List[Citation]:
+    """
+    Like `invoke()`, for text that is already split into `(start, sentence)` pairs: segmentation
+    is skipped and the citation offsets are `start`-shifted, i.e. document-absolute.
+    """
+    metrics.DOCUMENTS.inc()
+    model = model if model is not None else _cached(_get_model, "model")
+    predictions = _infer_labels_batch(
+        [sentence for _, sentence in sentences], model, tokenizer, batch_size
+    )
+    return sentences_to_citations(sentences, predictions)
+
+
+def invoke_offsets(
+    text: str,
+    offsets: Iterable[Tuple[int, int]],
+    model: Optional[AutoModelForTokenClassification] = None,
+    tokenizer: Optional[PreTrainedTokenizerFast] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> List[Citation]:
+    """
+    Like `invoke()`, with sentence boundaries given as `(start, end)` character offsets into
+    `text` rather than found by spaCy.
+    """
+    sentences = []
+    for start, end in offsets:
+        if not 0 <= start <= end <= len(text):
+            raise ValueError(
+                f"Sentence offsets ({start}, {end}) are out of bounds for a text of "
+                f"length {len(text)}."
+            )
+        sentences.append((start, text[start:end]))
+    return invoke_segmented(sentences, model, tokenizer, batch_size)
+
+
+def invoke_doc(
+    doc: Any,
+    model: Optional[AutoModelForTokenClassification] = None,
+    tokenizer: Optional[PreTrainedTokenizerFast] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> List[Citation]:
+    """
+    Like `invoke()`, for a `spacy.tokens.Doc` your own pipeline has already segmented (by a
+    parser, senter or sentencizer), or for any iterable of sentence `Span`s of one document.
+    Offsets are relative to the document's text.
+    """
+    if isinstance(doc, Doc):
+        if not doc.has_annotation("SENT_START"):
+            raise ValueError(
+                "Doc has no sentence boundaries; add a parser, senter or sentencizer to the "
+                "pipeline, or use `invoke()` on its text."
+            )
+        doc = doc.sents
+    return invoke_segmented(
+        [(span.start_char, span.text) for span in doc], model, tokenizer, batch_size
+    )
+
+
+def sentences_to_citations(
+    sentences: List[Tuple[int, str]], predictions: Sequence[Sequence[AnyLabel]]
+) -> List[Citation]:
+    """
+    Builds the citation of each `(start, sentence)` pair from its label predictions, with
+    offsets relative to the document.
+    """
+    res = []
+    for (offset, sentence), labels in zip(sentences, predictions):
+        with timed("postprocess"):
+            record = labels_to_record(labels, sentence)
+            if record is not None:
+                record.shift(offset)
+                res.append(record.to_model())
     return res
 
 
@@ -125,48 +375,170 @@ def tokenize(s: str) -> Dict[str, torch.Tensor]:
 
 
 def infer_labels(
-    text: str, model: AutoModelForTokenClassification
+    text: str,
+    model: AutoModelForTokenClassification,
+    tokenizer: Optional[PreTrainedTokenizerFast] = None,
 ) -> List[LabelPrediction]:
     """
     Tokenizes the text, performs inference with the model, and returns predicted labels
     along with their character spans using offset mapping.
+
+    The model is expected to already be on DEVICE and in eval mode, as returned by `_get_model()`.
     """
-    tokenizer: PreTrainedTokenizerFast = _get_tokenizer()
+    return infer_labels_batch([text], model, tokenizer, batch_size=1)[0]
 
-    # Tokenize with offset mapping to keep track of token positions
-    tokenized_input = tokenizer(
-        text, return_offsets_mapping=True, truncation=True, return_tensors="pt"
-    )
 
-    # Extract offset mapping before moving tensors to device
-    offset_mapping = tokenized_input.pop("offset_mapping")[0].tolist()
+def infer_labels_batch(
+    texts: List[str],
+    model: AutoModelForTokenClassification,
+    tokenizer: Optional[PreTrainedTokenizerFast] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> List[List[LabelPrediction]]:
+    """
+    Like `infer_labels`, for many texts at once: texts are sorted by length, so that each batch
+    holds similarly sized texts and little padding, and run through the model `batch_size` at a
+    time. Results are returned in input order.
+    """
+    return label_models(_infer_labels_batch(texts, model, tokenizer, batch_size))
+
+
+def _infer_labels_batch(
+    texts: List[str],
+    model: AutoModelForTokenClassification,
+    tokenizer: Optional[PreTrainedTokenizerFast] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> List[List[Label]]:
+    tokenizer = tokenizer or _cached(_get_tokenizer, "tokenizer")
+    res: List[List[Label]] = [[] for _ in texts]
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+
+    for b in range(0, len(order), batch_size):
+        indices = order[b : b + batch_size]
+        batch = [texts[i] for i in indices]
+        tokenized_input, offset_mapping = encode_batch(batch, tokenizer)
+        predictions = predict_batch(tokenized_input, model)
+        tokens = batch_tokens(tokenized_input, tokenizer)
+        for i, labels in zip(
+            indices, decode_batch(tokens, predictions, offset_mapping)
+        ):
+            res[i] = labels
+
+    return res
+
+
+def encode_batch(
+    texts: List[str], tokenizer: PreTrainedTokenizerFast
+) -> Tuple[Dict[str, torch.Tensor], List[List[List[int]]]]:
+    """
+    Tokenizes `texts` into one padded batch on DEVICE. Returns the model inputs and the offset
+    mapping of every row.
+    """
+    with timed("tokenization"):
+        # Tokenize with offset mapping to keep track of token positions
+        tokenized_input = tokenizer(
+            texts,
+            return_offsets_mapping=True,
+            truncation=True,
+            padding=True,
+            return_tensors="pt",
+        )
+
+        # Extract offset mapping before moving tensors to device
+        offset_mapping = tokenized_input.pop("offset_mapping").tolist()
+
+        tokenized_input = {k: v.to(DEVICE) for k, v in tokenized_input.items()}
 
-    tokenized_input = {k: v.to(DEVICE) for k, v in tokenized_input.items()}
+    _record_batch(tokenized_input["attention_mask"])
+    for text, offsets in zip(texts, offset_mapping):
+        if _is_truncated(offsets, text):
+            metrics.TRUNCATED.inc()
+    return tokenized_input, offset_mapping
 
-    model.to(DEVICE)  # pyright: ignore
-    model.eval()  # pyright: ignore
 
-    with torch.no_grad():
+def predict_batch(
+    tokenized_input: Dict[str, torch.Tensor], model: AutoModelForTokenClassification
+) -> List[List[int]]:
+    """
+    Runs a batch from `encode_batch` through the model and returns the label id of every token.
+    """
+    with timed("inference"), torch.no_grad():
         outputs = model(**tokenized_input)  # pyright: ignore
-        logits = outputs.logits
-        predictions = torch.argmax(logits, dim=-1)
+        return torch.argmax(outputs.logits, dim=-1).tolist()
 
-    predicted_labels = [ALL_LABELS[p] for p in predictions[0].tolist()]
-    tokens = tokenizer.convert_ids_to_tokens(tokenized_input["input_ids"][0])
 
-    res = []
-    raw_pairs = []
+def decode_batch(
+    tokens: Sequence[Sequence[str]],
+    predictions: Sequence[Sequence[int]],
+    offset_mapping: Sequence[Sequence[Sequence[int]]],
+) -> List[List[Label]]:
+    """
+    Turns the label ids from `predict_batch` back into per-row labels, as internal `Label`
+    records (see `records.label_models`).
+    """
+    return [
+        _label_predictions(*row) for row in zip(tokens, predictions, offset_mapping)
+    ]
+
 
-    for token, label, (start, end) in zip(tokens, predicted_labels, offset_mapping):
+def batch_tokens(
+    tokenized_input: Mapping[str, torch.Tensor], tokenizer: PreTrainedTokenizerFast
+) -> List[List[str]]:
+    return [
+        _ids_to_tokens(tokenizer, row) for row in tokenized_input["input_ids"].tolist()
+    ]
+
+
+def _ids_to_tokens(tokenizer: PreTrainedTokenizerFast, ids: List[int]) -> List[str]:
+    tokens = tokenizer.convert_ids_to_tokens(ids)
+    assert isinstance(tokens, list), "Expected one token per id."
+    return tokens
+
+
+def _label_predictions(
+    tokens: Sequence[str],
+    label_ids: Sequence[int],
+    offset_mapping: Sequence[Sequence[int]],
+) -> List[Label]:
+    res = []
+    for token, label_id, (start, end) in zip(tokens, label_ids, offset_mapping):
+        label = ALL_LABELS[label_id]
         if token in ["[CLS]", "[SEP]", "[PAD]"] or label == "O" or start == end:
             continue
 
         token = token.replace("##", "")
+        res.append(Label(token, label, start, end))
+    return res
 
-        p = LabelPrediction(token=token, label=label, start=start, end=end)
-        res.append(p)
-        raw_pairs.append((token, label, start, end))
 
-    # msg.info(f"Token-label pairs with spans: {raw_pairs}")
+def _special_ids(tokenizer: PreTrainedTokenizerFast) -> Tuple[int, int, int]:
+    """
+    The tokenizer's [CLS], [SEP] and [PAD] token ids, for building model inputs by hand.
+    """
+    cls_id, sep_id, pad_id = (
+        tokenizer.cls_token_id,
+        tokenizer.sep_token_id,
+        tokenizer.pad_token_id,
+    )
+    assert (
+        isinstance(cls_id, int) and isinstance(sep_id, int) and isinstance(pad_id, int)
+    ), "Tokenizer has no [CLS], [SEP] or [PAD] token."
+    return cls_id, sep_id, pad_id
 
-    return res
+
+def _record_batch(attention_mask: torch.Tensor) -> None:
+    """
+    Records batch size, real token count and padding ratio of one forward pass.
+    """
+    total = attention_mask.numel()
+    real = int(attention_mask.sum().item())
+    metrics.BATCH_SIZE.observe(attention_mask.shape[0])
+    metrics.TOKENS.inc(real)
+    metrics.PADDING_RATIO.observe((total - real) / total if total else 0.0)
+
+
+def _is_truncated(offset_mapping: Sequence[Sequence[int]], text: str) -> bool:
+    """
+    A sentence was truncated if its last real token ends before the end of the text.
+    """
+    last_end = max((end for _, end in offset_mapping), default=0)
+    return last_end < len(text.rstrip())
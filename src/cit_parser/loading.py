@@ -0,0 +1,186 @@
+"""
+Offline model loading from local directories.
+
+A model directory (or a bundle written by `export_bundle()`) holds `config.json`, the tokenizer
+files and the weights as safetensors. The weights are memory-mapped instead of read into fresh
+allocations, so several worker processes loading the same bundle share one copy in the page cache
+and a cold start costs little more than parsing the safetensors header.
+"""
+
+import json
+import math
+import mmap
+import os
+import struct
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Union
+
+import torch
+from transformers import (
+    AutoConfig,
+    AutoModelForTokenClassification,
+    AutoTokenizer,
+    PreTrainedModel,
+    PreTrainedTokenizerFast,
+)
+from wasabi import msg
+
+from . import metrics
+
+try:
+    from transformers.initialization import no_init_weights  # transformers >= 5
+except ImportError:  # pragma: no cover
+    # Gone from transformers 5, which the type checker resolves against.
+    from transformers.modeling_utils import no_init_weights  # pyright: ignore[reportAttributeAccessIssue]
+
+SAFETENSORS_FILE = "model.safetensors"
+SAFETENSORS_INDEX_FILE = "model.safetensors.index.json"
+
+_DTYPES: Dict[str, torch.dtype] = {
+    "F64": torch.float64,
+    "F32": torch.float32,
+    "F16": torch.float16,
+    "BF16": torch.bfloat16,
+    "I64": torch.int64,
+    "I32": torch.int32,
+    "I16": torch.int16,
+    "I8": torch.int8,
+    "U8": torch.uint8,
+    "BOOL": torch.bool,
+}
+
+PathLike = Union[str, os.PathLike]
+
+
+@contextmanager
+def offline_mode() -> Iterator[None]:
+    """
+    Forbids the Hugging Face libraries from touching the network for the duration of the block.
+    """
+    keys = ("HF_HUB_OFFLINE", "TRANSFORMERS_OFFLINE")
+    previous = {k: os.environ.get(k) for k in keys}
+    os.environ.update({k: "1" for k in keys})
+    try:
+        yield
+    finally:
+        for k, v in previous.items():
+            if v is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = v
+
+
+def resolve_local_path(location: str) -> Path:
+    """
+    Accepts a plain path or a `file://` URL and returns the model directory it points to.
+    """
+    if location.startswith("file://"):
+        location = location[len("file://") :]
+    path = Path(location).expanduser()
+    if not path.is_dir():
+        raise FileNotFoundError(f"Model directory '{path}' does not exist.")
+    return path
+
+
+def _safetensors_files(path: Path) -> List[Path]:
+    index = path / SAFETENSORS_INDEX_FILE
+    if index.exists():
+        weight_map: Dict[str, str] = json.loads(index.read_text())["weight_map"]
+        return [path / name for name in sorted(set(weight_map.values()))]
+    single = path / SAFETENSORS_FILE
+    return [single] if single.exists() else []
+
+
+def load_safetensors_mmap(path: PathLike) -> Dict[str, torch.Tensor]:
+    """
+    Reads a safetensors file into tensors that are views over a private memory map of the file.
+
+    Pages stay shared with every other process mapping the same file until one of them writes to
+    a tensor, at which point only the touched page is copied.
+    """
+    with open(path, "rb") as f:
+        (header_len,) = struct.unpack("<Q", f.read(8))
+        header: Dict[str, dict] = json.loads(f.read(header_len))
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+
+    data_start = 8 + header_len
+    tensors: Dict[str, torch.Tensor] = {}
+    for name, info in header.items():
+        if name == "__metadata__":
+            continue
+        dtype = _DTYPES[info["dtype"]]
+        shape = info["shape"]
+        begin, _ = info["data_offsets"]
+        count = math.prod(shape)
+        if count == 0:
+            tensors[name] = torch.empty(shape, dtype=dtype)
+            continue
+        tensors[name] = torch.frombuffer(
+            buffer, dtype=dtype, count=count, offset=data_start + begin
+        ).view(shape)
+    return tensors
+
+
+def load_local_model(path: PathLike) -> PreTrainedModel:
+    """
+    Builds the token classification model from a local directory without any network access.
+    """
+    path = Path(path)
+    start = time.perf_counter()
+    with offline_mode():
+        config = AutoConfig.from_pretrained(path, local_files_only=True)
+        files = _safetensors_files(path)
+
+        if not files:
+            msg.warn(
+                f"No safetensors weights in '{path}'; falling back to a full (unmapped) load."
+            )
+            model = AutoModelForTokenClassification.from_pretrained(
+                path, local_files_only=True
+            )
+        else:
+            with no_init_weights():
+                model = AutoModelForTokenClassification.from_config(config)
+            state: Dict[str, torch.Tensor] = {}
+            for file in files:
+                state.update(load_safetensors_mmap(file))
+            missing, unexpected = model.load_state_dict(
+                state, strict=False, assign=True
+            )
+            if missing or unexpected:
+                raise ValueError(
+                    f"Weights in '{path}' do not match the model architecture "
+                    f"(missing: {missing}, unexpected: {unexpected})."
+                )
+    model.eval()
+
+    elapsed = time.perf_counter() - start
+    metrics.MODEL_LOAD_SECONDS.observe(elapsed, source="local")
+    msg.info(f"Model loaded from '{path}' in {elapsed:.2f}s.")
+    return model  # pyright: ignore
+
+
+def load_local_tokenizer(path: PathLike) -> PreTrainedTokenizerFast:
+    with offline_mode():
+        tokenizer = AutoTokenizer.from_pretrained(path, local_files_only=True)
+    assert isinstance(tokenizer, PreTrainedTokenizerFast), (
+        "Tokenizer is not a PreTrainedTokenizerFast instance."
+    )
+    return tokenizer
+
+
+def export_bundle(model_name: str, dest: PathLike) -> Path:
+    """
+    Downloads `model_name` once and writes it as a self-contained bundle directory for offline
+    nodes: config, tokenizer and a single `model.safetensors` file.
+    """
+    dest = Path(dest)
+    dest.mkdir(parents=True, exist_ok=True)
+    model = AutoModelForTokenClassification.from_pretrained(model_name)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model.save_pretrained(dest, safe_serialization=True, max_shard_size="100GB")
+    tokenizer.save_pretrained(dest)
+    msg.good(f"Bundle for '{model_name}' written to '{dest}'.")
+    return dest
@@ -0,0 +1,352 @@
+"""
+In-process metrics for the extraction pipeline.
+
+Every stage of `invoke()` reports into a `MetricsRegistry`: counters for documents, sentences
+and tokens, histograms for batch sizes, padding and per-stage wall time. The registry can be
+exported in the Prometheus text format, and hooks can be attached to forward observations
+elsewhere (statsd, logs, tests).
+"""
+
+import math
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+LabelKey = Tuple[Tuple[str, str], ...]
+MetricHook = Callable[[str, float, Dict[str, str]], None]
+
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.001,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+class Counter:
+    """
+    A monotonically increasing value, optionally split by labels.
+    """
+
+    kind = "counter"
+
+    def __init__(self, registry: "MetricsRegistry", name: str, documentation: str):
+        self._registry = registry
+        self.name = name
+        self.documentation = documentation
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        if amount < 0:
+            raise ValueError(
+                "Counters can only be incremented by non-negative amounts."
+            )
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+        self._registry._notify(self.name, amount, labels)
+
+    def value(self, **labels: str) -> float:
+        with self._lock:
+            return self._values.get(_label_key(labels), 0.0)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [
+            f"{self.name}{_format_labels(key)} {_format_value(value)}"
+            for key, value in items
+        ]
+
+
+class _HistogramSeries:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self, n_buckets: int):
+        self.counts = [0] * n_buckets
+        self.sum = 0.0
+        self.count = 0
+
+
+class Histogram:
+    """
+    Bucketed distribution of observed values, optionally split by labels.
+    """
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        registry: "MetricsRegistry",
+        name: str,
+        documentation: str,
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        self._registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.buckets: Tuple[float, ...] = tuple(sorted(buckets)) + (math.inf,)
+        self._series: Dict[LabelKey, _HistogramSeries] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = _HistogramSeries(len(self.buckets))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series.counts[i] += 1
+                    break
+            series.sum += value
+            series.count += 1
+        self._registry._notify(self.name, value, labels)
+
+    def count(self, **labels: str) -> int:
+        with self._lock:
+            series = self._series.get(_label_key(labels))
+            return series.count if series else 0
+
+    def sum(self, **labels: str) -> float:
+        with self._lock:
+            series = self._series.get(_label_key(labels))
+            return series.sum if series else 0.0
+
+    def reset(self) -> None:
+        with self._lock:
+            self._series.clear()
+
+    def samples(self) -> List[str]:
+        lines: List[str] = []
+        with self._lock:
+            items = sorted(self._series.items())
+            for key, series in items:
+                cumulative = 0
+                for bound, n in zip(self.buckets, series.counts):
+                    cumulative += n
+                    le = ("le", _format_value(bound))
+                    lines.append(
+                        f"{self.name}_bucket{_format_labels(key, le)} {cumulative}"
+                    )
+                lines.append(
+                    f"{self.name}_sum{_format_labels(key)} {_format_value(series.sum)}"
+                )
+                lines.append(f"{self.name}_count{_format_labels(key)} {series.count}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Holds named metrics and the hooks that observe them.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, Counter | Histogram] = {}
+        self._hooks: List[MetricHook] = []
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, documentation: str = "") -> Counter:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = Counter(self, name, documentation)
+        if not isinstance(metric, Counter):
+            raise TypeError(
+                f"Metric '{name}' is already registered as a {metric.kind}."
+            )
+        return metric
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str = "",
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = Histogram(
+                    self, name, documentation, buckets
+                )
+        if not isinstance(metric, Histogram):
+            raise TypeError(
+                f"Metric '{name}' is already registered as a {metric.kind}."
+            )
+        return metric
+
+    def add_hook(self, hook: MetricHook) -> None:
+        """
+        Registers a callable invoked as `hook(name, value, labels)` on every observation.
+        """
+        with self._lock:
+            self._hooks.append(hook)
+
+    def remove_hook(self, hook: MetricHook) -> None:
+        with self._lock:
+            self._hooks.remove(hook)
+
+    def _notify(self, name: str, value: float, labels: Dict[str, str]) -> None:
+        for hook in list(self._hooks):
+            hook(name, value, labels)
+
+    def reset(self) -> None:
+        """
+        Clears all recorded values; registered metrics and hooks are kept.
+        """
+        for metric in list(self._metrics.values()):
+            metric.reset()
+
+    def to_prometheus(self) -> str:
+        """
+        Renders all metrics in the Prometheus text exposition format (version 0.0.4).
+        """
+        lines: List[str] = []
+        for name in sorted(self._metrics):
+            metric = self._metrics[name]
+            if metric.documentation:
+                lines.append(f"# HELP {name} {metric.documentation}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+DOCUMENTS = REGISTRY.counter("cit_parser_documents_total", "Documents processed.")
+SENTENCES = REGISTRY.counter("cit_parser_sentences_total", "Sentences segmented.")
+TOKENS = REGISTRY.counter("cit_parser_tokens_total", "Tokens fed to the model.")
+TRUNCATED = REGISTRY.counter(
+    "cit_parser_truncated_sentences_total",
+    "Sentences cut off at the model's maximum sequence length.",
+)
+CASCADE_SENTENCES = REGISTRY.counter(
+    "cit_parser_cascade_sentences_total",
+    "Sentences by the cascade tier that served them (rules, skipped or model).",
+)
+CACHE_REQUESTS = REGISTRY.counter(
+    "cit_parser_cache_requests_total", "Cached resource lookups by cache and result."
+)
+COALESCED_CALLS = REGISTRY.counter(
+    "cit_parser_coalesced_calls_total",
+    "Calls that shared the result of an identical call already in flight.",
+)
+EARLY_EXITS = REGISTRY.counter(
+    "cit_parser_early_exits_total",
+    "Sentences labeled all O at an intermediate layer, by layer.",
+)
+BATCH_SIZE = REGISTRY.histogram(
+    "cit_parser_batch_size",
+    "Sequences per forward pass.",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256),
+)
+PADDING_RATIO = REGISTRY.histogram(
+    "cit_parser_padding_ratio",
+    "Fraction of each forward pass spent on padding tokens.",
+    buckets=(0.0, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0),
+)
+MODEL_LOAD_SECONDS = REGISTRY.histogram(
+    "cit_parser_model_load_seconds",
+    "Cold-start time to load model weights, by source.",
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0),
+)
+STAGE_SECONDS = REGISTRY.histogram(
+    "cit_parser_stage_seconds", "Wall time spent in each pipeline stage."
+)
+
+
+class Timings:
+    """
+    Per-call breakdown of wall time by stage, filled in by `timed()` blocks.
+    """
+
+    def __init__(self):
+        self.stages: Dict[str, float] = {}
+        self.total: float = 0.0
+
+    def add(self, stage: str, seconds: float) -> None:
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def __str__(self) -> str:
+        parts = ", ".join(f"{k}={v * 1000:.1f}ms" for k, v in self.stages.items())
+        return f"total={self.total * 1000:.1f}ms ({parts})"
+
+
+_active_timings: ContextVar[Optional[Timings]] = ContextVar(
+    "_active_timings", default=None
+)
+
+
+@contextmanager
+def timed(stage: str) -> Iterator[None]:
+    """
+    Times the enclosed block as `stage`, both globally and in the active `record_timings()` call.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        timings = _active_timings.get()
+        if timings is not None:
+            timings.add(stage, elapsed)
+
+
+@contextmanager
+def record_timings() -> Iterator[Timings]:
+    """
+    Collects the per-stage timing breakdown of everything run inside the block, e.g.
+
+        with record_timings() as t:
+            invoke(text)
+        print(t.stages)
+    """
+    timings = Timings()
+    token = _active_timings.set(timings)
+    start = time.perf_counter()
+    try:
+        yield timings
+    finally:
+        timings.total = time.perf_counter() - start
+        _active_timings.reset(token)
+
+
+def record_cache_lookup(cache: str, hit: bool) -> None:
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
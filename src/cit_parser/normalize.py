@@ -0,0 +1,209 @@
+"""
+Canonical forms for reporters and codes.
+
+The same reporter is written "F.3d", "F. 3d", "F 3d" or "F.3rd" depending on the author (and the
+model reproduces whatever the text says). Every known reporter and code is compiled once into a
+hash table keyed by its *squashed* spelling — lowercased, without spaces, periods or apostrophes,
+with ordinals reduced to Bluebook form — so normalizing a raw string costs one squash and one
+dict lookup, and citations to the same authority can be grouped with exact hash joins.
+"""
+
+import re
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+# Canonical Bluebook abbreviation -> other spellings seen in the wild (beyond spacing/punctuation,
+# which squashing already absorbs).
+REPORTERS: Dict[str, List[str]] = {
+    # Federal
+    "U.S.": ["US", "U. S."],
+    "S. Ct.": ["Sup. Ct.", "S.Ct."],
+    "L. Ed.": ["L.Ed.", "Law. Ed."],
+    "L. Ed. 2d": ["L.Ed.2d"],
+    "F.": ["Fed."],
+    "F.2d": ["Fed. 2d"],
+    "F.3d": ["Fed. 3d"],
+    "F.4th": ["Fed. 4th"],
+    "F. Supp.": ["Fed. Supp."],
+    "F. Supp. 2d": [],
+    "F. Supp. 3d": [],
+    "F. App'x": ["Fed. Appx.", "Fed. App'x", "F. Appx."],
+    "F.R.D.": [],
+    "B.R.": [],
+    "Fed. Cl.": [],
+    "Ct. Cl.": [],
+    "T.C.": [],
+    "M.J.": [],
+    "Vet. App.": [],
+    # Regional
+    "A.": ["Atl."],
+    "A.2d": ["Atl. 2d"],
+    "A.3d": ["Atl. 3d"],
+    "N.E.": [],
+    "N.E.2d": [],
+    "N.E.3d": [],
+    "N.W.": [],
+    "N.W.2d": [],
+    "P.": ["Pac."],
+    "P.2d": ["Pac. 2d"],
+    "P.3d": ["Pac. 3d"],
+    "S.E.": [],
+    "S.E.2d": [],
+    "S.W.": [],
+    "S.W.2d": [],
+    "S.W.3d": [],
+    "So.": ["South."],
+    "So. 2d": ["South. 2d"],
+    "So. 3d": ["South. 3d"],
+    # State
+    "Cal.": [],
+    "Cal. 2d": [],
+    "Cal. 3d": [],
+    "Cal. 4th": [],
+    "Cal. 5th": [],
+    "Cal. App.": [],
+    "Cal. App. 2d": [],
+    "Cal. App. 3d": [],
+    "Cal. App. 4th": [],
+    "Cal. App. 5th": [],
+    "Cal. Rptr.": [],
+    "Cal. Rptr. 2d": [],
+    "Cal. Rptr. 3d": [],
+    "N.Y.": [],
+    "N.Y.2d": [],
+    "N.Y.3d": [],
+    "N.Y.S.": [],
+    "N.Y.S.2d": [],
+    "N.Y.S.3d": [],
+    "A.D.": ["App. Div."],
+    "A.D.2d": ["App. Div. 2d"],
+    "A.D.3d": ["App. Div. 3d"],
+    "Misc. 2d": [],
+    "Misc. 3d": [],
+    "Ill. 2d": [],
+    "Ill. App. 3d": [],
+    "Ill. Dec.": [],
+    "Mass.": [],
+    "Mass. App. Ct.": [],
+    "N.J.": [],
+    "N.J. Super.": [],
+    "Pa.": [],
+    "Pa. Super.": [],
+    "Ohio St. 3d": [],
+    "Wash. 2d": [],
+    "Wash. App.": [],
+    "Wis. 2d": [],
+    "Mich.": [],
+    "Mich. App.": [],
+}
+
+# Canonical code abbreviation -> other spellings, including the spelled-out names.
+CODES: Dict[str, List[str]] = {
+    # Federal
+    "U.S.C.": ["USC", "U.S. Code", "United States Code"],
+    "U.S.C.A.": [],
+    "U.S.C.S.": [],
+    "C.F.R.": ["CFR", "Code of Federal Regulations"],
+    "Stat.": [],
+    "Fed. R. Civ. P.": ["FRCP"],
+    "Fed. R. Crim. P.": [],
+    "Fed. R. Evid.": ["FRE"],
+    # California
+    "Cal. Bus. & Prof. Code": ["California Business and Professions Code"],
+    "Cal. Civ. Code": ["Civ. Code", "California Civil Code", "Cal. Civil Code"],
+    "Cal. Civ. Proc. Code": [
+        "Code Civ. Proc.",
+        "California Code of Civil Procedure",
+    ],
+    "Cal. Evid. Code": ["Evid. Code", "California Evidence Code"],
+    "Cal. Fam. Code": ["Fam. Code", "California Family Code"],
+    "Cal. Gov't Code": ["Gov't Code", "Gov. Code", "California Government Code"],
+    "Cal. Health & Safety Code": ["Health & Saf. Code"],
+    "Cal. Ins. Code": ["Ins. Code"],
+    "Cal. Lab. Code": ["Lab. Code", "California Labor Code"],
+    "Cal. Penal Code": ["Pen. Code", "California Penal Code"],
+    "Cal. Prob. Code": ["Prob. Code"],
+    "Cal. Rev. & Tax. Code": ["Rev. & Tax. Code"],
+    "Cal. Veh. Code": ["Veh. Code", "California Vehicle Code"],
+    "Cal. Welf. & Inst. Code": ["Welf. & Inst. Code"],
+    # Other states
+    "N.Y. C.P.L.R.": ["CPLR"],
+    "N.Y. Penal Law": [],
+    "N.Y. Gen. Bus. Law": [],
+    "Tex. Penal Code Ann.": ["Tex. Penal Code"],
+    "Tex. Civ. Prac. & Rem. Code Ann.": ["Tex. Civ. Prac. & Rem. Code"],
+    "Fla. Stat.": ["Florida Statutes"],
+    "Ill. Comp. Stat.": ["ILCS"],
+    "Pa. Cons. Stat.": [],
+    "Ohio Rev. Code Ann.": ["Ohio Rev. Code"],
+    "Mich. Comp. Laws": [],
+    "Ga. Code Ann.": [],
+    "N.J. Stat. Ann.": [],
+    "Mass. Gen. Laws": [],
+    "Wash. Rev. Code": [],
+}
+
+_ORDINALS = re.compile(r"(\d)(?:nd|rd)\b")
+_SQUASH = re.compile(r"[\s.'’`]+")
+
+
+def squash(raw: str) -> str:
+    """
+    Reduces a reporter or code spelling to its lookup key, e.g. "F. 3rd" -> "f3d".
+    """
+    return _SQUASH.sub("", _ORDINALS.sub(r"\1d", raw.lower()))
+
+
+def _compile(table: Dict[str, List[str]]) -> Dict[str, str]:
+    lookup: Dict[str, str] = {}
+    for canonical, variants in table.items():
+        for form in [canonical, *variants]:
+            key = squash(form)
+            existing = lookup.setdefault(key, canonical)
+            if existing != canonical:
+                raise ValueError(
+                    f"'{form}' is ambiguous between '{existing}' and '{canonical}'."
+                )
+    return lookup
+
+
+_REPORTER_LOOKUP = _compile(REPORTERS)
+_CODE_LOOKUP = _compile(CODES)
+
+
+@lru_cache(maxsize=4096)
+def normalize_reporter(raw: Optional[str]) -> Optional[str]:
+    """
+    The canonical abbreviation for a reporter, or None if it is not a known one.
+    """
+    if not raw:
+        return None
+    return _REPORTER_LOOKUP.get(squash(raw))
+
+
+@lru_cache(maxsize=4096)
+def normalize_code(raw: Optional[str]) -> Optional[str]:
+    """
+    The canonical abbreviation for a code, or None if it is not a known one.
+    """
+    if not raw:
+        return None
+    return _CODE_LOOKUP.get(squash(raw))
+
+
+@lru_cache(maxsize=4096)
+def reporter_key(raw: Optional[str]) -> Optional[str]:
+    """
+    The key to group citations by: the canonical form if known, else the squashed raw form, so
+    that even unknown reporters compare equal across spacing and punctuation variants.
+    """
+    if not raw:
+        return None
+    return normalize_reporter(raw) or squash(raw)
+
+
+@lru_cache(maxsize=4096)
+def code_key(raw: Optional[str]) -> Optional[str]:
+    if not raw:
+        return None
+    return normalize_code(raw) or squash(raw)
@@ -0,0 +1,190 @@
+"""
+Sequence packing: several short sentences share one model input.
+
+Most sentences are 10–30 tokens long, so even length-sorted batches spend much of their compute on
+padding. Packing concatenates sentences, each still wrapped in its own [CLS] ... [SEP], into rows
+of up to the model's maximum length. A block-diagonal attention mask stops tokens from attending
+across sentences, and position ids restart at 0 for every sentence. Each sentence is therefore
+labeled exactly as if it were alone in its own input, but with almost no padding.
+"""
+
+from typing import List, Optional
+
+import torch
+import transformers
+from transformers import AutoModelForTokenClassification, PreTrainedTokenizerFast
+
+from . import metrics
+from .invoke import (
+    DEVICE,
+    _cached,
+    _get_model,
+    _get_tokenizer,
+    _ids_to_tokens,
+    _is_truncated,
+    _label_predictions,
+    _record_batch,
+    _special_ids,
+    segment,
+    sentences_to_citations,
+)
+from .metrics import timed
+from .records import Label, label_models
+from .types import Citation, LabelPrediction
+from .windowing import _max_length
+
+# Packed rows per forward pass; each row already holds many sentences.
+DEFAULT_PACKED_ROWS = 4
+
+# transformers 5 takes a prepared 4D mask as-is; 4.x only accepts 2D and 3D masks.
+_MASK_4D = int(transformers.__version__.split(".")[0]) >= 5
+
+
+def pack_sequences(lengths: List[int], capacity: int) -> List[List[int]]:
+    """
+    Groups sequence indices into bins whose lengths add up to at most `capacity`, longest first
+    and each into the first bin with room (first-fit decreasing).
+    """
+    bins: List[List[int]] = []
+    room: List[int] = []
+    for i in sorted(range(len(lengths)), key=lambda i: -lengths[i]):
+        for b, free in enumerate(room):
+            if lengths[i] <= free:
+                bins[b].append(i)
+                room[b] -= lengths[i]
+                break
+        else:
+            bins.append([i])
+            room.append(capacity - lengths[i])
+    return bins
+
+
+def block_diagonal_mask(segment_ids: torch.Tensor, dtype: torch.dtype) -> torch.Tensor:
+    """
+    The attention mask for packed rows: tokens attend only to tokens with the same segment id
+    (padding, id 0, only to other padding).
+
+    Returned as a 4D additive mask on transformers 5 and a 3D 0/1 mask on 4.x, the formats the
+    respective versions pass through untouched.
+    """
+    same = segment_ids[:, :, None] == segment_ids[:, None, :]
+    if not _MASK_4D:
+        return same.long()
+    mask = torch.zeros(same.shape, dtype=dtype)
+    return mask.masked_fill(~same, torch.finfo(dtype).min)[:, None]
+
+
+def predict_packed(
+    sequences: List[List[int]],
+    model: AutoModelForTokenClassification,
+    tokenizer: PreTrainedTokenizerFast,
+    max_length: int,
+    batch_size: int = DEFAULT_PACKED_ROWS,
+) -> List[List[int]]:
+    """
+    Labels token id sequences (without special tokens, each at most `max_length - 2` long) in
+    packed rows of `max_length` tokens, `batch_size` rows per forward pass. Returns the label id
+    of every token of every sequence.
+    """
+    res: List[List[int]] = [[] for _ in sequences]
+    bins = pack_sequences([len(s) + 2 for s in sequences], max_length)
+    dtype = model.dtype  # pyright: ignore
+    cls_id, sep_id, pad_id = _special_ids(tokenizer)
+
+    for b in range(0, len(bins), batch_size):
+        rows = bins[b : b + batch_size]
+        width = max(sum(len(sequences[i]) + 2 for i in row) for row in rows)
+        input_ids = torch.full((len(rows), width), pad_id, dtype=torch.long)
+        position_ids = torch.zeros((len(rows), width), dtype=torch.long)
+        segment_ids = torch.zeros((len(rows), width), dtype=torch.long)
+        # (row, start in the row, sequence index) of every packed sequence
+        spans = []
+
+        for r, row in enumerate(rows):
+            start = 0
+            for segment_id, i in enumerate(row, 1):
+                ids = [cls_id] + sequences[i] + [sep_id]
+                end = start + len(ids)
+                input_ids[r, start:end] = torch.tensor(ids)
+                position_ids[r, start:end] = torch.arange(len(ids))
+                segment_ids[r, start:end] = segment_id
+                spans.append((r, start, i))
+                start = end
+
+        _record_batch(segment_ids > 0)
+
+        with timed("inference"), torch.no_grad():
+            logits = model(  # pyright: ignore
+                input_ids=input_ids.to(DEVICE),
+                attention_mask=block_diagonal_mask(segment_ids, dtype).to(DEVICE),
+                position_ids=position_ids.to(DEVICE),
+            ).logits
+            predictions = torch.argmax(logits, dim=-1).tolist()
+
+        for r, start, i in spans:
+            res[i] = predictions[r][start + 1 : start + 1 + len(sequences[i])]
+
+    return res
+
+
+def infer_labels_packed(
+    texts: List[str],
+    model: AutoModelForTokenClassification,
+    tokenizer: Optional[PreTrainedTokenizerFast] = None,
+    batch_size: int = DEFAULT_PACKED_ROWS,
+) -> List[List[LabelPrediction]]:
+    """
+    Drop-in replacement for `infer_labels_batch` that packs the texts instead of padding them.
+    `batch_size` counts packed rows, not texts.
+    """
+    return label_models(_infer_labels_packed(texts, model, tokenizer, batch_size))
+
+
+def _infer_labels_packed(
+    texts: List[str],
+    model: AutoModelForTokenClassification,
+    tokenizer: Optional[PreTrainedTokenizerFast] = None,
+    batch_size: int = DEFAULT_PACKED_ROWS,
+) -> List[List[Label]]:
+    if not texts:
+        return []
+    tokenizer = tokenizer or _cached(_get_tokenizer, "tokenizer")
+    max_length = _max_length(tokenizer, model)
+
+    with timed("tokenization"):
+        encoding = tokenizer(
+            texts,
+            add_special_tokens=False,
+            return_offsets_mapping=True,
+            truncation=True,
+            max_length=max_length - 2,
+        )
+    sequences: List[List[int]] = encoding["input_ids"]  # pyright: ignore
+    offset_mapping: List[List[List[int]]] = encoding["offset_mapping"]  # pyright: ignore
+    for text, offsets in zip(texts, offset_mapping):
+        if _is_truncated(offsets, text):
+            metrics.TRUNCATED.inc()
+
+    label_ids = predict_packed(sequences, model, tokenizer, max_length, batch_size)
+    return [
+        _label_predictions(_ids_to_tokens(tokenizer, ids), labels, offsets)
+        for ids, labels, offsets in zip(sequences, label_ids, offset_mapping)
+    ]
+
+
+def invoke_packed(
+    text: str,
+    model: Optional[AutoModelForTokenClassification] = None,
+    tokenizer: Optional[PreTrainedTokenizerFast] = None,
+    batch_size: int = DEFAULT_PACKED_ROWS,
+) -> List[Citation]:
+    """
+    Like `invoke()`, with the document's sentences packed into shared model inputs.
+    """
+    metrics.DOCUMENTS.inc()
+    model = model if model is not None else _cached(_get_model, "model")
+    sentences = segment(text)
+    predictions = _infer_labels_packed(
+        [sentence for _, sentence in sentences], model, tokenizer, batch_size
+    )
+    return sentences_to_citations(sentences, predictions)
@@ -0,0 +1,286 @@
+"""
+A staged pipeline that overlaps segmentation, tokenization and inference across documents.
+
+`invoke()` handles one document at a time, in strict sequence, so the CPU idles during the
+forward pass and the model idles during segmentation. Here each step is a stage running on its
+own thread, connected to the next by a bounded queue:
+
+1. segment: reads documents (file I/O happens here, when the input is lazy) and splits them into
+   sentences with spaCy's batched `nlp.pipe` (optionally on several processes);
+2. batch: packs sentences from consecutive documents into batches and tokenizes them;
+3. infer: runs the model, decodes labels into citations and reassembles them per document.
+
+The forward pass, tokenizer and most of spaCy's work release the GIL, so the stages genuinely run
+concurrently. The queues bound how far a stage can run ahead, and therefore memory. Pass
+`threaded=False` to chain the very same stages in the calling thread, for debugging.
+"""
+
+import itertools
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from pydantic import BaseModel
+from transformers import AutoModelForTokenClassification, PreTrainedTokenizerFast
+
+from . import metrics
+from .corpus import Document
+from .invoke import (
+    DEFAULT_BATCH_SIZE,
+    DEFAULT_SEGMENT_BATCH_SIZE,
+    _cached,
+    _get_model,
+    _get_tokenizer,
+    batch_tokens,
+    decode_batch,
+    encode_batch,
+    predict_batch,
+    segment_many,
+)
+from .metrics import timed
+from .postprocess import labels_to_record
+from .types import Citation
+
+STAGES = ("segment", "batch", "infer")
+
+
+class PipelineReport(BaseModel):
+    """
+    Busy time per stage and wall time for a pipeline run. `overlap` is the total busy time over
+    the wall time: 1.0 means the stages ran one after the other, up to 3.0 that all three ran
+    side by side the whole time.
+    """
+
+    documents: int = 0
+    sentences: int = 0
+    batches: int = 0
+    wall_seconds: float = 0.0
+    stage_seconds: Dict[str, float] = {stage: 0.0 for stage in STAGES}
+
+    @contextmanager
+    def timed(self, stage: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stage_seconds[stage] += time.perf_counter() - start
+
+    @property
+    def overlap(self) -> float:
+        if not self.wall_seconds:
+            return 0.0
+        return sum(self.stage_seconds.values()) / self.wall_seconds
+
+    def __str__(self) -> str:
+        stages = ", ".join(f"{k}={v:.2f}s" for k, v in self.stage_seconds.items())
+        return (
+            f"{self.documents} document(s), {self.sentences} sentence(s) in {self.batches} "
+            f"batch(es), {self.wall_seconds:.2f}s wall ({stages}), overlap {self.overlap:.2f}x"
+        )
+
+
+# A sentence on its way through the pipeline: (document index, sentence start, sentence text).
+Sentence = Tuple[int, int, str]
+
+
+def _segment_stage(
+    docs: Iterable[Document],
+    batch_size: int,
+    n_process: int,
+    report: PipelineReport,
+) -> Iterator[Tuple[str, Any]]:
+    segmented = segment_many(
+        ((doc.text, doc) for doc in docs),
+        batch_size=batch_size,
+        n_process=n_process,
+        as_tuples=True,
+    )
+    for index in itertools.count():
+        # Reading counts towards the stage too, for lazily read documents.
+        with report.timed("segment"):
+            item = next(segmented, None)
+        if item is None:
+            return
+        sentences, doc = item
+        report.documents += 1
+        report.sentences += len(sentences)
+        metrics.DOCUMENTS.inc()
+        yield "doc", (index, doc, sentences)
+
+
+def _batch_stage(
+    events: Iterable[Tuple[str, Any]],
+    tokenizer: PreTrainedTokenizerFast,
+    batch_size: int,
+    sort_window: int,
+    report: PipelineReport,
+) -> Iterator[Tuple[str, Any]]:
+    """
+    Passes documents through (so the last stage knows what to expect) and turns their sentences
+    into tokenized batches, filling each batch across document boundaries. Sentences are grouped
+    by length within windows of `sort_window` batches.
+    """
+    pending: List[Sentence] = []
+
+    def flush() -> Iterator[Tuple[str, Any]]:
+        # Like `infer_labels_batch`, sort by length so that each batch needs little padding.
+        pending.sort(key=lambda sentence: len(sentence[2]))
+        for b in range(0, len(pending), batch_size):
+            batch = pending[b : b + batch_size]
+            with report.timed("batch"):
+                tokenized_input, offset_mapping = encode_batch(
+                    [text for _, _, text in batch], tokenizer
+                )
+                # Fast tokenizers must not be used from two threads at once, so token strings
+                # are looked up here rather than in the inference stage.
+                tokens = batch_tokens(tokenized_input, tokenizer)
+            report.batches += 1
+            yield "batch", (batch, tokenized_input, offset_mapping, tokens)
+        pending.clear()
+
+    for kind, (index, doc, sentences) in events:
+        yield kind, (index, doc, len(sentences))
+        pending.extend((index, offset, text) for offset, text in sentences)
+        if len(pending) >= batch_size * sort_window:
+            yield from flush()
+    yield from flush()
+
+
+def _infer_stage(
+    events: Iterable[Tuple[str, Any]],
+    model: AutoModelForTokenClassification,
+    report: PipelineReport,
+) -> Iterator[Tuple[Document, List[Citation]]]:
+    """
+    Runs the batches and yields every document, in input order, once all its sentences are done.
+    """
+    docs: Dict[int, Document] = {}
+    remaining: Dict[int, int] = {}
+    results: Dict[int, List[Citation]] = {}
+    next_index = 0
+
+    def ready() -> Iterator[Tuple[Document, List[Citation]]]:
+        nonlocal next_index
+        while remaining.get(next_index) == 0:
+            del remaining[next_index]
+            # Batches are sorted by length, so sentences complete out of order.
+            citations = sorted(results.pop(next_index), key=lambda c: c.start)
+            yield docs.pop(next_index), citations
+            next_index += 1
+
+    for kind, payload in events:
+        if kind == "doc":
+            index, doc, n_sentences = payload
+            docs[index], remaining[index], results[index] = doc, n_sentences, []
+        else:
+            sentences, tokenized_input, offset_mapping, tokens = payload
+            with report.timed("infer"):
+                predictions = predict_batch(tokenized_input, model)
+                labels = decode_batch(tokens, predictions, offset_mapping)
+                for (index, offset, text), sentence_labels in zip(sentences, labels):
+                    with timed("postprocess"):
+                        record = labels_to_record(sentence_labels, text)
+                        if record is not None:
+                            record.shift(offset)
+                            results[index].append(record.to_model())
+                    remaining[index] -= 1
+        yield from ready()
+
+
+_DONE = object()
+
+
+class _Failed:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+def _run_in_thread(
+    items: Iterator[Any], maxsize: int, stop: threading.Event, name: str
+) -> Iterator[Any]:
+    """
+    Drains `items` on a new thread into a bounded queue, and returns an iterator over that queue.
+    Exceptions are re-raised on the consuming side; setting `stop` makes the thread give up.
+    """
+    q: "queue.Queue[Any]" = queue.Queue(maxsize=maxsize)
+
+    def put(item: Any) -> bool:
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def work() -> None:
+        try:
+            for item in items:
+                if not put(item):
+                    return
+        except BaseException as e:
+            put(_Failed(e))
+            return
+        put(_DONE)
+
+    threading.Thread(target=work, name=f"cit-parser-{name}", daemon=True).start()
+
+    def consume() -> Iterator[Any]:
+        while True:
+            try:
+                item = q.get(timeout=0.1)
+            except queue.Empty:
+                if stop.is_set():
+                    return
+                continue
+            if item is _DONE:
+                return
+            if isinstance(item, _Failed):
+                raise item.error
+            yield item
+
+    return consume()
+
+
+def run_pipeline(
+    docs: Iterable[Document],
+    model: Optional[AutoModelForTokenClassification] = None,
+    tokenizer: Optional[PreTrainedTokenizerFast] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    queue_size: int = 8,
+    sort_window: int = 4,
+    segment_batch_size: int = DEFAULT_SEGMENT_BATCH_SIZE,
+    n_process: int = 1,
+    threaded: bool = True,
+    report: Optional[PipelineReport] = None,
+) -> Iterator[Tuple[Document, List[Citation]]]:
+    """
+    Extracts citations from `docs`, yielding each document with its citations (document-absolute
+    offsets) in input order. Results match `invoke()` on each document.
+
+    `queue_size` bounds how many items each stage may run ahead of the next, and sentences are
+    sorted by length within windows of `sort_window` batches. Segmentation goes through `nlp.pipe`
+    in batches of `segment_batch_size` documents, on `n_process` processes. Pass a
+    `PipelineReport` to get stage timings and the achieved overlap once the iterator is exhausted.
+    """
+    model = model if model is not None else _cached(_get_model, "model")
+    tokenizer = tokenizer or _cached(_get_tokenizer, "tokenizer")
+    report = report if report is not None else PipelineReport()
+    stop = threading.Event()
+    start = time.perf_counter()
+
+    segmented = _segment_stage(docs, segment_batch_size, n_process, report)
+    if threaded:
+        segmented = _run_in_thread(segmented, queue_size, stop, "segment")
+    batched = _batch_stage(segmented, tokenizer, batch_size, sort_window, report)
+    if threaded:
+        batched = _run_in_thread(batched, queue_size, stop, "batch")
+    # Inference runs on the consuming thread: it is the bottleneck stage, and whatever the caller
+    # does with the results (e.g. writing them out) is cheap next to it.
+    try:
+        yield from _infer_stage(batched, model, report)
+    finally:
+        stop.set()
+        report.wall_seconds = time.perf_counter() - start
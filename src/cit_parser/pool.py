@@ -0,0 +1,207 @@
+"""
+A pool of model replicas for concurrent inference from threaded servers.
+
+Calling `invoke()` from many threads shares one model, one tokenizer and torch's default
+(all-cores) intra-op thread pool between every caller, which oversubscribes the CPU. A
+`ModelPool` instead runs N replicas, each on its own worker thread with its own tokenizer and
+optionally its own set of pinned cores. Calls are queued and picked up by whichever replica is
+idle.
+
+torch's intra-op thread count is process-wide, so the replicas share one thread budget rather than
+getting a private one each. Set it low (e.g. 1) when running many replicas.
+"""
+
+import copy
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Sequence, Set
+
+import torch
+from transformers import AutoModelForTokenClassification, PreTrainedTokenizerFast
+from wasabi import msg
+
+from . import metrics
+from .invoke import _cached, _get_model, _get_tokenizer, invoke
+from .types import Citation
+
+
+class Replica:
+    """
+    One model instance together with the resources reserved for it.
+    """
+
+    def __init__(
+        self,
+        index: int,
+        model: AutoModelForTokenClassification,
+        tokenizer: PreTrainedTokenizerFast,
+        cpus: Optional[Set[int]] = None,
+    ):
+        self.index = index
+        self.model = model
+        self.tokenizer = tokenizer
+        self.cpus = cpus
+
+    def __repr__(self) -> str:
+        return f"Replica(index={self.index}, cpus={self.cpus})"
+
+
+def _available_cpus() -> List[int]:
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def partition_cpus(cpus: Sequence[int], replicas: int, cores: int) -> List[Set[int]]:
+    """
+    Splits `cpus` into `replicas` disjoint sets of `cores` cores, wrapping around if there are
+    not enough cores for every replica to get its own.
+    """
+    return [
+        {cpus[(r * cores + c) % len(cpus)] for c in range(cores)}
+        for r in range(replicas)
+    ]
+
+
+_STOP = object()
+
+
+class ModelPool:
+    """
+    Runs `replicas` model instances on dedicated worker threads.
+
+    Model weights are read-only during inference, so by default every replica shares the weights
+    of the one model and only gets its own tokenizer (fast tokenizers are not safe to call
+    concurrently). Pass `share_weights=False` to give each replica a private copy.
+
+    `threads` sets torch's intra-op thread count. It is a process-wide setting shared by every
+    replica (and every other caller of torch in the process), not a per-replica budget; left as
+    None, torch's default is kept.
+
+    With `pin=True`, each replica's worker thread is pinned to its own share of the available
+    cores (Linux only).
+    """
+
+    def __init__(
+        self,
+        replicas: int = 1,
+        threads: Optional[int] = None,
+        pin: bool = False,
+        share_weights: bool = True,
+        model: Optional[AutoModelForTokenClassification] = None,
+        tokenizer: Optional[PreTrainedTokenizerFast] = None,
+    ):
+        if replicas < 1:
+            raise ValueError("A pool needs at least one replica.")
+
+        cpus = _available_cpus()
+        cpu_sets: List[Optional[Set[int]]] = (
+            list(partition_cpus(cpus, replicas, max(1, len(cpus) // replicas)))
+            if pin and hasattr(os, "sched_setaffinity")
+            else [None] * replicas
+        )
+
+        model = model if model is not None else _cached(_get_model, "model")
+        tokenizer = tokenizer or _cached(_get_tokenizer, "tokenizer")
+
+        if threads is not None:
+            torch.set_num_threads(threads)
+        # Inter-op parallelism only helps graphs with independent branches; replicas already
+        # provide all the parallelism we want. This can only be set before torch starts using it.
+        try:
+            torch.set_num_interop_threads(1)
+        except RuntimeError:
+            pass
+
+        self.replicas = [
+            Replica(
+                index=i,
+                model=model if share_weights else copy.deepcopy(model),
+                tokenizer=copy.deepcopy(tokenizer),
+                cpus=cpu_sets[i],
+            )
+            for i in range(replicas)
+        ]
+        self._jobs: "queue.Queue[Any]" = queue.Queue()
+        self._workers = [
+            threading.Thread(
+                target=self._work,
+                args=(replica,),
+                name=f"cit-parser-replica-{replica.index}",
+                daemon=True,
+            )
+            for replica in self.replicas
+        ]
+        for worker in self._workers:
+            worker.start()
+        self._closed = False
+        msg.info(
+            f"Model pool started with {replicas} replica(s) sharing "
+            f"{torch.get_num_threads()} torch thread(s)"
+            + (" (pinned)." if pin else ".")
+        )
+
+    def _work(self, replica: Replica) -> None:
+        # Affinity applies to the calling thread, and is inherited by the threads torch spawns from
+        # it for intra-op parallelism.
+        if replica.cpus is not None:
+            os.sched_setaffinity(0, replica.cpus)
+
+        while True:
+            job = self._jobs.get()
+            if job is _STOP:
+                return
+            future, fn, args, kwargs, enqueued = job
+            if not future.set_running_or_notify_cancel():
+                continue
+            metrics.STAGE_SECONDS.observe(time.perf_counter() - enqueued, stage="queue")
+            try:
+                future.set_result(fn(replica, *args, **kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+
+    def submit(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Future:
+        """
+        Schedules `fn(replica, *args, **kwargs)` on the next idle replica.
+        """
+        if self._closed:
+            raise RuntimeError("Cannot submit to a closed pool.")
+        future: Future = Future()
+        self._jobs.put((future, fn, args, kwargs, time.perf_counter()))
+        return future
+
+    def invoke(self, text: str) -> List[Citation]:
+        """
+        Thread-safe equivalent of `invoke(text)`.
+        """
+        return self.submit(_invoke_on_replica, text).result()
+
+    def map(self, texts: Iterable[str]) -> Iterator[List[Citation]]:
+        """
+        Runs `invoke` over `texts` on all replicas, yielding results in input order.
+        """
+        futures = [self.submit(_invoke_on_replica, text) for text in texts]
+        for future in futures:
+            yield future.result()
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        for _ in self._workers:
+            self._jobs.put(_STOP)
+        for worker in self._workers:
+            worker.join()
+
+    def __enter__(self) -> "ModelPool":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def _invoke_on_replica(replica: Replica, text: str) -> List[Citation]:
+    return invoke(text, replica.model, replica.tokenizer)
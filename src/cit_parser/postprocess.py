@@ -1,29 +1,43 @@
-from typing import List, Optional
+from typing import Dict, Iterator, List, Optional, Sequence
 
-from .types import (
-    Authorities,
-    CaselawCitation,
-    Citation,
-    LabelPrediction,
-    StatuteCitation,
-)
+from .metrics import timed
+from .records import AnyLabel, CaselawRecord, CitationRecord, Label, StatuteRecord
+from .types import Authorities, Citation, LabelPrediction
 
 
-def labels_to_cit(
-    labels: List[LabelPrediction], original_text: str
-) -> Optional[Citation]:
-    entities = aggregate_entities(labels, original_text)
+def labels_to_cit(labels: Sequence[AnyLabel], original_text: str) -> Optional[Citation]:
+    record = labels_to_record(labels, original_text)
+    return None if record is None else record.to_model()
 
+
+def labels_to_record(
+    labels: Sequence[AnyLabel], original_text: str
+) -> Optional[CitationRecord]:
+    """
+    Like `labels_to_cit`, returning the internal record (see `records`).
+    """
+    return entities_to_record(_aggregate(labels, original_text))
+
+
+def entities_to_cit(entities: Sequence[AnyLabel]) -> Optional[Citation]:
+    """
+    Builds a citation from aggregated entities that all belong to the same citation.
+    """
+    record = entities_to_record(entities)
+    return None if record is None else record.to_model()
+
+
+def entities_to_record(entities: Sequence[AnyLabel]) -> Optional[CitationRecord]:
     if _is_caselaw_citation(entities):
-        return CaselawCitation.from_token_label_pairs(entities)
+        return CaselawRecord.from_labels(entities)
     elif _is_statute_citation(entities):
-        return StatuteCitation.from_token_label_pairs(entities)
+        return StatuteRecord.from_labels(entities)
     else:
         return None
 
 
 # Neither of the below seem good, but there is basically no mainstream language that offers a good way of declaratively and succinctly handling this kind of thing
-def _is_caselaw_citation(entities: List[LabelPrediction]) -> bool:
+def _is_caselaw_citation(entities: Sequence[AnyLabel]) -> bool:
     """
     Determines if the given combination of labels constitute a caselaw citation.
     """
@@ -33,7 +47,7 @@ def _is_caselaw_citation(entities: List[LabelPrediction]) -> bool:
     return has_case_name and (has_volume or has_reporter)
 
 
-def _is_statute_citation(entities: List[LabelPrediction]) -> bool:
+def _is_statute_citation(entities: Sequence[AnyLabel]) -> bool:
     """
     Determines if the given combination of labels constitute a statute citation.
     """
@@ -42,12 +56,16 @@ def _is_statute_citation(entities: List[LabelPrediction]) -> bool:
 
 
 def aggregate_entities(
-    labels: List[LabelPrediction], original_text: str
+    labels: Sequence[AnyLabel], original_text: str
 ) -> List[LabelPrediction]:
     """
     Aggregate tokens into entities based on their labels, handling subwords and punctuation.
     Uses the original text for precise reconstruction of entities.
     """
+    return [entity.to_model() for entity in _aggregate(labels, original_text)]
+
+
+def _aggregate(labels: Sequence[AnyLabel], original_text: str) -> List[Label]:
     current_start: int = 0
     current_end: int = 0
 
@@ -64,7 +82,7 @@ def aggregate_entities(
         "YEAR",
     }
 
-    res: List[LabelPrediction] = []
+    res: List[Label] = []
 
     current_label: Optional[str] = None
 
@@ -75,7 +93,7 @@ def aggregate_entities(
         if token in ["[CLS]", "[SEP]", "[PAD]"] or label == "O":
             if current_label:
                 res.append(
-                    LabelPrediction(
+                    Label(
                         token=original_text[current_start:current_end].strip(),
                         label=current_label,
                         start=current_start,
@@ -93,7 +111,7 @@ def aggregate_entities(
 
             if current_label:
                 res.append(
-                    LabelPrediction(
+                    Label(
                         token=original_text[current_start:current_end].strip(),
                         label=current_label,
                         start=current_start,
@@ -113,7 +131,7 @@ def aggregate_entities(
         else:
             if current_label:
                 res.append(
-                    LabelPrediction(
+                    Label(
                         token=original_text[current_start:current_end].strip(),
                         label=current_label,
                         start=current_start,
@@ -123,7 +141,7 @@ def aggregate_entities(
 
         if i == len(labels) - 1 and current_label is not None:
             res.append(
-                LabelPrediction(
+                Label(
                     token=original_text[current_start:current_end].strip(),
                     label=current_label,
                     start=current_start,
@@ -134,5 +152,57 @@ def aggregate_entities(
     return res
 
 
+# Position of each component within a citation; a citation never goes "backwards".
+_COMPONENT_ORDER: Dict[str, int] = {
+    "CASE_NAME": 0,
+    "TITLE": 0,
+    "VOLUME": 1,
+    "CODE": 1,
+    "REPORTER": 2,
+    "SECTION": 2,
+    "PAGE": 3,
+    "PIN": 4,
+    "COURT": 5,
+    "YEAR": 6,
+}
+
+
+def group_entities(
+    entities: Sequence[AnyLabel], max_gap: int = 32
+) -> Iterator[List[AnyLabel]]:
+    """
+    Splits a document-wide stream of aggregated entities into per-citation groups.
+
+    A new group starts when an entity's component comes before the previous one in citation order
+    (e.g. a CASE_NAME after a YEAR), repeats it after a gap, or is more than `max_gap` characters
+    away from the previous entity.
+    """
+    group: List[AnyLabel] = []
+    last_rank = -1
+
+    for entity in entities:
+        rank = _COMPONENT_ORDER.get(entity.label, 0)
+        if group:
+            gap = entity.start - group[-1].end
+            if gap > max_gap or rank < last_rank or (rank == last_rank and gap > 1):
+                yield group
+                group = []
+        group.append(entity)
+        last_rank = rank
+
+    if group:
+        yield group
+
+
+def shift_citation(cit: Citation, offset: int) -> Citation:
+    """
+    Moves a citation's span by `offset`, e.g. from sentence-relative to document-relative.
+    """
+    if not offset:
+        return cit
+    return cit.model_copy(update={"start": cit.start + offset, "end": cit.end + offset})
+
+
 def organize(cits: List[Citation]) -> Authorities:
-    return Authorities.construct(cits)
+    with timed("construct"):
+        return Authorities.construct(cits)
@@ -0,0 +1,203 @@
+"""
+Slotted stand-ins for `LabelPrediction` and the citation models, used inside the pipeline.
+
+The Pydantic models are validated on creation, and a citation recomputes `formatted_court` and
+`is_full` on every access. Inside the pipeline that work is repeated for every labeled token,
+every entity and every citation, of which only the citations are ever returned. The records here
+are plain `__slots__` classes with the same attributes. A citation record computes its derived
+fields once, at construction. Records never leave the package: `to_model()` builds the public
+model with `model_construct`, without validating the fields again, where a result is handed back
+to the caller.
+"""
+
+from typing import List, Optional, Sequence, Union
+
+from .normalize import normalize_code, normalize_reporter
+from .types import (
+    SCOTUS_REPORTERS,
+    SPAN,
+    CaselawCitation,
+    CitationType,
+    LabelPrediction,
+    StatuteCitation,
+    _caselaw_fields,
+    _statute_fields,
+)
+
+
+class Label:
+    """
+    The label of a token or of an aggregated entity; see `LabelPrediction`.
+    """
+
+    __slots__ = ("token", "label", "start", "end")
+
+    def __init__(self, token: str, label: str, start: int, end: int):
+        self.token = token
+        self.label = label
+        self.start = start
+        self.end = end
+
+    @property
+    def span(self) -> SPAN:
+        return self.start, self.end
+
+    def to_model(self) -> LabelPrediction:
+        return LabelPrediction.model_construct(
+            token=self.token, label=self.label, start=self.start, end=self.end
+        )
+
+    def __repr__(self) -> str:
+        return f"Label({self.token!r}, {self.label!r}, {self.start}, {self.end})"
+
+
+# Anything the postprocessing functions accept as a label.
+AnyLabel = Union[Label, LabelPrediction]
+
+
+class CaselawRecord:
+    """
+    See `CaselawCitation`.
+    """
+
+    __slots__ = (
+        "case_name",
+        "volume",
+        "reporter",
+        "starting_page",
+        "raw_pin_cite",
+        "raw_court",
+        "year",
+        "start",
+        "end",
+        "canonical_reporter",
+        "formatted_court",
+        "is_full",
+    )
+
+    citation_type = CitationType.OPINION
+
+    def __init__(
+        self,
+        case_name: str,
+        volume: Optional[int] = None,
+        reporter: Optional[str] = None,
+        starting_page: Optional[int] = None,
+        raw_pin_cite: Optional[str] = None,
+        raw_court: Optional[str] = None,
+        year: Optional[int] = None,
+        start: int = 0,
+        end: int = 0,
+    ):
+        self.case_name = case_name
+        self.volume = volume
+        self.reporter = reporter
+        self.starting_page = starting_page
+        self.raw_pin_cite = raw_pin_cite
+        self.raw_court = raw_court
+        self.year = year
+        self.start = start
+        self.end = end
+        self.canonical_reporter = normalize_reporter(reporter)
+        self.formatted_court = (
+            "SCOTUS" if self.canonical_reporter in SCOTUS_REPORTERS else raw_court
+        )
+        self.is_full = bool(
+            case_name
+            and volume
+            and reporter
+            and starting_page
+            and self.formatted_court
+            and year
+        )
+
+    @classmethod
+    def from_labels(cls, entities: Sequence[AnyLabel]) -> Optional["CaselawRecord"]:
+        fields = _caselaw_fields(entities)
+        return None if fields is None else cls(**fields)
+
+    def shift(self, offset: int) -> None:
+        self.start += offset
+        self.end += offset
+
+    def to_model(self) -> CaselawCitation:
+        # `citation_type` is left to its default, as in a validated model.
+        return CaselawCitation.model_construct(
+            case_name=self.case_name,
+            volume=self.volume,
+            reporter=self.reporter,
+            starting_page=self.starting_page,
+            raw_pin_cite=self.raw_pin_cite,
+            raw_court=self.raw_court,
+            year=self.year,
+            start=self.start,
+            end=self.end,
+            canonical_reporter=self.canonical_reporter,
+        )
+
+
+class StatuteRecord:
+    """
+    See `StatuteCitation`.
+    """
+
+    __slots__ = (
+        "title",
+        "code",
+        "section",
+        "year",
+        "start",
+        "end",
+        "canonical_code",
+        "is_full",
+    )
+
+    citation_type = CitationType.STATUTE
+
+    def __init__(
+        self,
+        section: str,
+        title: Optional[str] = None,
+        code: Optional[str] = None,
+        year: Optional[int] = None,
+        start: int = 0,
+        end: int = 0,
+    ):
+        self.title = title
+        self.code = code
+        self.section = section
+        self.year = year
+        self.start = start
+        self.end = end
+        self.canonical_code = normalize_code(code)
+        self.is_full = section is not None
+
+    @classmethod
+    def from_labels(cls, entities: Sequence[AnyLabel]) -> Optional["StatuteRecord"]:
+        fields = _statute_fields(entities)
+        return None if fields is None else cls(**fields)
+
+    def shift(self, offset: int) -> None:
+        self.start += offset
+        self.end += offset
+
+    def to_model(self) -> StatuteCitation:
+        return StatuteCitation.model_construct(
+            title=self.title,
+            code=self.code,
+            section=self.section,
+            year=self.year,
+            start=self.start,
+            end=self.end,
+            canonical_code=self.canonical_code,
+        )
+
+
+CitationRecord = Union[CaselawRecord, StatuteRecord]
+
+
+def label_models(rows: List[List[Label]]) -> List[List[LabelPrediction]]:
+    """
+    The public `LabelPrediction`s of per-text label records.
+    """
+    return [[label.to_model() for label in row] for row in rows]
@@ -0,0 +1,316 @@
+"""
+Several models side by side: pick one per call, load on demand, evict under a memory budget.
+
+`_get_model()` serves the single model configured at import time. A `ModelRegistry` instead serves
+any number of models by name (a hub id, a local directory or a registered alias) and revision,
+e.g. jurisdiction-specific fine-tunes or the two arms of an A/B test. Each model is loaded the
+first time it is asked for; concurrent requests for a model that is still loading wait for that
+one load. Before a load, the least recently used models are evicted to make room for the new
+model's weight files, where their size is known; after it, again while the loaded models' weights
+exceed the memory budget. A model still in use by a caller stays alive until that call returns.
+
+Tokenizers are compared by their full serialized definition (vocabulary, normalization and
+special tokens), and models with identical tokenizers share a single instance.
+"""
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from huggingface_hub import try_to_load_from_cache
+from transformers import (
+    AutoModelForTokenClassification,
+    AutoTokenizer,
+    PreTrainedTokenizerFast,
+)
+from wasabi import msg
+
+from . import metrics
+from .invoke import DEFAULT_BATCH_SIZE, DEVICE, Config, invoke
+from .loading import (
+    SAFETENSORS_FILE,
+    _safetensors_files,
+    load_local_model,
+    load_local_tokenizer,
+    offline_mode,
+)
+from .singleflight import SingleFlight
+from .types import Citation
+
+ModelLoader = Callable[[str, Optional[str]], AutoModelForTokenClassification]
+TokenizerLoader = Callable[[str, Optional[str]], PreTrainedTokenizerFast]
+SizeEstimator = Callable[[str, Optional[str]], Optional[float]]
+
+
+def _is_local(name: str) -> bool:
+    return name.startswith("file://") or os.path.isdir(name)
+
+
+def load_model(
+    name: str, revision: Optional[str] = None
+) -> AutoModelForTokenClassification:
+    """
+    Loads a model from a local directory, or from the hub at `revision` (a branch, tag or commit).
+    """
+    if _is_local(name):
+        model = load_local_model(name.removeprefix("file://"))
+    else:
+        start = time.perf_counter()
+        if Config.OFFLINE:
+            with offline_mode():
+                model = AutoModelForTokenClassification.from_pretrained(
+                    name, revision=revision, local_files_only=True
+                )
+        else:
+            model = AutoModelForTokenClassification.from_pretrained(
+                name, revision=revision
+            )
+        metrics.MODEL_LOAD_SECONDS.observe(time.perf_counter() - start, source="hub")
+    model.to(DEVICE)  # pyright: ignore
+    model.eval()  # pyright: ignore
+    # Models are typed as the Auto class they are loaded through throughout the package.
+    return model  # pyright: ignore[reportReturnType]
+
+
+def load_tokenizer(
+    name: str, revision: Optional[str] = None
+) -> PreTrainedTokenizerFast:
+    if _is_local(name):
+        return load_local_tokenizer(name.removeprefix("file://"))
+    if Config.OFFLINE:
+        with offline_mode():
+            tokenizer = AutoTokenizer.from_pretrained(
+                name, revision=revision, local_files_only=True
+            )
+    else:
+        tokenizer = AutoTokenizer.from_pretrained(name, revision=revision)
+    assert isinstance(tokenizer, PreTrainedTokenizerFast), (
+        "Tokenizer is not a PreTrainedTokenizerFast instance."
+    )
+    return tokenizer
+
+
+def estimate_model_mb(name: str, revision: Optional[str] = None) -> Optional[float]:
+    """
+    The size of a model's weight files, as an estimate of its memory before loading it. Known for
+    local directories and for single-file hub models already in the local cache; None otherwise.
+    """
+    if _is_local(name):
+        path = Path(name.removeprefix("file://"))
+        files = _safetensors_files(path) or [path / "pytorch_model.bin"]
+    else:
+        try:
+            cached = try_to_load_from_cache(name, SAFETENSORS_FILE, revision=revision)
+        except ValueError:  # not a valid repo id
+            cached = None
+        files = [Path(cached)] if isinstance(cached, str) else []
+    sizes = [f.stat().st_size for f in files if f.exists()]
+    return sum(sizes) / 2**20 if sizes else None
+
+
+def model_memory_mb(model: AutoModelForTokenClassification) -> float:
+    """
+    The size of a model's parameters and buffers.
+    """
+    tensors = list(model.parameters()) + list(model.buffers())  # pyright: ignore
+    return sum(t.numel() * t.element_size() for t in tensors) / 2**20
+
+
+def tokenizer_fingerprint(tokenizer: PreTrainedTokenizerFast) -> str:
+    """
+    Equal for tokenizers that split and number every text the same way.
+    """
+    definition = tokenizer.backend_tokenizer.to_str()
+    return hashlib.sha256(
+        f"{definition}|{tokenizer.model_max_length}".encode()
+    ).hexdigest()
+
+
+class _Loaded:
+    def __init__(
+        self,
+        model: AutoModelForTokenClassification,
+        tokenizer: PreTrainedTokenizerFast,
+        fingerprint: str,
+        memory_mb: float,
+    ):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.fingerprint = fingerprint
+        self.memory_mb = memory_mb
+
+
+class ModelRegistry:
+    """
+    Loads models on demand and keeps the most recently used ones within `memory_budget_mb` (no
+    limit if None). A single model larger than the budget is still served, alone.
+
+    Room is made before loading from the size `size_estimator` gives for the new model. When it
+    has no estimate, eviction waits until the model is loaded, so memory briefly exceeds the
+    budget by up to that one model.
+    """
+
+    def __init__(
+        self,
+        memory_budget_mb: Optional[float] = None,
+        model_loader: ModelLoader = load_model,
+        tokenizer_loader: TokenizerLoader = load_tokenizer,
+        size_estimator: SizeEstimator = estimate_model_mb,
+    ):
+        self.memory_budget_mb = memory_budget_mb
+        self._load_model = model_loader
+        self._load_tokenizer = tokenizer_loader
+        self._estimate_mb = size_estimator
+        self._lock = threading.Lock()
+        self._loaded: "OrderedDict[str, _Loaded]" = OrderedDict()
+        self._aliases: Dict[str, Tuple[str, Optional[str]]] = {}
+        # Shared tokenizers by fingerprint, and the models using each.
+        self._tokenizers: Dict[str, PreTrainedTokenizerFast] = {}
+        self._tokenizer_users: Dict[str, Set[str]] = {}
+        self._flight = SingleFlight()
+        self.loads = 0
+        self.evictions = 0
+
+    def register(self, alias: str, name: str, revision: Optional[str] = None) -> None:
+        """
+        Makes `alias` (e.g. "ca" or "candidate") stand for the model `name` at `revision`.
+        """
+        self._aliases[alias] = (name, revision)
+
+    def _resolve(
+        self, name: Optional[str], revision: Optional[str]
+    ) -> Tuple[str, Optional[str]]:
+        if name is None:
+            return Config.local_model_location or Config.HF_MODEL_NAME, revision
+        if name in self._aliases:
+            alias_name, alias_revision = self._aliases[name]
+            return alias_name, revision or alias_revision
+        return name, revision
+
+    def get(
+        self, name: Optional[str] = None, revision: Optional[str] = None
+    ) -> Tuple[AutoModelForTokenClassification, PreTrainedTokenizerFast]:
+        """
+        The model and tokenizer for `name` (the configured default model if None) at `revision`,
+        loading them if need be.
+        """
+        name, revision = self._resolve(name, revision)
+        key = f"{name}@{revision}" if revision else name
+        with self._lock:
+            loaded = self._loaded.get(key)
+            if loaded is not None:
+                self._loaded.move_to_end(key)
+                metrics.record_cache_lookup("registry", True)
+                return loaded.model, loaded.tokenizer
+        metrics.record_cache_lookup("registry", False)
+        loaded = self._flight.do(key, self._load, key, name, revision)
+        return loaded.model, loaded.tokenizer
+
+    def _load(self, key: str, name: str, revision: Optional[str]) -> _Loaded:
+        with self._lock:
+            # Loaded by a flight that landed between the lookup and this one.
+            if key in self._loaded:
+                return self._loaded[key]
+
+        if self.memory_budget_mb is not None:
+            estimate = self._estimate_mb(name, revision)
+            if estimate is not None:
+                with self._lock:
+                    self._evict(incoming_mb=estimate)
+
+        model = self._load_model(name, revision)
+        tokenizer = self._load_tokenizer(name, revision)
+        fingerprint = tokenizer_fingerprint(tokenizer)
+        loaded = _Loaded(model, tokenizer, fingerprint, model_memory_mb(model))
+
+        with self._lock:
+            # Reuse an identical tokenizer already in memory.
+            loaded.tokenizer = self._tokenizers.setdefault(fingerprint, tokenizer)
+            self._tokenizer_users.setdefault(fingerprint, set()).add(key)
+            self._loaded[key] = loaded
+            self.loads += 1
+            self._evict(keep=key)
+        msg.info(f"Model '{key}' loaded ({loaded.memory_mb:.0f}MB).")
+        return loaded
+
+    def _evict(self, keep: Optional[str] = None, incoming_mb: float = 0.0) -> None:
+        """
+        Evicts least recently used models other than `keep` until the loaded models plus
+        `incoming_mb` fit the budget.
+        """
+        while (
+            self.memory_budget_mb is not None
+            and self.memory_mb() + incoming_mb > self.memory_budget_mb
+        ):
+            key = next((k for k in self._loaded if k != keep), None)
+            if key is None:
+                return
+            self._unload(key)
+            msg.info(
+                f"Model '{key}' evicted to stay within {self.memory_budget_mb:.0f}MB."
+            )
+
+    def _unload(self, key: str) -> None:
+        loaded = self._loaded.pop(key)
+        users = self._tokenizer_users[loaded.fingerprint]
+        users.discard(key)
+        if not users:
+            del self._tokenizer_users[loaded.fingerprint]
+            del self._tokenizers[loaded.fingerprint]
+        self.evictions += 1
+
+    def evict(self, name: str, revision: Optional[str] = None) -> bool:
+        """
+        Unloads a model; returns whether it was loaded.
+        """
+        name, revision = self._resolve(name, revision)
+        key = f"{name}@{revision}" if revision else name
+        with self._lock:
+            if key not in self._loaded:
+                return False
+            self._unload(key)
+            return True
+
+    def loaded(self) -> List[str]:
+        """
+        The keys of the loaded models, least recently used first.
+        """
+        with self._lock:
+            return list(self._loaded)
+
+    def memory_mb(self) -> float:
+        return sum(loaded.memory_mb for loaded in self._loaded.values())
+
+    def invoke(
+        self,
+        text: str,
+        name: Optional[str] = None,
+        revision: Optional[str] = None,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+    ) -> List[Citation]:
+        """
+        `invoke()` with the model `name` at `revision`.
+        """
+        model, tokenizer = self.get(name, revision)
+        return invoke(text, model, tokenizer, batch_size)
+
+
+_default: Optional[ModelRegistry] = None
+_default_lock = threading.Lock()
+
+
+def default_registry() -> ModelRegistry:
+    """
+    The process-wide registry, with the budget from `CIT_PARSER_MODEL_MEMORY_MB` (unlimited if
+    unset).
+    """
+    global _default
+    with _default_lock:
+        if _default is None:
+            budget = os.getenv("CIT_PARSER_MODEL_MEMORY_MB")
+            _default = ModelRegistry(float(budget) if budget else None)
+        return _default
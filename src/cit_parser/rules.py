@@ -0,0 +1,146 @@
+"""
+Deterministic extraction of canonical citation forms.
+
+Full case citations such as "Brown v. Board of Education, 347 U.S. 483 (1954)" and code
+citations such as "42 U.S.C. § 1983" follow rigid patterns. When the reporter or code is a known
+one (see `normalize`), a regex extracts them with high precision and without a forward pass.
+Anything less canonical (short forms, Id., supra, unknown reporters) is left for the model.
+"""
+
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .normalize import CODES, REPORTERS
+from .types import CaselawCitation, Citation, StatuteCitation
+
+# Codes cited as "<title> <code> § <section>"; the remaining codes with sections are cited as
+# "<code> § <section>".
+TITLED_CODES = ["U.S.C.", "U.S.C.A.", "U.S.C.S.", "C.F.R.", "Pa. Cons. Stat."]
+_UNSECTIONED_CODES = {
+    "Stat.",
+    "Ill. Comp. Stat.",
+    "Fed. R. Civ. P.",
+    "Fed. R. Crim. P.",
+    "Fed. R. Evid.",
+}
+UNTITLED_CODES = [
+    c for c in CODES if c not in TITLED_CODES and c not in _UNSECTIONED_CODES
+]
+
+
+def _forms(table: Dict[str, List[str]], canonicals: Iterable[str]) -> List[str]:
+    return [form for c in canonicals for form in [c, *table[c]]]
+
+
+def _alternation(forms: List[str]) -> str:
+    # Longest first, so "F. Supp. 2d" wins over "F." and "F. Supp.".
+    return "|".join(re.escape(f) for f in sorted(forms, key=len, reverse=True))
+
+
+_WORD = r"(?:[A-Z][\w.'&-]*,?|of|the|and|for|in|on|ex|rel\.|de|la|&)"
+_PARTY = rf"[A-Z][\w.'&-]*,?(?:\s+{_WORD})*?"
+
+CASE_PATTERN = re.compile(
+    rf"(?P<case_name>{_PARTY}\s+v\.\s+{_PARTY}),\s+"
+    rf"(?P<volume>\d{{1,4}})\s+"
+    rf"(?P<reporter>{_alternation(_forms(REPORTERS, REPORTERS))})\s+"
+    rf"(?P<page>\d{{1,5}})"
+    rf"(?:,\s*(?P<pin>\d{{1,5}}(?:[-–]\d{{1,5}})?))?"
+    rf"\s+\((?:(?P<court>[^()]+?)\s+)?(?P<year>\d{{4}})\)"
+)
+
+STATUTE_PATTERN = re.compile(
+    rf"(?:(?P<title>\d{{1,3}})\s+"
+    rf"(?P<titled_code>{_alternation(_forms(CODES, TITLED_CODES))})"
+    rf"|(?P<code>{_alternation(_forms(CODES, UNTITLED_CODES))}))"
+    r"\s+§§?\s*(?P<section>\d[\w-]*(?:[.:][\w-]+)*(?:\(\w+\))*)"
+    r"(?:\s+\((?P<year>\d{4})\))?"
+)
+
+# Leading words that the party pattern cannot tell apart from a case name.
+_SIGNALS = re.compile(
+    r"^(?:(?:See|also|Cf\.|But|Accord|Compare|Contra|E\.g\.,?|In|The|And|Under|As|Citing)\s+)+"
+)
+
+# Anything left in a sentence that could still be (part of) a citation.
+_CITATION_SIGNAL = re.compile(r"\d|§|\bId\b|\bid\.|\bsupra\b|\binfra\b", re.IGNORECASE)
+
+MIN_YEAR = 1600
+MAX_YEAR = 2100
+
+
+def _case_from_match(m: re.Match) -> Optional[CaselawCitation]:
+    year = int(m["year"])
+    if not MIN_YEAR <= year <= MAX_YEAR:
+        return None
+
+    case_name = m["case_name"]
+    signal = _SIGNALS.match(case_name)
+    start = m.start()
+    if signal:
+        case_name = case_name[signal.end() :]
+        start += signal.end()
+    if " v. " not in case_name:
+        return None
+
+    return CaselawCitation(
+        case_name=case_name,
+        volume=int(m["volume"]),
+        reporter=m["reporter"],
+        starting_page=int(m["page"]),
+        raw_pin_cite=m["pin"],
+        raw_court=m["court"],
+        year=year,
+        start=start,
+        end=m.end(),
+    )
+
+
+def _statute_from_match(m: re.Match) -> StatuteCitation:
+    year = m["year"]
+    return StatuteCitation(
+        title=m["title"],
+        code=m["titled_code"] or m["code"],
+        section=m["section"],
+        year=int(year) if year else None,
+        start=m.start(),
+        end=m.end(),
+    )
+
+
+def extract_canonical(text: str) -> Tuple[List[Citation], str]:
+    """
+    Extracts every unambiguous canonical citation in `text`.
+
+    Returns the citations (offsets relative to `text`) and the residue: `text` with the matched
+    spans blanked out, which still needs to go through the model if it contains anything that
+    looks like a citation (see `needs_model`).
+    """
+    res: List[Citation] = []
+    residue = list(text)
+
+    for m in CASE_PATTERN.finditer(text):
+        cit = _case_from_match(m)
+        if cit:
+            res.append(cit)
+            residue[cit.start : cit.end] = " " * (cit.end - cit.start)
+
+    for m in STATUTE_PATTERN.finditer(text):
+        cit = _statute_from_match(m)
+        if residue[cit.start] == " " and text[cit.start] != " ":
+            continue  # inside a case citation already taken
+        res.append(cit)
+        residue[cit.start : cit.end] = " " * (cit.end - cit.start)
+
+    res.sort(key=lambda c: c.start)
+    return res, "".join(residue)
+
+
+def needs_model(residue: str) -> bool:
+    """
+    True if the residue still contains something that might be a citation.
+
+    Every citation the model can produce needs a volume, reporter or section, all of which
+    involve digits, "§", Id. or supra; sentences without any of these cannot contain one.
+    """
+    return _CITATION_SIGNAL.search(residue) is not None
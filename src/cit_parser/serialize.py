@@ -0,0 +1,225 @@
+"""
+Streaming JSONL serialization of citations and `Authorities`.
+
+Citations are written one per line straight from their field values, skipping Pydantic's
+per-object serializer, and read back without validation (the data was valid when written). `Authorities` cannot go through Pydantic at all since its dicts are keyed by
+citation objects; it is written as one line per authority: a canonical string id, the authority
+citation itself and the list of its member citations.
+
+Encoding and decoding go through pydantic-core's JSON functions, which are several times faster
+than the standard library `json` module and need no extra dependency.
+
+Citations can also be written to Parquet (one flat row per citation) with `ParquetCitationWriter`,
+which needs the optional `pyarrow` dependency.
+"""
+
+import os
+from typing import IO, Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from pydantic_core import from_json, to_json
+
+from .normalize import code_key, normalize_code, normalize_reporter, reporter_key
+from .types import (
+    Authorities,
+    CaselawCitation,
+    Citation,
+    CitationType,
+    StatuteCitation,
+)
+
+_ALL_FIELDS = set(CaselawCitation.model_fields) | set(StatuteCitation.model_fields)
+
+
+def authority_key(citation: Citation) -> str:
+    """
+    A canonical string id for the authority a citation refers to, e.g. "case:347:U.S.:483" or
+    "statute:U.S.C.:1983".
+    """
+    if citation.citation_type == CitationType.OPINION:
+        return (
+            f"case:{citation.volume or ''}:{reporter_key(citation.reporter) or ''}:"  # pyright: ignore
+            f"{citation.starting_page or ''}"  # pyright: ignore
+        )
+    return f"statute:{code_key(citation.code) or ''}:{citation.section}"  # pyright: ignore
+
+
+def citation_to_dict(citation: Citation) -> Dict[str, Any]:
+    """
+    The citation's fields as plain JSON-compatible values, without going through Pydantic.
+    """
+    res = dict(citation.__dict__)
+    res["citation_type"] = CitationType(res["citation_type"]).value
+    return res
+
+
+def citation_from_dict(data: Dict[str, Any]) -> Citation:
+    """
+    Rebuilds a citation from `citation_to_dict` output without validating it.
+
+    Records written before canonical names were stored get them filled in here, as validation
+    would have done.
+    """
+    fields = dict(data)
+    # Kept as its string value, which is what validation stores (`use_enum_values`).
+    if fields["citation_type"] == CitationType.OPINION.value:
+        if fields.get("canonical_reporter") is None:
+            fields["canonical_reporter"] = normalize_reporter(fields.get("reporter"))
+        return CaselawCitation.model_construct(**fields)
+    if fields.get("canonical_code") is None:
+        fields["canonical_code"] = normalize_code(fields.get("code"))
+    return StatuteCitation.model_construct(**fields)
+
+
+def write_citations(
+    citations: Iterable[Citation],
+    fp: IO[str],
+    extra: Optional[Dict[str, Any]] = None,
+) -> int:
+    """
+    Writes one citation per line to `fp`, merging `extra` fields (e.g. a document id) into every
+    record. Returns the number of lines written.
+    """
+    n = 0
+    for citation in citations:
+        record = citation_to_dict(citation)
+        if extra:
+            record.update(extra)
+        fp.write(to_json(record).decode())
+        fp.write("\n")
+        n += 1
+    return n
+
+
+def read_citations(fp: IO[str]) -> Iterator[Citation]:
+    """
+    Streams citations back from a file written by `write_citations`, dropping any extra fields.
+    """
+    for citation, _ in read_citation_records(fp):
+        yield citation
+
+
+def read_citation_records(fp: IO[str]) -> Iterator[Tuple[Citation, Dict[str, Any]]]:
+    """
+    Like `read_citations`, but also yields the extra fields of each record.
+    """
+    for line in fp:
+        if line.strip():
+            data = from_json(line)
+            extra = {k: data.pop(k) for k in list(data) if k not in _ALL_FIELDS}
+            yield citation_from_dict(data), extra
+
+
+def write_authorities(authorities: Authorities, fp: IO[str]) -> int:
+    """
+    Writes one line per authority: `{"id": ..., "authority": {...}, "citations": [...]}`.
+    """
+    n = 0
+    groups = list(authorities.caselaw.items()) + list(authorities.statutes.items())
+    for authority, members in groups:
+        record = {
+            "id": authority_key(authority),
+            "authority": citation_to_dict(authority),
+            "citations": [citation_to_dict(c) for c in members],
+        }
+        fp.write(to_json(record).decode())
+        fp.write("\n")
+        n += 1
+    return n
+
+
+def read_authorities(fp: IO[str]) -> Authorities:
+    """
+    Rebuilds `Authorities` from a file written by `write_authorities`.
+    """
+    caselaw: Dict[CaselawCitation, List[CaselawCitation]] = {}
+    statutes: Dict[StatuteCitation, List[StatuteCitation]] = {}
+    for line in fp:
+        if not line.strip():
+            continue
+        record = from_json(line)
+        authority = citation_from_dict(record["authority"])
+        members = [citation_from_dict(c) for c in record["citations"]]
+        if isinstance(authority, CaselawCitation):
+            caselaw[authority] = members  # pyright: ignore
+        else:
+            statutes[authority] = members  # pyright: ignore
+    return Authorities.model_construct(caselaw=caselaw, statutes=statutes)
+
+
+def _is_int_field(name: str) -> bool:
+    for cls in (CaselawCitation, StatuteCitation):
+        field = cls.model_fields.get(name)
+        if field is not None:
+            return field.annotation in (int, Optional[int])
+    return False
+
+
+class ParquetCitationWriter:
+    """
+    Streams citations into a Parquet file, one row per citation with a column per citation field
+    (null where the field does not apply) plus one string column per name in `extra_fields`.
+
+    Rows are buffered and flushed as a row group every `row_group_size` citations.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, os.PathLike],
+        extra_fields: Iterable[str] = (),
+        row_group_size: int = 65536,
+    ):
+        try:
+            # Optional dependency (the `parquet` extra), not installed for type checking.
+            import pyarrow as pa  # pyright: ignore[reportMissingImports]
+            import pyarrow.parquet as pq  # pyright: ignore[reportMissingImports]
+        except ImportError as e:
+            raise ImportError(
+                "Writing Parquet requires pyarrow. Install it with `pip install pyarrow`."
+            ) from e
+
+        self._pa = pa
+        self._extra_fields = list(extra_fields)
+        self.schema = pa.schema(
+            [
+                (name, pa.int64() if _is_int_field(name) else pa.string())
+                for name in sorted(_ALL_FIELDS)
+            ]
+            + [(name, pa.string()) for name in self._extra_fields]
+        )
+        self._writer = pq.ParquetWriter(str(path), self.schema)
+        self._rows: List[Dict[str, Any]] = []
+        self._row_group_size = row_group_size
+
+    def write(
+        self, citations: Iterable[Citation], extra: Optional[Dict[str, Any]] = None
+    ) -> int:
+        """
+        Buffers `citations`, with the same `extra` semantics as `write_citations`. Returns the
+        number of rows added.
+        """
+        n = 0
+        for citation in citations:
+            record = citation_to_dict(citation)
+            if extra:
+                record.update(extra)
+            self._rows.append(record)
+            n += 1
+        if len(self._rows) >= self._row_group_size:
+            self.flush()
+        return n
+
+    def flush(self) -> None:
+        if self._rows:
+            table = self._pa.Table.from_pylist(self._rows, schema=self.schema)
+            self._writer.write_table(table)
+            self._rows = []
+
+    def close(self) -> None:
+        self.flush()
+        self._writer.close()
+
+    def __enter__(self) -> "ParquetCitationWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
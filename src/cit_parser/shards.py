@@ -0,0 +1,515 @@
+"""
+Sharded processing across machines, coordinated through a SQLite job queue with leases.
+
+A backfill too large for one machine is split into shards of a few hundred documents and queued
+in `queue.sqlite` inside a job directory on a filesystem every host can reach. Any number of
+workers, on any hosts, then claim one shard at a time. A claim is a lease: the worker keeps
+renewing it while it processes the shard, and a shard whose lease runs out (because its worker
+died or hung) goes back to the queue for another worker to take. A shard that keeps failing is
+given up on after a few attempts.
+
+Each shard's results are published as two JSONL parts, its citations (with `doc_id`) and its merged
+`Authorities`, written atomically under names derived from the shard id, so a shard processed
+twice simply overwrites identical output. Once every shard is done, `reduce_job` merges the parts
+into one citations file and one authorities file.
+
+SQLite's locking must work on the shared filesystem (it does on local disks and on most NFS
+setups with working POSIX locks), and the hosts' clocks must roughly agree, as leases expire by
+wall-clock time.
+"""
+
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from pydantic import BaseModel
+from transformers import AutoModelForTokenClassification, PreTrainedTokenizerFast
+from wasabi import msg
+
+from .checkpoint import atomic_open, model_revision
+from .corpus import BACKENDS, Backend, extract_documents, read_documents
+from .invoke import DEFAULT_BATCH_SIZE, _cached, _get_model
+from .serialize import read_authorities, write_authorities, write_citations
+from .types import Authorities, CaselawCitation, StatuteCitation
+
+QUEUE_FILE = "queue.sqlite"
+PARTS_DIR = "parts"
+CITATIONS_FILE = "citations.jsonl"
+AUTHORITIES_FILE = "authorities.jsonl"
+
+DEFAULT_SHARD_SIZE = 200
+DEFAULT_LEASE_SECONDS = 300.0
+DEFAULT_MAX_ATTEMPTS = 3
+
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+
+PathLike = Union[str, os.PathLike]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS shards (
+    id INTEGER PRIMARY KEY,
+    documents TEXT NOT NULL,
+    state TEXT NOT NULL,
+    worker TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT
+);
+"""
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def merge_authorities(parts: Iterable[Authorities]) -> Authorities:
+    """
+    Merges the `Authorities` of several documents or shards. Case law is merged by authority;
+    statutes by section, keeping the fullest citation as the authority, as `Authorities.construct`
+    does within one document.
+    """
+    caselaw: Dict[CaselawCitation, List[CaselawCitation]] = {}
+    statutes: Dict[StatuteCitation, List[StatuteCitation]] = {}
+    statutes_by_section: Dict[str, StatuteCitation] = {}
+    for part in parts:
+        for authority, members in part.caselaw.items():
+            caselaw.setdefault(authority, []).extend(members)
+        for authority, members in part.statutes.items():
+            existing = statutes_by_section.get(authority.section)
+            if existing is None:
+                statutes[authority] = list(members)
+                statutes_by_section[authority.section] = authority
+            elif authority.is_fuller_than(existing):
+                statutes[authority] = statutes.pop(existing) + members
+                statutes_by_section[authority.section] = authority
+            else:
+                statutes[existing].extend(members)
+    return Authorities.model_construct(caselaw=caselaw, statutes=statutes)
+
+
+class Shard(BaseModel):
+    id: int
+    documents: List[Tuple[str, str]]
+    attempts: int
+
+    @property
+    def name(self) -> str:
+        return f"shard-{self.id:06d}"
+
+
+class ShardQueue:
+    """
+    The job queue in `job_dir`. Every method runs in its own transaction, so the queue can be
+    shared by any number of processes.
+    """
+
+    def __init__(self, job_dir: PathLike, timeout: float = 60.0):
+        self.job_dir = Path(job_dir)
+        self.path = self.job_dir / QUEUE_FILE
+        self._timeout = timeout
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        # Autocommit mode with explicit transactions. IMMEDIATE takes the write lock up front, so
+        # two workers can never both see a shard as claimable.
+        conn = sqlite3.connect(self.path, timeout=self._timeout, isolation_level=None)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+
+    @classmethod
+    def create(
+        cls,
+        job_dir: PathLike,
+        inputs: List[Tuple[str, Optional[Path]]],
+        shard_size: int = DEFAULT_SHARD_SIZE,
+        backend: str = "sentence",
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+    ) -> "ShardQueue":
+        """
+        Creates the queue for `inputs` (from `resolve_inputs`), split into shards of `shard_size`
+        documents. Paths are stored absolute and must resolve the same way on every worker host.
+        """
+        if backend not in BACKENDS:
+            raise ValueError(
+                f"Unknown backend '{backend}', expected one of {sorted(BACKENDS)}."
+            )
+        if any(path is None for _, path in inputs):
+            raise ValueError("A sharded job cannot read from standard input.")
+        job_dir = Path(job_dir)
+        job_dir.mkdir(parents=True, exist_ok=True)
+        if (job_dir / QUEUE_FILE).exists():
+            raise FileExistsError(f"'{job_dir}' already holds a job queue.")
+
+        queue = cls(job_dir)
+        documents = [(doc_id, str(path.resolve())) for doc_id, path in inputs]  # pyright: ignore
+        conn = sqlite3.connect(queue.path)
+        conn.executescript(_SCHEMA)
+        conn.close()
+        with queue._transaction() as conn:
+            conn.executemany(
+                "INSERT INTO meta VALUES (?, ?)",
+                [
+                    ("backend", backend),
+                    ("batch_size", str(batch_size)),
+                    ("max_attempts", str(max_attempts)),
+                ],
+            )
+            conn.executemany(
+                "INSERT INTO shards (id, documents, state) VALUES (?, ?, ?)",
+                [
+                    (i, json.dumps(documents[start : start + shard_size]), PENDING)
+                    for i, start in enumerate(range(0, len(documents), shard_size))
+                ],
+            )
+        return queue
+
+    def meta(self) -> Dict[str, str]:
+        with self._transaction() as conn:
+            return dict(conn.execute("SELECT key, value FROM meta").fetchall())
+
+    def check_model(self, revision: str) -> None:
+        """
+        Records the model revision of the first worker, and refuses workers running another one.
+        """
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO meta VALUES ('model_revision', ?)", (revision,)
+            )
+            (expected,) = conn.execute(
+                "SELECT value FROM meta WHERE key = 'model_revision'"
+            ).fetchone()
+        if expected != revision:
+            raise ValueError(
+                f"This job runs model revision '{expected}', not '{revision}'."
+            )
+
+    def claim(
+        self, worker: str, lease_seconds: float = DEFAULT_LEASE_SECONDS
+    ) -> Optional[Shard]:
+        """
+        Leases the next pending shard, or one whose lease expired, to `worker`. None if there is
+        no such shard right now.
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            max_attempts = self._max_attempts(conn)
+            while True:
+                row = conn.execute(
+                    "SELECT id, documents, attempts FROM shards WHERE state = ? "
+                    "OR (state = ? AND lease_expires < ?) ORDER BY id LIMIT 1",
+                    (PENDING, LEASED, now),
+                ).fetchone()
+                if row is None:
+                    return None
+                shard_id, documents, attempts = row
+                if attempts < max_attempts:
+                    break
+                # Its workers died or hung on it on every attempt.
+                conn.execute(
+                    "UPDATE shards SET state = ?, worker = NULL, error = ? WHERE id = ?",
+                    (FAILED, "The lease expired on the last attempt.", shard_id),
+                )
+            conn.execute(
+                "UPDATE shards SET state = ?, worker = ?, lease_expires = ?, "
+                "attempts = attempts + 1 WHERE id = ?",
+                (LEASED, worker, now + lease_seconds, shard_id),
+            )
+        return Shard(
+            id=shard_id,
+            documents=[tuple(d) for d in json.loads(documents)],
+            attempts=attempts + 1,
+        )
+
+    @staticmethod
+    def _max_attempts(conn: sqlite3.Connection) -> int:
+        row = conn.execute(
+            "SELECT value FROM meta WHERE key = 'max_attempts'"
+        ).fetchone()
+        return int(row[0])
+
+    def renew(
+        self, shard: Shard, worker: str, lease_seconds: float = DEFAULT_LEASE_SECONDS
+    ) -> bool:
+        """
+        Extends `worker`'s lease on `shard`; False if the lease was lost to another worker.
+        """
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE shards SET lease_expires = ? WHERE id = ? AND state = ? AND worker = ?",
+                (time.time() + lease_seconds, shard.id, LEASED, worker),
+            )
+            return cursor.rowcount == 1
+
+    def complete(self, shard: Shard, worker: str) -> None:
+        """
+        Marks `shard` done. Its outputs are published by then, so this holds even if the lease was
+        lost in the meantime: whoever else took it over writes the same outputs.
+        """
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE shards SET state = ?, worker = ?, lease_expires = NULL, error = NULL "
+                "WHERE id = ?",
+                (DONE, worker, shard.id),
+            )
+
+    def fail(self, shard: Shard, worker: str, error: str) -> None:
+        """
+        Returns `shard` to the queue, or gives up on it after the maximum number of attempts.
+        """
+        with self._transaction() as conn:
+            max_attempts = self._max_attempts(conn)
+            conn.execute(
+                "UPDATE shards SET state = ?, worker = NULL, lease_expires = NULL, error = ? "
+                "WHERE id = ? AND state = ? AND worker = ?",
+                (
+                    FAILED if shard.attempts >= max_attempts else PENDING,
+                    error,
+                    shard.id,
+                    LEASED,
+                    worker,
+                ),
+            )
+
+    def status(self) -> Dict[str, int]:
+        """
+        The number of shards in each state.
+        """
+        with self._transaction() as conn:
+            counts = dict(
+                conn.execute(
+                    "SELECT state, COUNT(*) FROM shards GROUP BY state"
+                ).fetchall()
+            )
+        return {
+            state: counts.get(state, 0) for state in (PENDING, LEASED, DONE, FAILED)
+        }
+
+    def shards(self) -> List[Shard]:
+        with self._transaction() as conn:
+            rows = conn.execute(
+                "SELECT id, documents, attempts FROM shards ORDER BY id"
+            ).fetchall()
+        return [
+            Shard(
+                id=i, documents=[tuple(d) for d in json.loads(docs)], attempts=attempts
+            )
+            for i, docs, attempts in rows
+        ]
+
+    def failures(self) -> Dict[int, str]:
+        with self._transaction() as conn:
+            return dict(
+                conn.execute(
+                    "SELECT id, error FROM shards WHERE state = ? ORDER BY id",
+                    (FAILED,),
+                ).fetchall()
+            )
+
+    def pending(self) -> bool:
+        """
+        Whether any shard is still to be processed or being processed.
+        """
+        status = self.status()
+        return status[PENDING] + status[LEASED] > 0
+
+
+class WorkerReport(BaseModel):
+    shards: int = 0
+    documents: int = 0
+    citations: int = 0
+    failed_shards: int = 0
+    seconds: float = 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"{self.shards} shard(s), {self.documents} document(s), "
+            f"{self.citations} citation(s) in {self.seconds:.1f}s; "
+            f"{self.failed_shards} shard attempt(s) failed."
+        )
+
+
+def _part_paths(job_dir: Path, shard: Shard) -> Tuple[Path, Path]:
+    parts = job_dir / PARTS_DIR
+    return parts / f"{shard.name}.jsonl", parts / f"{shard.name}.authorities.jsonl"
+
+
+class _Heartbeat:
+    """
+    Renews a lease every third of its length until stopped.
+    """
+
+    def __init__(
+        self, queue: ShardQueue, shard: Shard, worker: str, lease_seconds: float
+    ):
+        self._stop = threading.Event()
+        self.lost = False
+
+        def beat():
+            while not self._stop.wait(lease_seconds / 3):
+                if not queue.renew(shard, worker, lease_seconds):
+                    self.lost = True
+                    msg.warn(f"Lost the lease on {shard.name} to another worker.")
+                    return
+
+        self._thread = threading.Thread(target=beat, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+
+def _process_shard(
+    queue: ShardQueue,
+    shard: Shard,
+    model: AutoModelForTokenClassification,
+    tokenizer: Optional[PreTrainedTokenizerFast],
+    workers: int,
+    backend: str,
+    batch_size: int,
+    backend_fn: Optional[Backend] = None,
+) -> Tuple[int, int]:
+    """
+    Runs `shard` and publishes its parts. Returns the number of documents and citations.
+    """
+    docs = read_documents((doc_id, Path(path)) for doc_id, path in shard.documents)
+    results = extract_documents(
+        docs, backend, batch_size, workers, model, tokenizer, backend_fn=backend_fn
+    )
+    citations_path, authorities_path = _part_paths(queue.job_dir, shard)
+    citations_path.parent.mkdir(parents=True, exist_ok=True)
+
+    documents = n_citations = 0
+    authorities: List[Authorities] = []
+    with atomic_open(citations_path) as fp:
+        for doc, citations in results:
+            write_citations(citations, fp, {"doc_id": doc.id})
+            authorities.append(Authorities.construct(citations))
+            documents += 1
+            n_citations += len(citations)
+    with atomic_open(authorities_path) as fp:
+        write_authorities(merge_authorities(authorities), fp)
+    return documents, n_citations
+
+
+def run_worker(
+    job_dir: PathLike,
+    model: Optional[AutoModelForTokenClassification] = None,
+    tokenizer: Optional[PreTrainedTokenizerFast] = None,
+    workers: int = 1,
+    worker_id: Optional[str] = None,
+    lease_seconds: float = DEFAULT_LEASE_SECONDS,
+    idle_seconds: float = 5.0,
+    stop: Optional[threading.Event] = None,
+    backend_fn: Optional[Backend] = None,
+) -> WorkerReport:
+    """
+    Claims and processes shards of the job in `job_dir` on a pool of `workers` replicas until no
+    shard is left or `stop` is set. While other workers hold the only remaining leases, checks
+    back every `idle_seconds` in case one of them expires. `backend_fn` replaces the job's
+    backend function, as in `extract_documents`.
+    """
+    queue = ShardQueue(job_dir)
+    if not queue.path.exists():
+        raise FileNotFoundError(f"No job queue in '{job_dir}'.")
+    meta = queue.meta()
+    model = model if model is not None else _cached(_get_model, "model")
+    queue.check_model(model_revision(model))
+    worker_id = worker_id or default_worker_id()
+    stop = stop or threading.Event()
+    report = WorkerReport()
+    start = time.perf_counter()
+
+    while not stop.is_set():
+        shard = queue.claim(worker_id, lease_seconds)
+        if shard is None:
+            if not queue.pending():
+                break
+            stop.wait(idle_seconds)
+            continue
+
+        msg.info(f"{worker_id}: {shard.name} ({len(shard.documents)} document(s)).")
+        heartbeat = _Heartbeat(queue, shard, worker_id, lease_seconds)
+        try:
+            documents, citations = _process_shard(
+                queue,
+                shard,
+                model,
+                tokenizer,
+                workers,
+                meta["backend"],
+                int(meta["batch_size"]),
+                backend_fn,
+            )
+        except Exception as e:
+            heartbeat.stop()
+            report.failed_shards += 1
+            msg.fail(f"{worker_id}: {shard.name} failed: {e}")
+            queue.fail(shard, worker_id, f"{type(e).__name__}: {e}")
+            continue
+        heartbeat.stop()
+        queue.complete(shard, worker_id)
+        report.shards += 1
+        report.documents += documents
+        report.citations += citations
+
+    report.seconds = time.perf_counter() - start
+    return report
+
+
+def reduce_job(job_dir: PathLike) -> Tuple[Authorities, int]:
+    """
+    Merges the parts of a finished job into `citations.jsonl` and `authorities.jsonl` in
+    `job_dir`. Returns the merged authorities and the number of citations. Raises a RuntimeError
+    if shards are still pending or have failed.
+    """
+    job_dir = Path(job_dir)
+    queue = ShardQueue(job_dir)
+    status = queue.status()
+    if status[PENDING] or status[LEASED]:
+        raise RuntimeError(
+            f"{status[PENDING] + status[LEASED]} shard(s) are not finished yet."
+        )
+    failures = queue.failures()
+    if failures:
+        details = "; ".join(f"shard {i}: {error}" for i, error in failures.items())
+        raise RuntimeError(f"{len(failures)} shard(s) failed ({details}).")
+
+    shards = queue.shards()
+
+    n_citations = 0
+    with atomic_open(job_dir / CITATIONS_FILE) as out:
+        for shard in shards:
+            with open(_part_paths(job_dir, shard)[0]) as fp:
+                for line in fp:
+                    out.write(line)
+                    n_citations += 1
+
+    def parts() -> Iterator[Authorities]:
+        for shard in shards:
+            with open(_part_paths(job_dir, shard)[1]) as fp:
+                yield read_authorities(fp)
+
+    authorities = merge_authorities(parts())
+    with atomic_open(job_dir / AUTHORITIES_FILE) as fp:
+        write_authorities(authorities, fp)
+    return authorities, n_citations
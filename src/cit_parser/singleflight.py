@@ -0,0 +1,146 @@
+"""
+Coalescing of identical in-flight calls ("singleflight").
+
+Upstream retries and fan-out often submit the same document several times within seconds. With
+a `SingleFlight`, the first call for a key runs, and every call for the same key that arrives
+while it is still running waits for and shares its result (or exception) instead of starting the
+same computation again. Once the call completes the key is forgotten: this is not a cache, later
+calls run again.
+
+Synchronous and asynchronous callers share the same flights. The computation itself always runs on
+a thread (the leading caller's, or an executor thread for async callers), so awaiting it never
+blocks an event loop.
+"""
+
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from transformers import AutoModelForTokenClassification, PreTrainedTokenizerFast
+
+from . import metrics
+from .checkpoint import content_hash
+from .invoke import DEFAULT_BATCH_SIZE, invoke
+from .types import Citation
+
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time; concurrent callers with the same key share it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights: Dict[str, Future] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    def _join(self, key: str) -> Tuple[Future, bool]:
+        """
+        The flight for `key` and whether the caller leads it (and so must run it).
+        """
+        with self._lock:
+            self.calls += 1
+            future = self._flights.get(key)
+            if future is not None:
+                self.coalesced += 1
+                metrics.COALESCED_CALLS.inc()
+                return future, False
+            future = self._flights[key] = Future()
+            return future, True
+
+    def _run(
+        self, key: str, future: Future, fn: Callable[..., Any], args: Tuple[Any, ...]
+    ) -> None:
+        try:
+            result = fn(*args)
+        except BaseException as e:
+            self._land(key)
+            future.set_exception(e)
+        else:
+            self._land(key)
+            future.set_result(result)
+
+    def _land(self, key: str) -> None:
+        # Callers arriving from now on start a new flight.
+        with self._lock:
+            del self._flights[key]
+
+    def do(self, key: str, fn: Callable[..., Any], *args: Any) -> Any:
+        """
+        Returns `fn(*args)`, or the result of the identical call already in flight for `key`.
+        """
+        future, leader = self._join(key)
+        if leader:
+            self._run(key, future, fn, args)
+        return future.result()
+
+    async def do_async(
+        self,
+        key: str,
+        fn: Callable[..., Any],
+        *args: Any,
+        executor: Optional[Any] = None,
+    ) -> Any:
+        """
+        Like `do`, for async callers: a new flight runs `fn` in `executor` (the loop's default if
+        None). Cancelling the awaiting task does not cancel the flight other callers may share.
+        """
+        future, leader = self._join(key)
+        if leader:
+            try:
+                asyncio.get_running_loop().run_in_executor(
+                    executor, self._run, key, future, fn, args
+                )
+            except BaseException as e:
+                # E.g. a shut-down executor: the flight never started, so end it here.
+                self._land(key)
+                future.set_exception(e)
+        return await asyncio.shield(asyncio.wrap_future(future))
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._flights)
+
+
+_FLIGHT = SingleFlight()
+
+
+def _key(text: str, model: Optional[AutoModelForTokenClassification]) -> str:
+    # Different models give different results, so they never share a flight.
+    return f"{content_hash(text)}:{id(model) if model is not None else 'default'}"
+
+
+def invoke_coalesced(
+    text: str,
+    model: Optional[AutoModelForTokenClassification] = None,
+    tokenizer: Optional[PreTrainedTokenizerFast] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    flight: Optional[SingleFlight] = None,
+) -> List[Citation]:
+    """
+    `invoke()`, shared with any concurrent call for an identical `text` (by SHA-256) and model.
+    """
+    flight = flight or _FLIGHT
+    citations = flight.do(_key(text, model), invoke, text, model, tokenizer, batch_size)
+    # Citations are immutable, but every caller gets a list of its own.
+    return list(citations)
+
+
+async def ainvoke_coalesced(
+    text: str,
+    model: Optional[AutoModelForTokenClassification] = None,
+    tokenizer: Optional[PreTrainedTokenizerFast] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    flight: Optional[SingleFlight] = None,
+    executor: Optional[Any] = None,
+) -> List[Citation]:
+    """
+    Async `invoke_coalesced`: the model runs in `executor`, off the event loop.
+    """
+    flight = flight or _FLIGHT
+    citations = await flight.do_async(
+        _key(text, model), invoke, text, model, tokenizer, batch_size, executor=executor
+    )
+    return list(citations)
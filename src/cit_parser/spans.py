@@ -0,0 +1,175 @@
+"""
+An interval index over a document's citations, for "which citation is at offset N?" queries.
+
+Citations are kept sorted by span, next to a sorted list of the spans themselves. On top of the
+span ends sits a max segment tree: every node holds the largest end among the spans below it. A
+citation covering offset N starts at or before N and ends after it, so a query is a binary search
+for the spans starting at or before N plus a descent into only those subtrees whose largest end
+is past N. Point, range and nearest queries take logarithmic time plus the number of citations
+found, however long some citations are.
+
+Insertions, removals and shifts are a binary search plus a list insert or update; the tree is
+rebuilt, in linear time, by the next query.
+"""
+
+import bisect
+import math
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from .postprocess import shift_citation
+from .types import SPAN, Citation
+
+
+class SpanIndex:
+    """
+    The citations of one document, indexed by their `[start, end)` spans.
+    """
+
+    def __init__(self, citations: Iterable[Citation] = ()):
+        pairs = sorted(((c.span, c) for c in citations), key=lambda pair: pair[0])
+        self._spans: List[SPAN] = [span for span, _ in pairs]
+        self._citations: List[Citation] = [c for _, c in pairs]
+        self._tree: Optional[List[float]] = None
+
+    def __len__(self) -> int:
+        return len(self._spans)
+
+    def __iter__(self) -> Iterator[Citation]:
+        return iter(self._citations)
+
+    def _ends(self) -> List[float]:
+        """
+        The max segment tree over the span ends: leaf `size + i` is the end of span `i`, node `n`
+        the larger of nodes `2n` and `2n + 1`. Built on first use after a change.
+        """
+        if self._tree is None:
+            size = 1
+            while size < len(self._spans):
+                size *= 2
+            tree = [-math.inf] * (2 * size)
+            tree[size : size + len(self._spans)] = [end for _, end in self._spans]
+            for node in range(size - 1, 0, -1):
+                tree[node] = max(tree[2 * node], tree[2 * node + 1])
+            self._tree = tree
+        return self._tree
+
+    def _ending_after(self, offset: float, hi: int) -> Iterator[int]:
+        """
+        In order, the positions below `hi` of the spans that end after `offset`.
+        """
+        tree = self._ends()
+        size = len(tree) // 2
+        stack = [(1, 0, size)]
+        while stack:
+            node, lo, end = stack.pop()
+            if lo >= hi or tree[node] <= offset:
+                continue
+            if node >= size:
+                yield lo
+                continue
+            mid = (lo + end) // 2
+            stack.append((2 * node + 1, mid, end))
+            stack.append((2 * node, lo, mid))
+
+    def _max_end(self, hi: int) -> float:
+        """
+        The largest end among the spans at positions below `hi`.
+        """
+        tree = self._ends()
+        size = len(tree) // 2
+        res, lo, hi = -math.inf, size, size + hi
+        while lo < hi:
+            if lo & 1:
+                res = max(res, tree[lo])
+                lo += 1
+            if hi & 1:
+                hi -= 1
+                res = max(res, tree[hi])
+            lo, hi = lo // 2, hi // 2
+        return res
+
+    def at(self, offset: int) -> List[Citation]:
+        """
+        The citations covering character `offset`, by span.
+        """
+        return self.overlapping(offset, offset + 1)
+
+    def overlapping(self, start: int, end: int) -> List[Citation]:
+        """
+        The citations overlapping the selection `[start, end)`, by span.
+        """
+        hi = bisect.bisect_left(self._spans, (end, -math.inf))
+        return [self._citations[i] for i in self._ending_after(start, hi)]
+
+    def within(self, start: int, end: int) -> List[Citation]:
+        """
+        The citations entirely inside `[start, end)`, by span.
+        """
+        lo = bisect.bisect_left(self._spans, (start, -math.inf))
+        hi = bisect.bisect_left(self._spans, (end, -math.inf))
+        return [self._citations[i] for i in range(lo, hi) if self._spans[i][1] <= end]
+
+    def nearest(self, offset: int) -> Optional[Citation]:
+        """
+        The citation closest to `offset`: one covering it if any, otherwise the one whose nearest
+        edge is closest (the earlier one on ties). None if the index is empty.
+        """
+        if not self._spans:
+            return None
+        # Of the citations starting at or before `offset`, the closest is the first one that ends
+        # after it, or else the one that ends last.
+        after = bisect.bisect_right(self._spans, (offset, math.inf))
+        best, best_distance = None, math.inf
+        if after > 0:
+            last_end = min(self._max_end(after), offset + 1)
+            best = next(self._ending_after(last_end - 1, after))
+            best_distance = offset + 1 - last_end
+        if after < len(self._spans) and self._spans[after][0] - offset < best_distance:
+            best = after
+        return self._citations[best]  # pyright: ignore
+
+    def add(self, citation: Citation) -> None:
+        i = bisect.bisect_right(self._spans, citation.span)
+        self._spans.insert(i, citation.span)
+        self._citations.insert(i, citation)
+        self._tree = None
+
+    def remove(self, citation: Citation) -> None:
+        """
+        Removes `citation`, matched by span and equality. Raises KeyError if it is not indexed.
+        """
+        lo = bisect.bisect_left(self._spans, citation.span)
+        hi = bisect.bisect_right(self._spans, citation.span)
+        for i in range(lo, hi):
+            if self._citations[i] is citation or self._citations[i] == citation:
+                del self._spans[i], self._citations[i]
+                self._tree = None
+                return
+        raise KeyError(f"Citation at {citation.span} is not in the index.")
+
+    def replace(self, old: Citation, new: Citation) -> None:
+        """
+        Swaps `old` for `new`, e.g. after the text of a citation was edited and re-parsed.
+        """
+        self.remove(old)
+        self.add(new)
+
+    def shift(self, offset: int, delta: int) -> None:
+        """
+        Follows an edit that inserted (`delta` > 0) or deleted (`delta` < 0) characters at
+        `offset`: citations starting at or after `offset` move by `delta`, and citations starting
+        inside a deleted range are removed with it. Citations the edit falls inside of are left
+        alone; `replace` them once re-parsed.
+        """
+        i = bisect.bisect_left(self._spans, (offset, -math.inf))
+        if delta < 0:
+            j = bisect.bisect_left(self._spans, (offset - delta, -math.inf))
+            del self._spans[i:j], self._citations[i:j]
+        for j in range(i, len(self._spans)):
+            start, end = self._spans[j]
+            self._spans[j] = (start + delta, end + delta)
+            self._citations[j] = shift_citation(self._citations[j], delta)
+        self._tree = None
+
+    def spans(self) -> List[Tuple[int, int]]:
+        return list(self._spans)
@@ -0,0 +1,267 @@
+"""
+Count-only aggregation of authorities over a corpus.
+
+`Authorities` keeps every citation object of every authority, which is what one document needs but
+far more than a corpus-wide table of authorities does: a few million citations are a few million
+Pydantic objects. An `AuthoritySummary` instead keeps one row per distinct authority (a
+representative citation, the number of citations and of citing documents, and the first and last
+position cited) in flat integer arrays, so its size grows with the number of distinct authorities,
+not with the number of citations.
+
+With `keep_spans=True` it also keeps every citation's `(document, start, end)` in one compact
+int64 array per authority: 24 bytes per citation instead of a full object.
+"""
+
+import json
+import os
+from array import array
+from typing import Dict, Iterable, Iterator, List, Tuple, Union
+
+import numpy as np
+
+from .checkpoint import atomic_open
+from .serialize import authority_key, citation_from_dict, citation_to_dict
+from .types import Authorities, Citation
+
+PathLike = Union[str, os.PathLike]
+
+# A position in the corpus: (document index, character offset).
+Position = Tuple[int, int]
+
+
+def _copy(values: array) -> np.ndarray:
+    # A view would pin the array's buffer, and the array could no longer grow.
+    return np.frombuffer(values, dtype=np.int64).copy()
+
+
+class AuthorityStats:
+    """
+    The summary of one authority. `first` and `last` are (document index, start offset) pairs;
+    `AuthoritySummary.doc_id` maps a document index back to its id.
+    """
+
+    def __init__(
+        self,
+        key: str,
+        authority: Citation,
+        count: int,
+        documents: int,
+        first: Position,
+        last: Position,
+    ):
+        self.key = key
+        self.authority = authority
+        self.count = count
+        self.documents = documents
+        self.first = first
+        self.last = last
+
+    def __repr__(self) -> str:
+        return (
+            f"AuthorityStats(key={self.key!r}, count={self.count}, "
+            f"documents={self.documents}, first={self.first}, last={self.last})"
+        )
+
+
+class AuthoritySummary:
+    """
+    Per-authority counters over any number of documents, added in order with `add`.
+    """
+
+    def __init__(self, keep_spans: bool = False):
+        self.keep_spans = keep_spans
+        self._ids: Dict[str, int] = {}
+        self._authorities: List[Citation] = []
+        self._counts = array("q")
+        self._documents = array("q")
+        self._first_doc = array("q")
+        self._first_start = array("q")
+        self._last_doc = array("q")
+        self._last_start = array("q")
+        self._spans: List[array] = []
+        self._doc_ids: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self._authorities)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._ids
+
+    @property
+    def n_documents(self) -> int:
+        return len(self._doc_ids)
+
+    @property
+    def n_citations(self) -> int:
+        return sum(self._counts)
+
+    def doc_id(self, index: int) -> str:
+        return self._doc_ids[index]
+
+    def _intern(self, authority: Citation) -> int:
+        key = authority_key(authority)
+        i = self._ids.get(key)
+        if i is None:
+            i = self._ids[key] = len(self._authorities)
+            self._authorities.append(authority)
+            for counters in (self._counts, self._documents):
+                counters.append(0)
+            for positions in (
+                self._first_doc,
+                self._first_start,
+                self._last_doc,
+                self._last_start,
+            ):
+                positions.append(-1)
+            if self.keep_spans:
+                self._spans.append(array("q"))
+        return i
+
+    def add(self, doc_id: str, authorities: Authorities) -> None:
+        """
+        Counts the authorities of one document. The `Authorities` can be dropped afterwards.
+        """
+        doc = len(self._doc_ids)
+        self._doc_ids.append(doc_id)
+        # Within a document, two authorities can share a key (e.g. a statute cited with and
+        # without its code), so the document frequency is counted once per key.
+        seen = set()
+        for authority, citations in list(authorities.caselaw.items()) + list(
+            authorities.statutes.items()
+        ):
+            if not citations:
+                continue
+            i = self._intern(authority)
+            starts = [c.start for c in citations]
+            self._counts[i] += len(citations)
+            if i not in seen:
+                seen.add(i)
+                self._documents[i] += 1
+            if self._first_doc[i] < 0 or (
+                self._first_doc[i] == doc and min(starts) < self._first_start[i]
+            ):
+                self._first_doc[i], self._first_start[i] = doc, min(starts)
+            if self._last_doc[i] < doc or max(starts) > self._last_start[i]:
+                self._last_doc[i], self._last_start[i] = doc, max(starts)
+            if self.keep_spans:
+                spans = self._spans[i]
+                for c in citations:
+                    spans.extend((doc, c.start, c.end))
+
+    def add_citations(self, doc_id: str, citations: List[Citation]) -> None:
+        """
+        Groups one document's citations with `Authorities.construct` and counts them.
+        """
+        self.add(doc_id, Authorities.construct(citations))
+
+    def _stats(self, i: int) -> AuthorityStats:
+        return AuthorityStats(
+            key=authority_key(self._authorities[i]),
+            authority=self._authorities[i],
+            count=self._counts[i],
+            documents=self._documents[i],
+            first=(self._first_doc[i], self._first_start[i]),
+            last=(self._last_doc[i], self._last_start[i]),
+        )
+
+    def __getitem__(self, key: str) -> AuthorityStats:
+        return self._stats(self._ids[key])
+
+    def __iter__(self) -> Iterator[AuthorityStats]:
+        for i in range(len(self)):
+            yield self._stats(i)
+
+    def spans(self, key: str) -> np.ndarray:
+        """
+        Every citation of the authority `key` as rows of (document index, start, end).
+        """
+        if not self.keep_spans:
+            raise ValueError("This summary was built without keep_spans=True.")
+        return _copy(self._spans[self._ids[key]]).reshape(-1, 3)
+
+    def counts(self) -> np.ndarray:
+        return _copy(self._counts)
+
+    def document_frequencies(self) -> np.ndarray:
+        return _copy(self._documents)
+
+    def top(self, k: int = 10, by: str = "count") -> List[AuthorityStats]:
+        """
+        The `k` authorities with the most citations, or with `by="documents"` the most citing
+        documents.
+        """
+        if by not in ("count", "documents"):
+            raise ValueError(f"Cannot rank by '{by}', expected 'count' or 'documents'.")
+        values = self.counts() if by == "count" else self.document_frequencies()
+        return [self._stats(int(i)) for i in np.argsort(-values, kind="stable")[:k]]
+
+    def merge(self, other: "AuthoritySummary") -> None:
+        """
+        Appends the documents of `other` (e.g. another shard's summary) after this one's.
+        """
+        if self.keep_spans and not other.keep_spans:
+            raise ValueError(
+                "Cannot merge a summary without spans into one with spans."
+            )
+        offset = len(self._doc_ids)
+        self._doc_ids.extend(other._doc_ids)
+        for j, authority in enumerate(other._authorities):
+            if not other._counts[j]:
+                continue
+            i = self._intern(authority)
+            self._counts[i] += other._counts[j]
+            self._documents[i] += other._documents[j]
+            if self._first_doc[i] < 0:
+                self._first_doc[i] = other._first_doc[j] + offset
+                self._first_start[i] = other._first_start[j]
+            self._last_doc[i] = other._last_doc[j] + offset
+            self._last_start[i] = other._last_start[j]
+            if self.keep_spans:
+                spans = _copy(other._spans[j]).reshape(-1, 3)
+                spans[:, 0] += offset
+                self._spans[i].frombytes(spans.tobytes())
+
+    def save(self, path: PathLike) -> None:
+        """
+        Writes one JSON line per authority, after a header line with the document ids. Spans are
+        not saved.
+        """
+        with atomic_open(path) as fp:
+            fp.write(json.dumps({"documents": self._doc_ids}) + "\n")
+            for stats in self:
+                record = {
+                    "id": stats.key,
+                    "authority": citation_to_dict(stats.authority),
+                    "count": stats.count,
+                    "documents": stats.documents,
+                    "first": list(stats.first),
+                    "last": list(stats.last),
+                }
+                fp.write(json.dumps(record) + "\n")
+
+    @classmethod
+    def load(cls, path: PathLike) -> "AuthoritySummary":
+        summary = cls()
+        with open(path) as fp:
+            summary._doc_ids = json.loads(next(fp))["documents"]
+            for line in fp:
+                record = json.loads(line)
+                i = summary._intern(citation_from_dict(record["authority"]))
+                summary._counts[i] = record["count"]
+                summary._documents[i] = record["documents"]
+                summary._first_doc[i], summary._first_start[i] = record["first"]
+                summary._last_doc[i], summary._last_start[i] = record["last"]
+        return summary
+
+
+def summarize(
+    documents: Iterable[Tuple[str, List[Citation]]], keep_spans: bool = False
+) -> AuthoritySummary:
+    """
+    Summarizes `(doc_id, citations)` pairs, e.g. the output of `extract_documents` mapped to ids,
+    holding only one document's citations at a time.
+    """
+    summary = AuthoritySummary(keep_spans)
+    for doc_id, citations in documents:
+        summary.add_citations(doc_id, citations)
+    return summary
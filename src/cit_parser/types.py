@@ -4,20 +4,28 @@ from enum import Enum
 from itertools import chain
 from typing import (
     Annotated,
+    Any,
     Dict,
     List,
     Literal,
     Optional,
+    Protocol,
+    Sequence,
     Tuple,
     TypeAlias,
     Union,
 )
 
-from pydantic import BaseModel, ConfigDict, Field
+from pydantic import BaseModel, ConfigDict, Field, model_validator
+
+from .normalize import code_key, normalize_code, normalize_reporter, reporter_key
 
 PIN_CITE: TypeAlias = Tuple[int, Optional[int]]
 SPAN: TypeAlias = Tuple[int, int]
 
+# Reporters only the Supreme Court publishes in.
+SCOTUS_REPORTERS = {"U.S.", "S. Ct."}
+
 
 class _Base_(BaseModel):
     model_config = ConfigDict(
@@ -51,6 +59,81 @@ class LabelPrediction(_Base_):
         return f"{self.token}: {self.label}"
 
 
+class _TokenLabel(Protocol):
+    """
+    A labeled token or entity with its span: a `LabelPrediction` or a `records.Label`.
+    """
+
+    @property
+    def token(self) -> str: ...
+    @property
+    def label(self) -> str: ...
+    @property
+    def start(self) -> int: ...
+    @property
+    def end(self) -> int: ...
+
+
+def _caselaw_fields(
+    token_label_pairs: Sequence[_TokenLabel],
+) -> Optional[Dict[str, Any]]:
+    """
+    The fields of the case citation spelled out by aggregated entities, or None without a case
+    name. Shared by `CaselawCitation.from_token_label_pairs` and `records.CaselawRecord`.
+    """
+    case_name = ""
+    reporter = ""
+    volume = None
+    starting_page = None
+    raw_pin_cite = None
+    court = None
+    year = None
+    start = 0
+    end = 0
+
+    for i, pair in enumerate(token_label_pairs):
+        token = pair.token
+        label = pair.label
+
+        if i == 0:
+            start = pair.start
+        if i == len(token_label_pairs) - 1:
+            end = pair.end
+
+        if label == "CASE_NAME":
+            case_name += token + " "
+        elif label == "VOLUME" and token.isdigit():
+            volume = int(token)
+        elif label == "REPORTER":
+            reporter += token + " "
+        elif label == "PAGE" and token.isdigit():
+            starting_page = int(token)
+        elif label == "PIN":
+            raw_pin_cite = token
+        elif label == "COURT":
+            court = token
+        elif label == "YEAR" and token.isdigit():
+            year = int(token)
+
+    case_name = case_name.strip()
+    reporter = reporter.strip()
+
+    if not case_name:
+        return None
+
+    return dict(
+        case_name=case_name,
+        volume=volume,
+        reporter=reporter or None,
+        starting_page=starting_page,
+        raw_pin_cite=raw_pin_cite,
+        raw_court=court,
+        year=year,
+        start=start,
+        end=end,
+    )
+
+
 class CaselawCitation(_Base_):
     citation_type: Literal[CitationType.OPINION] = CitationType.OPINION
 
@@ -65,6 +148,19 @@ class CaselawCitation(_Base_):
     start: int
     end: int
 
+    # Bluebook form of `reporter`, filled in at construction; None for unknown reporters.
+    canonical_reporter: Optional[str] = None
+
+    @model_validator(mode="before")
+    @classmethod
+    def _canonicalize(cls, data: Any) -> Any:
+        if isinstance(data, dict) and data.get("canonical_reporter") is None:
+            data = {
+                **data,
+                "canonical_reporter": normalize_reporter(data.get("reporter")),
+            }
+        return data
+
     @property
     def span(self) -> SPAN:
         return self.start, self.end
@@ -72,21 +168,19 @@ class CaselawCitation(_Base_):
     @property
     def formatted_court(self) -> Optional[str]:
         # handle SCOTUS speshul
-        if self.reporter in {"U.S.", "S. Ct."}:
+        if self.canonical_reporter in SCOTUS_REPORTERS:
             return "SCOTUS"
         return self.raw_court
 
     @property
     def is_full(self) -> bool:
-        return all(
-            [
-                self.case_name,
-                self.volume,
-                self.reporter,
-                self.starting_page,
-                self.formatted_court,
-                self.year,
-            ]
+        return bool(
+            self.case_name
+            and self.volume
+            and self.reporter
+            and self.starting_page
+            and self.formatted_court
+            and self.year
         )
 
     @property
@@ -122,60 +216,11 @@ class CaselawCitation(_Base_):
     def from_token_label_pairs(
         cls, token_label_pairs: List[LabelPrediction]
     ) -> Optional[CaselawCitation]:
-        case_name = ""
-        reporter = ""
-        volume = None
-        starting_page = None
-        raw_pin_cite = None
-        court = None
-        year = None
-        start = 0
-        end = 0
-
-        for i, pair in enumerate(token_label_pairs):
-            token = pair.token
-            label = pair.label
-
-            if i == 0:
-                start = pair.start
-            if i == len(token_label_pairs) - 1:
-                end = pair.end
-
-            if label == "CASE_NAME":
-                case_name += token + " "
-            elif label == "VOLUME" and token.isdigit():
-                volume = int(token)
-            elif label == "REPORTER":
-                reporter += token + " "
-            elif label == "PAGE" and token.isdigit():
-                starting_page = int(token)
-            elif label == "PIN":
-                raw_pin_cite = token
-            elif label == "COURT":
-                court = token
-            elif label == "YEAR" and token.isdigit():
-                year = int(token)
-
-        case_name = case_name.strip()
-        reporter = reporter.strip()
-
-        if not case_name:
-            return None
-
-        return cls(
-            case_name=case_name,
-            volume=volume,
-            reporter=reporter or None,
-            starting_page=starting_page,
-            raw_pin_cite=raw_pin_cite,
-            raw_court=court,
-            year=year,
-            start=start,
-            end=end,
-        )
+        fields = _caselaw_fields(token_label_pairs)
+        return None if fields is None else cls(**fields)
 
     def __hash__(self) -> int:
-        return hash((self.volume, self.reporter, self.starting_page))
+        return hash((self.volume, reporter_key(self.reporter), self.starting_page))
 
     def __eq__(self, other: object) -> bool:
         if not isinstance(other, CaselawCitation):
@@ -183,13 +228,67 @@ class CaselawCitation(_Base_):
 
         return (
             self.volume == other.volume
-            and self.reporter == other.reporter
+            and reporter_key(self.reporter) == reporter_key(other.reporter)
             and self.starting_page == other.starting_page
             and self.raw_court == other.raw_court
             and self.year == other.year
         )
 
 
+def _statute_fields(
+    token_label_pairs: Sequence[_TokenLabel],
+) -> Optional[Dict[str, Any]]:
+    """
+    The fields of the statute citation spelled out by aggregated entities, or None without a
+    section. Shared by `StatuteCitation.from_token_label_pairs` and `records.StatuteRecord`.
+    """
+    title = ""
+    code = ""
+    section = ""
+    year = None
+    start = 0
+    end = 0
+
+    for i, pair in enumerate(token_label_pairs):
+        token = pair.token
+        label = pair.label
+
+        # Set start and end positions based on the first and last token positions
+        if i == 0:
+            start = pair.start
+        if i == len(token_label_pairs) - 1:
+            end = pair.end
+
+        if label == "TITLE":
+            title += token + " "
+        elif label == "CODE":
+            # Combine parts for the code field
+            if token == ".":
+                code = code.rstrip() + "."
+            else:
+                code += token + " "
+        elif label == "SECTION":
+            section += token + " "
+        elif label == "YEAR" and token.isdigit():
+            year = int(token)
+
+    title = title.strip() or None
+    code = code.strip() or None
+    section = section.strip()
+
+    if not section:
+        return None
+
+    return dict(
+        title=title,
+        code=code,
+        section=section,
+        year=year,
+        start=start,
+        end=end,
+    )
+
+
 class StatuteCitation(_Base_):
     citation_type: Literal[CitationType.STATUTE] = CitationType.STATUTE
 
@@ -201,6 +300,16 @@ class StatuteCitation(_Base_):
     start: int
     end: int
 
+    # Canonical abbreviation of `code`, filled in at construction; None for unknown codes.
+    canonical_code: Optional[str] = None
+
+    @model_validator(mode="before")
+    @classmethod
+    def _canonicalize(cls, data: Any) -> Any:
+        if isinstance(data, dict) and data.get("canonical_code") is None:
+            data = {**data, "canonical_code": normalize_code(data.get("code"))}
+        return data
+
     @property
     def span(self) -> SPAN:
         return self.start, self.end
@@ -239,7 +348,7 @@ class StatuteCitation(_Base_):
         return self.full_text
 
     def __hash__(self) -> int:
-        return hash((self.code, self.section))
+        return hash((code_key(self.code), self.section))
 
     def __eq__(self, other: object) -> bool:
         if not isinstance(other, StatuteCitation):
@@ -247,7 +356,7 @@ class StatuteCitation(_Base_):
 
         return (
             self.title == other.title
-            and self.code == other.code
+            and code_key(self.code) == code_key(other.code)
             and self.section == other.section
             and self.year == other.year
         )
@@ -256,51 +365,8 @@ class StatuteCitation(_Base_):
     def from_token_label_pairs(
         cls, token_label_pairs: List[LabelPrediction]
     ) -> Optional[StatuteCitation]:
-        title = ""
-        code = ""
-        section = ""
-        year = None
-        start = 0
-        end = 0
-
-        for i, pair in enumerate(token_label_pairs):
-            token = pair.token
-            label = pair.label
-
-            # Set start and end positions based on the first and last token positions
-            if i == 0:
-                start = pair.start
-            if i == len(token_label_pairs) - 1:
-                end = pair.end
-
-            if label == "TITLE":
-                title += token + " "
-            elif label == "CODE":
-                # Combine parts for the code field
-                if token == ".":
-                    code = code.rstrip() + "."
-                else:
-                    code += token + " "
-            elif label == "SECTION":
-                section += token + " "
-            elif label == "YEAR" and token.isdigit():
-                year = int(token)
-
-        title = title.strip() or None
-        code = code.strip() or None
-        section = section.strip()
-
-        if not section:
-            return None
-
-        return cls(
-            title=title,
-            code=code,
-            section=section,
-            year=year,
-            start=start,
-            end=end,
-        )
+        fields = _statute_fields(token_label_pairs)
+        return None if fields is None else cls(**fields)
 
 
 Citation: TypeAlias = Annotated[
@@ -326,53 +392,62 @@ class Authorities(BaseModel):
         statutes: Dict[StatuteCitation, List[StatuteCitation]] = {}
 
         # Separate full and short citations
-        full_citations = [c for c in citations if c.is_full]
-        short_citations = [c for c in citations if not c.is_full]
+        full_citations: List[Citation] = []
+        short_citations: List[Citation] = []
+        for c in citations:
+            (full_citations if c.is_full else short_citations).append(c)
+
+        # Hash indexes for the joins below; keys are canonical (see `normalize`), so variant
+        # spellings of the same reporter land on the same authority.
+        caselaw_by_volume: Dict[
+            Tuple[Optional[int], Optional[str]], CaselawCitation
+        ] = {}
+        statutes_by_section: Dict[str, StatuteCitation] = {}
 
         # Add full citations directly
         for full_citation in full_citations:
             if full_citation.citation_type == CitationType.OPINION:
                 caselaw.setdefault(full_citation, []).append(full_citation)
+                caselaw_by_volume.setdefault(
+                    (full_citation.volume, reporter_key(full_citation.reporter)),
+                    full_citation,
+                )
             elif full_citation.citation_type == CitationType.STATUTE:
                 # Add or replace the existing statute with a fuller one
-                existing_citation = next(
-                    (k for k in statutes if k.section == full_citation.section), None
-                )
+                existing_citation = statutes_by_section.get(full_citation.section)
                 if existing_citation:
                     if full_citation.is_fuller_than(existing_citation):
                         # Replace the key if the new one is "fuller"
                         citations_list = statutes.pop(existing_citation)
                         statutes[full_citation] = citations_list + [full_citation]
+                        statutes_by_section[full_citation.section] = full_citation
                     else:
                         # Add to the existing citation list
                         statutes[existing_citation].append(full_citation)
                 else:
                     statutes[full_citation] = [full_citation]
+                    statutes_by_section[full_citation.section] = full_citation
 
         # Map short citations to the appropriate full citation.
         for short_citation in short_citations:
             if short_citation.citation_type == CitationType.OPINION:
-                for full_citation in caselaw:
-                    if (
-                        full_citation.volume == short_citation.volume
-                        and full_citation.reporter == short_citation.reporter
-                    ):
-                        caselaw[full_citation].append(short_citation)
-                        break
+                full_case = caselaw_by_volume.get(
+                    (short_citation.volume, reporter_key(short_citation.reporter))
+                )
+                if full_case is not None:
+                    caselaw[full_case].append(short_citation)
             elif short_citation.citation_type == CitationType.STATUTE:
                 # Try to find a matching full citation by section.
-                matched = False
-                for full_citation in statutes:
-                    if full_citation.section == short_citation.section:
-                        statutes[full_citation].append(short_citation)
-                        matched = True
-                        break
-
-                # If no full citation is found, add it as its own key.
-                if not matched:
-                    statutes.setdefault(short_citation, []).append(short_citation)
-
-        return cls(caselaw=caselaw, statutes=statutes)
+                full_statute = statutes_by_section.get(short_citation.section)
+                if full_statute is not None:
+                    statutes[full_statute].append(short_citation)
+                else:
+                    # If no full citation is found, add it as its own key.
+                    statutes[short_citation] = [short_citation]
+                    statutes_by_section[short_citation.section] = short_citation
+
+        # Every key and member is already a validated citation.
+        return cls.model_construct(caselaw=caselaw, statutes=statutes)
 
     def __str__(self) -> str:
         return f"Statutes: {self.statutes}\nCaselaw: {self.caselaw}"
@@ -0,0 +1,408 @@
+"""
+Continuous ingestion: a daemon that watches directories and extracts citations from new files.
+
+Relaunching `cit-parser extract` from cron pays for importing torch and loading the model and
+spaCy on every run. A `WatchDaemon` keeps them loaded in one long-running process. Directories are
+watched recursively through inotify on Linux (called through libc, no extra dependency), and
+polled where inotify is unavailable, e.g. on other platforms or some network filesystems. Files
+that arrive close together go through the model pool as one batch. Each file's citations are
+written atomically to `<file name>.citations.jsonl`, next to it or mirrored under an output
+directory, so readers never see partial output.
+
+A file whose output is newer than the file itself is skipped, so a restarted daemon only processes
+what arrived or changed while it was down.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import threading
+import time
+from fnmatch import fnmatch
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+from pydantic import BaseModel
+from transformers import AutoModelForTokenClassification, PreTrainedTokenizerFast
+from wasabi import msg
+
+from .checkpoint import atomic_open
+from .corpus import BACKENDS, DEFAULT_PATTERN, Backend, Document
+from .invoke import DEFAULT_BATCH_SIZE
+from .pool import ModelPool
+from .serialize import write_citations
+from .types import Citation
+
+PathLike = Union[str, os.PathLike]
+
+OUTPUT_SUFFIX = ".citations.jsonl"
+DEFAULT_POLL_INTERVAL = 2.0
+DEFAULT_BATCH_WINDOW = 1.0
+DEFAULT_MAX_BATCH = 32
+
+# From <sys/inotify.h>.
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+_EVENT = struct.Struct("iIII")  # wd, mask, cookie, len; followed by `len` bytes of name
+
+
+def _is_input(path: Path, pattern: str) -> bool:
+    # Hidden files include the temporary files of atomic writes, ours or other writers'.
+    return (
+        fnmatch(path.name, pattern)
+        and not path.name.startswith(".")
+        and not path.name.endswith(OUTPUT_SUFFIX)
+    )
+
+
+def _scan(directory: Path, pattern: str) -> List[Path]:
+    return [
+        p
+        for p in sorted(directory.rglob(pattern))
+        if p.is_file() and _is_input(p, pattern)
+    ]
+
+
+class InotifyWatcher:
+    """
+    Reports files matching `pattern` under `directories` once they have been closed after writing
+    or moved in. Files already present are reported by the first call to `changes`.
+    """
+
+    def __init__(self, directories: Iterable[PathLike], pattern: str = DEFAULT_PATTERN):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            raise OSError("inotify is not available on this platform.")
+        self._libc = libc
+        self._fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed.")
+        self.directories = [Path(d) for d in directories]
+        self.pattern = pattern
+        self._watches: Dict[int, Path] = {}
+        self._ready: List[Path] = []
+        for directory in self.directories:
+            self._ready.extend(self._watch_tree(directory))
+
+    def _watch_tree(self, directory: Path) -> List[Path]:
+        """
+        Watches `directory` and its subdirectories, and returns the files already in them. The
+        watches come first, so that no file written in between is missed.
+        """
+        for d in [directory] + sorted(p for p in directory.rglob("*") if p.is_dir()):
+            wd = self._libc.inotify_add_watch(
+                self._fd, os.fsencode(d), IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+            )
+            if wd < 0:
+                errno = ctypes.get_errno()
+                raise OSError(errno, f"Cannot watch '{d}': {os.strerror(errno)}")
+            self._watches[wd] = d
+        return _scan(directory, self.pattern)
+
+    def changes(self, timeout: float) -> List[Path]:
+        """
+        Files that became ready, waiting up to `timeout` seconds for the first.
+        """
+        if self._ready:
+            queued, self._ready = self._ready, []
+            return queued
+        if not select.select([self._fd], [], [], timeout)[0]:
+            return []
+
+        ready: Dict[Path, None] = {}
+        while True:
+            try:
+                data = os.read(self._fd, 65536)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = _EVENT.unpack_from(data, offset)
+                name = data[offset + _EVENT.size : offset + _EVENT.size + length]
+                offset += _EVENT.size + length
+                if mask & IN_Q_OVERFLOW:
+                    # Events were dropped: fall back to a full scan.
+                    for directory in self.directories:
+                        ready.update(dict.fromkeys(self._watch_tree(directory)))
+                    continue
+                directory = self._watches.get(wd)
+                if directory is None:
+                    continue
+                path = directory / os.fsdecode(name.rstrip(b"\0"))
+                if mask & IN_ISDIR:
+                    if mask & (IN_CREATE | IN_MOVED_TO):
+                        ready.update(dict.fromkeys(self._watch_tree(path)))
+                elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO) and _is_input(
+                    path, self.pattern
+                ):
+                    ready[path] = None
+        return list(ready)
+
+    def close(self) -> None:
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+    def __enter__(self) -> "InotifyWatcher":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class PollingWatcher:
+    """
+    Like `InotifyWatcher`, by rescanning `directories` every `interval` seconds. A file is reported
+    once its size and modification time are the same in two consecutive scans.
+    """
+
+    def __init__(
+        self,
+        directories: Iterable[PathLike],
+        pattern: str = DEFAULT_PATTERN,
+        interval: float = DEFAULT_POLL_INTERVAL,
+    ):
+        self.directories = [Path(d) for d in directories]
+        self.pattern = pattern
+        self.interval = interval
+        self._next_scan = 0.0
+        self._previous: Dict[Path, Tuple[int, int]] = {}
+        self._reported: Dict[Path, Tuple[int, int]] = {}
+
+    def _signatures(self) -> Dict[Path, Tuple[int, int]]:
+        res = {}
+        for directory in self.directories:
+            for path in _scan(directory, self.pattern):
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                res[path] = (stat.st_size, stat.st_mtime_ns)
+        return res
+
+    def changes(self, timeout: float) -> List[Path]:
+        wait = self._next_scan - time.monotonic()
+        if wait > timeout:
+            time.sleep(timeout)
+            return []
+        if wait > 0:
+            time.sleep(wait)
+        self._next_scan = time.monotonic() + self.interval
+
+        current = self._signatures()
+        ready = [
+            path
+            for path, signature in current.items()
+            if self._previous.get(path) == signature
+            and self._reported.get(path) != signature
+        ]
+        self._reported = {p: s for p, s in self._reported.items() if p in current}
+        self._reported.update((path, current[path]) for path in ready)
+        self._previous = current
+        return ready
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self) -> "PollingWatcher":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+Watcher = Union[InotifyWatcher, PollingWatcher]
+
+
+def open_watcher(
+    directories: Iterable[PathLike],
+    pattern: str = DEFAULT_PATTERN,
+    poll_interval: Optional[float] = None,
+) -> Watcher:
+    """
+    An inotify watcher, or a polling one if inotify is unavailable or `poll_interval` is given.
+    """
+    directories = list(directories)
+    if poll_interval is None:
+        try:
+            return InotifyWatcher(directories, pattern)
+        except OSError as e:
+            msg.warn(f"{e} Polling every {DEFAULT_POLL_INTERVAL:.0f}s instead.")
+            poll_interval = DEFAULT_POLL_INTERVAL
+    return PollingWatcher(directories, pattern, poll_interval)
+
+
+class WatchReport(BaseModel):
+    documents: int = 0
+    citations: int = 0
+    failed: int = 0
+    batches: int = 0
+
+    def __str__(self) -> str:
+        return (
+            f"{self.documents} document(s) in {self.batches} batch(es), "
+            f"{self.citations} citation(s), {self.failed} failed."
+        )
+
+
+class WatchDaemon:
+    """
+    Watches `directories` for files matching `pattern` and writes each one's citations (JSONL,
+    with a `doc_id` relative to its watched directory) next to it, or to the same relative path
+    under `output_dir`. With several directories, which must then have distinct names, the
+    `doc_id` starts with the directory's name, and so does the path under `output_dir`.
+
+    New files are collected for up to `batch_window` seconds after the first one arrives, or until
+    there are `max_batch` of them, and then run through a pool of `workers` replicas together.
+    `backend_fn` replaces the backend's function, as in `extract_documents`.
+    """
+
+    def __init__(
+        self,
+        directories: Iterable[PathLike],
+        output_dir: Optional[PathLike] = None,
+        pattern: str = DEFAULT_PATTERN,
+        backend: str = "sentence",
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        workers: int = 1,
+        model: Optional[AutoModelForTokenClassification] = None,
+        tokenizer: Optional[PreTrainedTokenizerFast] = None,
+        batch_window: float = DEFAULT_BATCH_WINDOW,
+        max_batch: int = DEFAULT_MAX_BATCH,
+        poll_interval: Optional[float] = None,
+        on_document: Optional[Callable[[Document, List[Citation]], None]] = None,
+        backend_fn: Optional[Backend] = None,
+    ):
+        if backend not in BACKENDS:
+            raise ValueError(
+                f"Unknown backend '{backend}', expected one of {sorted(BACKENDS)}."
+            )
+        self.directories = [Path(d).resolve() for d in directories]
+        for directory in self.directories:
+            if not directory.is_dir():
+                raise FileNotFoundError(f"'{directory}' is not a directory.")
+        names = [d.name for d in self.directories]
+        if len(names) > 1 and len(set(names)) < len(names):
+            raise ValueError(
+                "Watched directories must have distinct names, as each one's files are "
+                f"identified by its name: {', '.join(map(str, self.directories))}."
+            )
+        self.output_dir = Path(output_dir).resolve() if output_dir is not None else None
+        self.pattern = pattern
+        self.backend = backend
+        self.batch_size = batch_size
+        self.workers = workers
+        self.model = model
+        self.tokenizer = tokenizer
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.poll_interval = poll_interval
+        self.on_document = on_document
+        self.backend_fn = backend_fn
+        self.report = WatchReport()
+
+    def _document_id(self, path: Path) -> Tuple[Path, str]:
+        root = next(d for d in self.directories if path.is_relative_to(d))
+        relative = path.relative_to(root)
+        # With several directories, a relative path alone may name a file in each of them.
+        return root, str(
+            relative if len(self.directories) == 1 else root.name / relative
+        )
+
+    def output_path(self, path: Path) -> Path:
+        root, doc_id = self._document_id(path)
+        base = self.output_dir / doc_id if self.output_dir is not None else path
+        return base.with_name(base.name + OUTPUT_SUFFIX)
+
+    def _is_done(self, path: Path) -> bool:
+        try:
+            return self.output_path(path).stat().st_mtime_ns >= path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return False
+
+    def _process(self, pool: ModelPool, paths: List[Path]) -> None:
+        fn = self.backend_fn or BACKENDS[self.backend]
+        submitted = []
+        for path in paths:
+            if self._is_done(path):
+                continue
+            try:
+                text = path.read_text(errors="replace")
+            except OSError as e:
+                # Deleted or moved away since it arrived.
+                msg.warn(f"Skipping '{path}': {e}")
+                continue
+            _, doc_id = self._document_id(path)
+            doc = Document(id=doc_id, text=text, path=path)
+            submitted.append((doc, pool.submit(fn, text, self.batch_size)))
+        if not submitted:
+            return
+
+        self.report.batches += 1
+        for doc, future in submitted:
+            try:
+                citations = future.result()
+            except Exception as e:
+                self.report.failed += 1
+                msg.fail(f"Failed to process '{doc.id}': {e}")
+                continue
+            output = self.output_path(doc.path)  # pyright: ignore
+            output.parent.mkdir(parents=True, exist_ok=True)
+            with atomic_open(output) as fp:
+                write_citations(citations, fp, {"doc_id": doc.id})
+            self.report.documents += 1
+            self.report.citations += len(citations)
+            if self.on_document is not None:
+                self.on_document(doc, citations)
+        msg.info(f"Processed {len(submitted)} document(s). Total: {self.report}")
+
+    def run(self, stop: Optional[threading.Event] = None) -> WatchReport:
+        """
+        Processes files as they arrive until `stop` is set (forever if None). Files that already
+        arrived are processed before returning.
+        """
+        stop = stop or threading.Event()
+        pending: Dict[Path, None] = {}
+        first = 0.0
+        with (
+            ModelPool(
+                replicas=self.workers, model=self.model, tokenizer=self.tokenizer
+            ) as pool,
+            open_watcher(self.directories, self.pattern, self.poll_interval) as watcher,
+        ):
+            msg.good(
+                f"Watching {', '.join(str(d) for d in self.directories)} for "
+                f"'{self.pattern}' ({type(watcher).__name__})."
+            )
+            while not stop.is_set():
+                timeout = (
+                    max(0.0, first + self.batch_window - time.monotonic())
+                    if pending
+                    else self.batch_window
+                )
+                for path in watcher.changes(timeout):
+                    if not pending:
+                        first = time.monotonic()
+                    pending[path] = None
+                if pending and (
+                    len(pending) >= self.max_batch
+                    or time.monotonic() - first >= self.batch_window
+                ):
+                    batch = list(pending)[: self.max_batch]
+                    for path in batch:
+                        del pending[path]
+                    first = time.monotonic()
+                    self._process(pool, batch)
+            while pending:
+                batch = list(pending)[: self.max_batch]
+                for path in batch:
+                    del pending[path]
+                self._process(pool, batch)
+        return self.report
@@ -0,0 +1,165 @@
+"""
+Whole-document inference over overlapping token windows.
+
+Instead of segmenting with spaCy and tokenizing each sentence separately, the document is
+tokenized once with the fast tokenizer. Fixed-size windows are cut straight from the token stream
+with some overlap, and each token keeps the label from the window in which it sits furthest from
+an edge (i.e. with the most context on both sides). Sentence boundaries no longer exist, so a
+citation can no longer be cut in half at "v." or "U.S.".
+"""
+
+from typing import List, Optional, Tuple
+
+import torch
+from transformers import AutoModelForTokenClassification, PreTrainedTokenizerFast
+
+from . import metrics
+from .constants import ALL_LABELS
+from .invoke import (
+    DEVICE,
+    _cached,
+    _get_model,
+    _get_tokenizer,
+    _record_batch,
+    _special_ids,
+)
+from .metrics import timed
+from .postprocess import _aggregate, entities_to_record, group_entities
+from .records import Label
+from .types import Citation, LabelPrediction
+
+
+def window_bounds(n_tokens: int, window: int, stride: int) -> List[Tuple[int, int]]:
+    """
+    Returns `[start, end)` token ranges of length `window` that overlap by `stride` tokens and
+    together cover `n_tokens`.
+    """
+    if window <= stride:
+        raise ValueError("The window must be longer than the overlap between windows.")
+    if n_tokens <= window:
+        return [(0, n_tokens)]
+
+    step = window - stride
+    bounds = []
+    start = 0
+    while True:
+        end = min(start + window, n_tokens)
+        bounds.append((start, end))
+        if end == n_tokens:
+            return bounds
+        start += step
+
+
+def _max_length(tokenizer: PreTrainedTokenizerFast, model) -> int:
+    return min(tokenizer.model_max_length, model.config.max_position_embeddings)
+
+
+def infer_document(
+    text: str,
+    model: Optional[AutoModelForTokenClassification] = None,
+    tokenizer: Optional[PreTrainedTokenizerFast] = None,
+    stride: int = 64,
+    batch_size: int = 8,
+) -> List[LabelPrediction]:
+    """
+    Labels every token of `text` with a single tokenizer pass and overlapping model windows.
+
+    Returns the non-"O" predictions with document-absolute offsets, plus one "O" marker at the
+    start of each run of "O" tokens so that `aggregate_entities` closes entities at gaps.
+    """
+    return [
+        label.to_model()
+        for label in _infer_document(text, model, tokenizer, stride, batch_size)
+    ]
+
+
+def _infer_document(
+    text: str,
+    model: Optional[AutoModelForTokenClassification] = None,
+    tokenizer: Optional[PreTrainedTokenizerFast] = None,
+    stride: int = 64,
+    batch_size: int = 8,
+) -> List[Label]:
+    model = model if model is not None else _cached(_get_model, "model")
+    tokenizer = tokenizer or _cached(_get_tokenizer, "tokenizer")
+
+    with timed("tokenization"):
+        encoding = tokenizer(
+            text, add_special_tokens=False, return_offsets_mapping=True, verbose=False
+        )
+        ids: List[int] = encoding["input_ids"]  # pyright: ignore
+        offsets: List[Tuple[int, int]] = encoding["offset_mapping"]  # pyright: ignore
+
+    cls_id, sep_id, pad_id = _special_ids(tokenizer)
+    window = _max_length(tokenizer, model) - 2  # room for [CLS] and [SEP]
+    bounds = window_bounds(len(ids), window, min(stride, window // 2))
+
+    labels: List[int] = [0] * len(ids)
+    best_margin: List[int] = [-1] * len(ids)
+
+    for b in range(0, len(bounds), batch_size):
+        batch = bounds[b : b + batch_size]
+        longest = max(end - start for start, end in batch) + 2
+
+        input_ids = torch.full((len(batch), longest), pad_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(batch), longest), dtype=torch.long)
+        for row, (start, end) in enumerate(batch):
+            row_ids = [cls_id] + ids[start:end] + [sep_id]
+            input_ids[row, : len(row_ids)] = torch.tensor(row_ids)
+            attention_mask[row, : len(row_ids)] = 1
+
+        _record_batch(attention_mask)
+
+        with timed("inference"), torch.no_grad():
+            logits = model(  # pyright: ignore
+                input_ids=input_ids.to(DEVICE), attention_mask=attention_mask.to(DEVICE)
+            ).logits
+            predictions = torch.argmax(logits, dim=-1).tolist()
+
+        # Keep, for each token, the label from the window where it is furthest from an edge.
+        for row, (start, end) in enumerate(batch):
+            row_predictions = predictions[row]
+            for i in range(start, end):
+                margin = min(i - start, end - 1 - i)
+                if margin > best_margin[i]:
+                    best_margin[i] = margin
+                    labels[i] = row_predictions[i - start + 1]
+
+    tokens = tokenizer.convert_ids_to_tokens(ids)
+    res: List[Label] = []
+    in_entity = False
+    for token, label_id, (start, end) in zip(tokens, labels, offsets):
+        label = ALL_LABELS[label_id]
+        if label == "O" or start == end:
+            if in_entity:
+                res.append(Label(token, "O", start, end))
+                in_entity = False
+            continue
+        res.append(Label(token.replace("##", ""), label, start, end))
+        in_entity = True
+
+    return res
+
+
+def invoke_windowed(
+    text: str,
+    model: Optional[AutoModelForTokenClassification] = None,
+    tokenizer: Optional[PreTrainedTokenizerFast] = None,
+    stride: int = 64,
+    batch_size: int = 8,
+) -> List[Citation]:
+    """
+    Like `invoke()`, but without spaCy: the whole document is labeled through overlapping token
+    windows and the entity stream is grouped into citations directly. Offsets are document-absolute.
+    """
+    metrics.DOCUMENTS.inc()
+    labels = _infer_document(text, model, tokenizer, stride, batch_size)
+
+    with timed("postprocess"):
+        entities = _aggregate(labels, text)
+        res: List[Citation] = []
+        for group in group_entities(entities):
+            record = entities_to_record(group)
+            if record is not None:
+                res.append(record.to_model())
+    return res
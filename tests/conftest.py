@@ -0,0 +1,57 @@
+import string
+import sys
+from functools import lru_cache
+
+import pytest
+import spacy
+import torch
+from transformers import BertConfig, BertForTokenClassification, BertTokenizerFast
+
+from src.cit_parser.constants import ALL_LABELS
+
+
+@pytest.fixture(scope="session")
+def tiny_tokenizer(tmp_path_factory) -> BertTokenizerFast:
+    """
+    A character-level WordPiece tokenizer small enough to build on the fly.
+    """
+    vocab = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"]
+    vocab += list(string.ascii_letters + string.digits + string.punctuation + "§")
+    vocab += [f"##{c}" for c in string.ascii_letters + string.digits]
+    path = tmp_path_factory.mktemp("tokenizer") / "vocab.txt"
+    path.write_text("\n".join(vocab))
+    tokenizer = BertTokenizerFast(str(path))
+    tokenizer.model_max_length = 64
+    return tokenizer
+
+
+@pytest.fixture(scope="session")
+def tiny_model() -> BertForTokenClassification:
+    """
+    A randomly initialized two-layer BERT with the real label set.
+    """
+    torch.manual_seed(0)
+    config = BertConfig(
+        vocab_size=256,
+        hidden_size=32,
+        num_hidden_layers=2,
+        num_attention_heads=2,
+        intermediate_size=64,
+        max_position_embeddings=64,
+        num_labels=len(ALL_LABELS),
+    )
+    return BertForTokenClassification(config).eval()
+
+
+@pytest.fixture
+def blank_nlp(monkeypatch):
+    """
+    Segments with a blank English pipeline and a rule-based sentencizer instead of
+    en_core_web_sm.
+    """
+    nlp = spacy.blank("en")
+    nlp.add_pipe("sentencizer")
+    monkeypatch.setattr(
+        sys.modules["src.cit_parser.invoke"], "_nlp", lru_cache(maxsize=1)(lambda: nlp)
+    )
+    return nlp
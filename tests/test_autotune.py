@@ -0,0 +1,113 @@
+import pytest
+
+from src.cit_parser.autotune import (
+    BatchProfile,
+    BucketProfile,
+    autotune,
+    infer_labels_tuned,
+    load_profile,
+    plan_batches,
+    tuned_backend,
+)
+from src.cit_parser.invoke import infer_labels_batch, invoke
+from src.cit_parser.pool import Replica
+
+
+def make_profile(sizes):
+    return BatchProfile(
+        model_revision="m",
+        device="cpu",
+        threads=1,
+        slo_ms=100.0,
+        buckets=[
+            BucketProfile(
+                max_tokens=max_tokens,
+                batch_size=batch_size,
+                latency_ms=1.0,
+                tokens_per_second=1.0,
+                peak_memory_mb=1.0,
+            )
+            for max_tokens, batch_size in sizes
+        ],
+    )
+
+
+@pytest.mark.parametrize(
+    ["lengths", "expected"],
+    [
+        ([5, 6, 7, 8], [[0, 1, 2], [3]]),
+        ([5, 20, 30, 40], [[0, 1], [2, 3]]),
+        ([100, 100], [[0], [1]]),
+        ([], []),
+    ],
+)
+def test_plan_batches(lengths, expected):
+    profile = make_profile([(16, 3), (64, 2), (128, 1)])
+    assert plan_batches(lengths, profile) == expected
+
+
+def test_observe_halves_batch_size():
+    profile = make_profile([(16, 8), (64, 4)])
+    profile.observe(10, 8, latency_ms=50.0)
+    assert profile.batch_size(10) == 8
+    profile.observe(10, 8, latency_ms=500.0)
+    assert profile.batch_size(10) == 4
+    profile.observe(10, 2, latency_ms=500.0)  # not a full batch
+    assert profile.batch_size(10) == 4
+
+
+def test_autotune(tiny_model, tiny_tokenizer, tmp_path):
+    profile = autotune(
+        tiny_model, tiny_tokenizer, buckets=(16, 64, 128), max_batch_size=8, repeats=1
+    )
+    # Buckets are capped at the model's 64 positions.
+    assert [b.max_tokens for b in profile.buckets] == [16, 64]
+    assert all(
+        b.batch_size in (1, 2, 4, 8) and b.within_limits for b in profile.buckets
+    )
+
+    profile.save(tmp_path / "profile.json")
+    assert BatchProfile.load(tmp_path / "profile.json") == profile
+    assert load_profile(tmp_path / "profile.json", tiny_model) == profile
+    assert load_profile(tmp_path / "missing.json", tiny_model) is None
+    # Keyed on the thread count inference will run with, not the caller's.
+    assert profile.matches(tiny_model, threads=profile.threads)
+    assert not profile.matches(tiny_model, threads=profile.threads + 1)
+    assert (
+        load_profile(tmp_path / "profile.json", tiny_model, profile.threads + 1) is None
+    )
+
+
+def test_autotune_within_limits(tiny_model, tiny_tokenizer):
+    profile = autotune(
+        tiny_model, tiny_tokenizer, slo_ms=1e-6, buckets=(16,), repeats=1
+    )
+    assert profile.buckets[0].batch_size == 1
+    assert not profile.buckets[0].within_limits
+
+    profile = autotune(
+        tiny_model, tiny_tokenizer, memory_limit_mb=1.0, buckets=(16,), repeats=1
+    )
+    assert not profile.buckets[0].within_limits
+
+
+def test_matches_fixed_batches(tiny_model, tiny_tokenizer):
+    texts = [
+        "See Roe v. Wade, 410 U.S. 113 (1973).",
+        "Id.",
+        "",
+        "Relief under 42 U.S.C. § 1983 is denied, as the court explained at length.",
+    ] * 4
+    profile = make_profile([(16, 3), (32, 2), (64, 1)])
+    assert infer_labels_tuned(texts, tiny_model, profile, tiny_tokenizer) == (
+        infer_labels_batch(texts, tiny_model, tiny_tokenizer)
+    )
+
+
+def test_tuned_backend(tiny_model, tiny_tokenizer, blank_nlp):
+    text = (
+        "See Roe v. Wade, 410 U.S. 113 (1973). Relief under 42 U.S.C. § 1983 is denied."
+    )
+    fn = tuned_backend(make_profile([(16, 1), (64, 2)]))
+    replica = Replica(0, tiny_model, tiny_tokenizer)
+    assert fn(replica, text, 32) == invoke(text, tiny_model, tiny_tokenizer)
@@ -0,0 +1,171 @@
+import os
+import sys
+
+import pytest
+
+from src.cit_parser.checkpoint import (
+    Manifest,
+    atomic_open,
+    read_job,
+    run_job,
+)
+from src.cit_parser.corpus import BACKENDS, resolve_inputs
+from src.cit_parser.types import StatuteCitation
+
+
+def section_backend(replica, text, batch_size):
+    """
+    Stands in for the model: every "§ <n>" is a citation.
+    """
+    res = []
+    start = text.find("§")
+    while start >= 0:
+        end = text.find(" ", start + 2)
+        end = len(text) if end < 0 else end
+        res.append(
+            StatuteCitation(
+                code="U.S.C.", section=text[start + 2 : end], start=start, end=end
+            )
+        )
+        start = text.find("§", end)
+    return res
+
+
+@pytest.fixture
+def job(monkeypatch, tmp_path, tiny_model, tiny_tokenizer):
+    monkeypatch.setitem(BACKENDS, "sections", section_backend)
+    corpus = tmp_path / "corpus"
+    corpus.mkdir()
+    for i in range(5):
+        (corpus / f"{i}.txt").write_text(f"See § {i} and § {i}0")
+    job_dir = tmp_path / "job"
+
+    def run(**kwargs):
+        return run_job(
+            resolve_inputs([str(corpus)]),
+            job_dir,
+            backend="sections",
+            model=tiny_model,
+            tokenizer=tiny_tokenizer,
+            **kwargs,
+        )
+
+    return corpus, job_dir, run
+
+
+def test_rerun_skips_finished_documents(job):
+    corpus, job_dir, run = job
+    report = run(checkpoint_every=2)
+    assert (report.processed, report.skipped, report.parts) == (5, 0, 3)
+    assert len(list(read_job(job_dir))) == 10
+
+    report = run()
+    assert (report.processed, report.skipped) == (0, 5)
+
+
+def test_changed_document_is_reprocessed(job):
+    corpus, job_dir, run = job
+    run()
+    (corpus / "3.txt").write_text("Now only § 7")
+    (corpus / "5.txt").write_text("New § 8")
+    report = run()
+    assert (report.processed, report.skipped) == (2, 4)
+
+    sections = {
+        (extra["doc_id"], c.section)  # pyright: ignore
+        for c, extra in read_job(job_dir)
+    }
+    assert ("3.txt", "7") in sections
+    assert ("3.txt", "3") not in sections
+    assert ("5.txt", "8") in sections
+    assert len(sections) == 10
+
+
+@pytest.mark.parametrize(["trust_mtime", "processed"], [(False, 1), (True, 0)])
+def test_same_size_and_mtime(job, trust_mtime, processed):
+    corpus, job_dir, run = job
+    run()
+    path = corpus / "3.txt"
+    st = path.stat()
+    path.write_text("See § 9 and § 90")
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns))
+
+    report = run(trust_mtime=trust_mtime)
+    assert (report.processed, report.skipped) == (processed, 5 - processed)
+
+
+def test_several_input_directories(monkeypatch, tmp_path, tiny_model, tiny_tokenizer):
+    monkeypatch.setitem(BACKENDS, "sections", section_backend)
+    for i, name in enumerate(("first", "second")):
+        (tmp_path / name).mkdir()
+        (tmp_path / name / "a.txt").write_text(f"See § {i}")
+    inputs = resolve_inputs([str(tmp_path / "first"), str(tmp_path / "second")])
+    job_dir = tmp_path / "job"
+
+    def run():
+        return run_job(
+            inputs,
+            job_dir,
+            backend="sections",
+            model=tiny_model,
+            tokenizer=tiny_tokenizer,
+        )
+
+    assert run().processed == 2
+    assert sorted(
+        (extra["doc_id"], c.section)  # pyright: ignore
+        for c, extra in read_job(job_dir)
+    ) == [
+        (str(tmp_path / "first" / "a.txt"), "0"),
+        (str(tmp_path / "second" / "a.txt"), "1"),
+    ]
+    report = run()
+    assert (report.processed, report.skipped) == (0, 2)
+
+
+def test_duplicate_document_ids(job):
+    corpus, job_dir, run = job
+    inputs = resolve_inputs([str(corpus)])
+    with pytest.raises(ValueError, match="more than once"):
+        run_job(inputs + inputs[:1], job_dir, backend="sections")
+    assert not (job_dir / "manifest.json").exists()
+
+
+def test_resume_after_crash(job):
+    corpus, job_dir, run = job
+    seen = []
+
+    def crash(doc, citations):
+        seen.append(doc.id)
+        if len(seen) == 3:
+            raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        run(checkpoint_every=1, on_document=crash)
+    manifest = Manifest.load(job_dir)
+    assert manifest is not None and len(manifest.documents) == 2
+
+    report = run()
+    assert (report.processed, report.skipped) == (3, 2)
+    assert len(list(read_job(job_dir))) == 10
+
+
+def test_model_change_reprocesses_everything(job, monkeypatch):
+    corpus, job_dir, run = job
+    run()
+    checkpoint = sys.modules["src.cit_parser.checkpoint"]
+    monkeypatch.setattr(checkpoint, "model_revision", lambda model: "other@rev")
+    report = run()
+    assert (report.processed, report.skipped) == (5, 0)
+    assert len(list(job_dir.glob("part-*.jsonl"))) == 1
+
+
+def test_atomic_open_keeps_old_content_on_error(tmp_path):
+    path = tmp_path / "out.jsonl"
+    path.write_text("old")
+    with pytest.raises(RuntimeError):
+        with atomic_open(path) as f:
+            f.write("half")
+            raise RuntimeError
+    assert path.read_text() == "old"
+    assert list(tmp_path.iterdir()) == [path]
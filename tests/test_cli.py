@@ -0,0 +1,195 @@
+import json
+import sys
+
+import pytest
+from typer.testing import CliRunner
+
+from src.cit_parser.cli import _duration, app
+from src.cit_parser.types import StatuteCitation
+
+runner = CliRunner()
+
+
+@pytest.fixture
+def fake_extraction(monkeypatch, tiny_model, tiny_tokenizer):
+    cli = sys.modules["src.cit_parser.cli"]
+    monkeypatch.setattr(
+        cli,
+        "_cached",
+        lambda fn, cache: tiny_model if cache == "model" else tiny_tokenizer,
+    )
+
+    calls = []
+
+    def extract_documents(docs, *args, **kwargs):
+        calls.append((args, kwargs))
+        for doc in docs:
+            start = doc.text.find("42 U.S.C.")
+            cits = (
+                [
+                    StatuteCitation(
+                        title="42",
+                        code="U.S.C.",
+                        section="1983",
+                        start=start,
+                        end=start + 16,
+                    )
+                ]
+                if start >= 0
+                else []
+            )
+            yield doc, cits
+
+    monkeypatch.setattr(cli, "extract_documents", extract_documents)
+    return calls
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    (tmp_path / "a.txt").write_text("Relief under 42 U.S.C. § 1983 is denied.")
+    (tmp_path / "b.txt").write_text("Nothing to see here.")
+    return tmp_path
+
+
+def test_extract_jsonl(fake_extraction, corpus, tmp_path):
+    out = tmp_path / "out.jsonl"
+    result = runner.invoke(app, ["extract", str(corpus), "-o", str(out)])
+    assert result.exit_code == 0, result.output
+
+    records = [json.loads(line) for line in out.read_text().splitlines()]
+    assert len(records) == 1
+    assert records[0]["doc_id"] == "a.txt"
+    assert (records[0]["start"], records[0]["section"]) == (13, "1983")
+
+
+def test_extract_several_directories(fake_extraction, tmp_path):
+    for name in ("first", "second"):
+        (tmp_path / name).mkdir()
+        (tmp_path / name / "a.txt").write_text("See 42 U.S.C. § 1983.")
+    first, second = str(tmp_path / "first"), str(tmp_path / "second")
+    result = runner.invoke(app, ["extract", first, second])
+    assert result.exit_code == 0, result.output
+    records = [json.loads(line) for line in result.stdout.splitlines()]
+    assert [r["doc_id"] for r in records] == [
+        str(tmp_path / "first" / "a.txt"),
+        str(tmp_path / "second" / "a.txt"),
+    ]
+
+    result = runner.invoke(app, ["extract", first, first])
+    assert result.exit_code == 1
+    assert "more than once" in result.stdout + result.stderr
+
+
+def test_extract_to_stdout(fake_extraction, corpus):
+    result = runner.invoke(app, ["extract", str(corpus / "a.txt")])
+    assert result.exit_code == 0
+    record = json.loads(result.stdout.strip())
+    assert record["doc_id"] == str(corpus / "a.txt")
+
+
+def test_extract_stdin(fake_extraction):
+    result = runner.invoke(app, ["extract", "-"], input="See 42 U.S.C. § 1983.")
+    assert result.exit_code == 0
+    assert json.loads(result.stdout)["doc_id"] == "-"
+
+
+def test_dry_run(fake_extraction, corpus):
+    result = runner.invoke(app, ["extract", str(corpus), "--dry-run", "--sample", "1"])
+    assert result.exit_code == 0
+    assert "Estimated time" in result.stderr
+    assert not result.stdout
+
+
+def test_missing_input(fake_extraction, tmp_path):
+    result = runner.invoke(app, ["extract", str(tmp_path / "*.txt")])
+    assert result.exit_code == 1
+
+
+@pytest.mark.parametrize(
+    ["seconds", "expected"], [(5, "5s"), (125, "2m05s"), (7260, "2h01m")]
+)
+def test_duration(seconds: float, expected: str):
+    assert _duration(seconds) == expected
+
+
+def test_autotune(fake_extraction, tmp_path):
+    out = tmp_path / "profile.json"
+    result = runner.invoke(app, ["autotune", "-o", str(out), "--max-batch-size", "2"])
+    assert result.exit_code == 0, result.output
+    assert json.loads(out.read_text())["buckets"]
+
+
+def test_batch_profile(fake_extraction, corpus, tmp_path):
+    profile = tmp_path / "profile.json"
+    runner.invoke(app, ["autotune", "-o", str(profile), "--max-batch-size", "2"])
+    out = str(tmp_path / "out.jsonl")
+
+    result = runner.invoke(
+        app, ["extract", str(corpus), "-o", out, "--batch-profile", str(profile)]
+    )
+    assert result.exit_code == 0, result.output
+    args, _ = fake_extraction[-1]
+    assert callable(args[-1])
+
+    for options in (
+        ["--batch-profile", str(tmp_path / "missing.json")],
+        ["--batch-profile", str(profile), "--backend", "window"],
+    ):
+        result = runner.invoke(app, ["extract", str(corpus), "-o", out, *options])
+        assert result.exit_code == 1
+
+
+def test_calibrate_exits(fake_extraction, blank_nlp, corpus, tmp_path):
+    out = tmp_path / "heads.pt"
+    result = runner.invoke(app, ["calibrate-exits", str(corpus), "-o", str(out)])
+    assert result.exit_code == 0, result.output
+    assert out.exists()
+
+
+def test_watch_missing_directory(fake_extraction, tmp_path):
+    result = runner.invoke(app, ["watch", str(tmp_path / "missing")])
+    assert result.exit_code == 1
+
+
+def test_shard_commands(fake_extraction, monkeypatch, corpus, tmp_path):
+    cli = sys.modules["src.cit_parser.cli"]
+    monkeypatch.setattr(
+        sys.modules["src.cit_parser.shards"], "extract_documents", cli.extract_documents
+    )
+    job_dir = str(tmp_path / "job")
+    result = runner.invoke(
+        app, ["shard", "init", str(corpus), "--job-dir", job_dir, "--shard-size", "1"]
+    )
+    assert result.exit_code == 0, result.output
+
+    result = runner.invoke(app, ["shard", "reduce", "--job-dir", job_dir])
+    assert result.exit_code == 1
+
+    result = runner.invoke(app, ["shard", "work", "--job-dir", job_dir])
+    assert result.exit_code == 0, result.output
+    result = runner.invoke(app, ["shard", "status", "--job-dir", job_dir])
+    assert "done: 2" in result.stdout
+
+    result = runner.invoke(app, ["shard", "reduce", "--job-dir", job_dir])
+    assert result.exit_code == 0, result.output
+    records = (tmp_path / "job" / "citations.jsonl").read_text().splitlines()
+    assert [json.loads(r)["doc_id"] for r in records] == ["a.txt"]
+
+
+def test_extract_summary(fake_extraction, corpus, tmp_path):
+    summary = tmp_path / "summary.jsonl"
+    result = runner.invoke(
+        app,
+        [
+            "extract",
+            str(corpus),
+            "-o",
+            str(tmp_path / "out.jsonl"),
+            "--summary",
+            str(summary),
+        ],
+    )
+    assert result.exit_code == 0, result.output
+    header, row = [json.loads(line) for line in summary.read_text().splitlines()]
+    assert header["documents"] == ["a.txt", "b.txt"]
+    assert (row["count"], row["documents"], row["first"]) == (1, 1, [0, 13])
@@ -0,0 +1,73 @@
+import pytest
+
+from src.cit_parser.corpus import (
+    STDIN,
+    extract_documents,
+    read_documents,
+    resolve_inputs,
+    total_size,
+)
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    (tmp_path / "a.txt").write_text("See 42 U.S.C. § 1983.")
+    (tmp_path / "nested").mkdir()
+    (tmp_path / "nested" / "b.txt").write_text("Nothing to see here.")
+    (tmp_path / "notes.md").write_text("Not a document.")
+    return tmp_path
+
+
+def test_resolve_directory(corpus):
+    resolved = resolve_inputs([str(corpus)])
+    assert [doc_id for doc_id, _ in resolved] == ["a.txt", "nested/b.txt"]
+    assert total_size(resolved) == len("See 42 U.S.C. § 1983.".encode()) + 20
+
+
+def test_resolve_glob_and_stdin(corpus):
+    resolved = resolve_inputs([str(corpus / "*.md"), STDIN])
+    assert [doc_id for doc_id, _ in resolved] == [str(corpus / "notes.md"), STDIN]
+    assert total_size(resolved) is None
+
+
+def test_resolve_several_directories(tmp_path):
+    for name in ("first", "second"):
+        (tmp_path / name).mkdir()
+        (tmp_path / name / "a.txt").write_text(name)
+    first, second = str(tmp_path / "first"), str(tmp_path / "second")
+    resolved = resolve_inputs([first, second])
+    assert [doc_id for doc_id, _ in resolved] == [
+        str(tmp_path / "first" / "a.txt"),
+        str(tmp_path / "second" / "a.txt"),
+    ]
+
+
+def test_resolve_duplicate_input(corpus):
+    with pytest.raises(ValueError, match="more than once"):
+        resolve_inputs([str(corpus), str(corpus / "a.txt"), str(corpus / "a.txt")])
+
+
+def test_resolve_missing(corpus):
+    with pytest.raises(FileNotFoundError):
+        resolve_inputs([str(corpus / "missing-*.txt")])
+
+
+def test_extract_documents_in_order(corpus, tiny_model, tiny_tokenizer):
+    docs = read_documents(resolve_inputs([str(corpus)]) * 3)
+    results = list(
+        extract_documents(
+            docs,
+            backend="window",
+            workers=2,
+            model=tiny_model,
+            tokenizer=tiny_tokenizer,
+        )
+    )
+    assert [doc.id for doc, _ in results] == ["a.txt", "nested/b.txt"] * 3
+    for doc, citations in results:
+        assert all(0 <= c.start <= c.end <= len(doc.text) for c in citations)
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        next(extract_documents([], backend="magic"))
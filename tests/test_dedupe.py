@@ -0,0 +1,117 @@
+import re
+
+import pytest
+
+from src.cit_parser.corpus import BACKENDS, Document, extract_documents
+from src.cit_parser.dedupe import DedupeIndex, rebase_citations, shingles
+from src.cit_parser.types import StatuteCitation
+
+OPINION = " ".join(
+    f"Paragraph {i}: the plaintiff relies on 42 U.S.C. § {1980 + i} and the court disagrees "
+    f"for reasons stated in part {i}."
+    for i in range(40)
+)
+# The same opinion as delivered by another feed: a header and reflowed whitespace.
+REPRINT = "SLIP OPINION\n\n" + OPINION.replace(" the ", "  the\n")
+OTHER = " ".join(
+    f"Count {i} of the indictment charges a violation of 18 U.S.C. § {i}."
+    for i in range(40)
+)
+
+
+def cite_sections(text):
+    return [
+        StatuteCitation(code="U.S.C.", section=m.group(1), start=m.start(), end=m.end())
+        for m in re.finditer(r"§ (\d+)", text)
+    ]
+
+
+def test_shingles_ignore_whitespace_and_case():
+    assert shingles("The  court\nheld that X applies.") == shingles(
+        "the court held that x applies."
+    )
+    assert shingles("") == set()
+
+
+def test_match():
+    index = DedupeIndex()
+    first, duplicate = index.match(OPINION)
+    assert not duplicate
+    assert index.match(OTHER) == (first + 1, False)
+    assert index.match(REPRINT) == (first, True)
+    assert index.report.duplicates == 1
+
+
+def test_rebase_citations():
+    rebased = rebase_citations(cite_sections(OPINION), OPINION, REPRINT)
+    assert rebased == cite_sections(REPRINT)
+
+
+def test_rebase_fails_where_texts_differ():
+    changed = OPINION.replace("§ 1985", "§ 2000")
+    assert rebase_citations(cite_sections(OPINION), OPINION, changed) is None
+
+
+def test_rebase_fails_where_the_duplicate_has_more():
+    extra = REPRINT + " The court also notes 28 U.S.C. § 1331."
+    assert rebase_citations(cite_sections(OPINION), OPINION, extra) is None
+    # A new case name next to an unchanged reporter citation.
+    source = OPINION + " See 410 U.S. 113."
+    target = OPINION + " See Roe v. Wade, 410 U.S. 113."
+    assert rebase_citations(cite_sections(source), source, target) is None
+
+
+def test_rebase_ignores_changes_without_a_signal():
+    edited = "Filed under seal. " + REPRINT
+    assert rebase_citations(cite_sections(OPINION), OPINION, edited) == cite_sections(
+        edited
+    )
+
+
+def test_eviction():
+    index = DedupeIndex(cache_size=1)
+    index.match(OPINION)
+    index.match(OTHER)
+    assert index.match(REPRINT)[1] is False
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    seen = []
+
+    def backend(replica, text, batch_size):
+        seen.append(text)
+        return cite_sections(text)
+
+    monkeypatch.setitem(BACKENDS, "sections", backend)
+    return seen
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_extract_with_dedupe(calls, tiny_model, tiny_tokenizer, workers):
+    unaligned = OPINION.replace("§ 1985", "§ 2000")
+    extended = REPRINT + " The court also notes 28 U.S.C. § 1331."
+    texts = [OPINION, OTHER, REPRINT, unaligned, REPRINT, extended]
+    docs = [Document(id=str(i), text=text) for i, text in enumerate(texts)]
+    index = DedupeIndex()
+
+    results = list(
+        extract_documents(
+            docs,
+            backend="sections",
+            workers=workers,
+            model=tiny_model,
+            tokenizer=tiny_tokenizer,
+            dedupe=index,
+        )
+    )
+    assert [doc.id for doc, _ in results] == ["0", "1", "2", "3", "4", "5"]
+    for doc, citations in results:
+        assert citations == cite_sections(doc.text)
+    assert results[5][1][-1].section == "1331"
+    assert sorted(calls) == sorted([OPINION, OTHER, unaligned, extended])
+
+    report = index.report
+    assert (report.documents, report.duplicates) == (6, 4)
+    assert (report.rebased, report.reprocessed) == (2, 2)
+    assert report.ratio == pytest.approx(4 / 6)
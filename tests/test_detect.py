@@ -0,0 +1,69 @@
+import pytest
+
+from src.cit_parser.constants import ALL_LABELS
+from src.cit_parser.detect import (
+    ENTITY_LABELS,
+    decode_spans,
+    detect,
+    detect_array,
+    detect_sentences,
+)
+from src.cit_parser.invoke import invoke
+
+
+def ids(*labels):
+    return [ALL_LABELS.index(label) for label in labels]
+
+
+@pytest.mark.parametrize(
+    ["labels", "expected"],
+    [
+        (
+            ["O", "B-VOLUME", "B-REPORTER", "I-REPORTER", "B-PAGE", "O"],
+            [("VOLUME", 14, 18), ("REPORTER", 18, 26), ("PAGE", 27, 30)],
+        ),
+        (["B-CODE", "I-CODE", "O", "I-CODE"], [("CODE", 10, 18)]),
+        (["I-SECTION", "B-SECTION", "I-YEAR"], [("SECTION", 14, 18)]),
+        (["O", "O", "O"], []),
+    ],
+)
+def test_decode_spans(labels, expected):
+    # [CLS], the labeled tokens, [SEP]
+    offsets = [[0, 0], [0, 3], [4, 8], [8, 12], [13, 16], [17, 20], [21, 24]]
+    offsets = offsets[: len(labels) + 1] + [[0, 0]]
+    label_ids = ids("O", *labels, "O")
+    assert decode_spans(label_ids, offsets, offset=10) == expected
+
+
+@pytest.fixture
+def text():
+    return (
+        "The court in Roe v. Wade, 410 U.S. 113 (1973), disagreed. Id. at 120. "
+        "Relief under 42 U.S.C. § 1983 is denied. Nothing else."
+    ) * 2
+
+
+def test_detect_covers_invoke(blank_nlp, text, tiny_model, tiny_tokenizer):
+    spans = detect(text, tiny_model, tiny_tokenizer)
+    assert all(label in ENTITY_LABELS for label, _, _ in spans)
+    assert spans == sorted(spans, key=lambda s: s[1])
+
+    sentences = detect_sentences(text, tiny_model, tiny_tokenizer)
+    assert [s[:2] for s in sentences] == [
+        (s.start_char, s.end_char) for s in blank_nlp(text).sents
+    ]
+    for cit in invoke(text, tiny_model, tiny_tokenizer):
+        assert any(
+            has and start <= cit.start and cit.end <= end
+            for start, end, has in sentences
+        )
+        assert any(start < cit.end and cit.start < end for _, start, end in spans)
+
+
+def test_detect_array(blank_nlp, text, tiny_model, tiny_tokenizer):
+    spans = detect(text, tiny_model, tiny_tokenizer)
+    array = detect_array(text, tiny_model, tiny_tokenizer)
+    assert array.shape == (len(spans), 3)
+    assert [
+        (ENTITY_LABELS[label], start, end) for label, start, end in array.tolist()
+    ] == spans
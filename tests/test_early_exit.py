@@ -0,0 +1,101 @@
+import pickle
+
+import pytest
+import torch
+
+from src.cit_parser.checkpoint import model_revision
+from src.cit_parser.early_exit import (
+    O_ID,
+    ExitHead,
+    ExitHeads,
+    calibrate,
+    evaluate,
+    infer_labels_early_exit,
+    invoke_early_exit,
+    predict_batch_early_exit,
+)
+from src.cit_parser.invoke import encode_batch, infer_labels_batch, invoke
+
+SENTENCES = [
+    "See 42 U.S.C. § 1983.",
+    "The court agreed.",
+    "Roe v. Wade, 410 U.S. 113 (1973).",
+    "No.",
+    "It was so ordered by the court today.",
+] * 4
+
+
+def heads_with_threshold(tiny_model, threshold):
+    weight = torch.zeros(tiny_model.config.hidden_size)
+    return ExitHeads([ExitHead(1, weight, 0.0, threshold)], model_revision(tiny_model))
+
+
+def test_no_exit_matches_full_inference(tiny_model, tiny_tokenizer):
+    # Every score is sigmoid(0) = 0.5, above the threshold.
+    heads = heads_with_threshold(tiny_model, 0.1)
+    assert infer_labels_early_exit(
+        SENTENCES, tiny_model, heads, tiny_tokenizer, batch_size=3
+    ) == infer_labels_batch(SENTENCES, tiny_model, tiny_tokenizer, batch_size=3)
+
+
+def test_exited_rows_are_all_o(tiny_model, tiny_tokenizer):
+    heads = heads_with_threshold(tiny_model, 0.9)
+    tokenized_input, _ = encode_batch(SENTENCES[:3], tiny_tokenizer)
+    predictions, depth = predict_batch_early_exit(
+        tokenized_input, tiny_model, heads, tiny_tokenizer
+    )
+    assert depth == [1, 1, 1]
+    assert all(label == O_ID for row in predictions for label in row)
+    assert infer_labels_early_exit(SENTENCES, tiny_model, heads, tiny_tokenizer) == [
+        [] for _ in SENTENCES
+    ]
+
+
+def test_invoke_without_exits(tiny_model, tiny_tokenizer, blank_nlp):
+    text = " ".join(SENTENCES[:5])
+    heads = heads_with_threshold(tiny_model, 0.1)
+    assert invoke_early_exit(text, heads, tiny_model, tiny_tokenizer) == invoke(
+        text, tiny_model, tiny_tokenizer
+    )
+
+
+def test_calibration_meets_target_recall(tiny_model, tiny_tokenizer, tmp_path):
+    heads = calibrate(SENTENCES, tiny_model, tiny_tokenizer, target_recall=1.0)
+    assert [h.layer for h in heads.heads] == [1]
+
+    report = evaluate(SENTENCES, heads, tiny_model, tiny_tokenizer)
+    assert report.sentences == len(SENTENCES)
+    assert report.entity_sentence_recall == 1.0
+    assert report.citation_recall == 1.0
+
+    path = tmp_path / "heads.pt"
+    heads.save(path)
+    loaded = ExitHeads.load(path, tiny_model)
+    assert loaded.model_revision == heads.model_revision
+    assert loaded.heads[0].threshold == heads.heads[0].threshold
+    assert torch.equal(loaded.heads[0].weight, heads.heads[0].weight)
+
+
+def test_calibrated_model_can_be_pickled(tiny_model, tiny_tokenizer):
+    calibrate(SENTENCES, tiny_model, tiny_tokenizer, target_recall=1.0)
+    pickle.dumps(tiny_model)
+
+
+def test_heads_of_another_model(tiny_model, tiny_tokenizer, tmp_path):
+    weight = torch.zeros(tiny_model.config.hidden_size)
+    heads = ExitHeads([ExitHead(1, weight, 0.0, 0.1)], "other-model@abc")
+    with pytest.raises(ValueError):
+        infer_labels_early_exit(SENTENCES, tiny_model, heads, tiny_tokenizer)
+    with pytest.raises(ValueError):
+        evaluate(SENTENCES, heads, tiny_model, tiny_tokenizer)
+
+    heads.save(tmp_path / "heads.pt")
+    assert ExitHeads.load(tmp_path / "heads.pt").model_revision == "other-model@abc"
+    with pytest.raises(ValueError):
+        ExitHeads.load(tmp_path / "heads.pt", tiny_model)
+
+
+@pytest.mark.parametrize("layers", [[0], [2]])
+def test_invalid_exit_layers(tiny_model, tiny_tokenizer, layers):
+    with pytest.raises(ValueError):
+        calibrate(SENTENCES, tiny_model, tiny_tokenizer, layers=layers)
@@ -0,0 +1,118 @@
+import numpy as np
+import pytest
+
+from src.cit_parser.graph import (
+    CASELAW,
+    DOCUMENT,
+    CitationGraph,
+    GraphBuilder,
+    document_key,
+)
+from src.cit_parser.serialize import authority_key
+from src.cit_parser.types import Authorities, CaselawCitation, StatuteCitation
+
+
+def case(volume, reporter, page):
+    return CaselawCitation(
+        case_name="A v. B",
+        volume=volume,
+        reporter=reporter,
+        starting_page=page,
+        start=0,
+        end=1,
+    )
+
+
+ROE = case(410, "U.S.", 113)
+CASEY = case(505, "U.S.", 833)
+SECTION_1983 = StatuteCitation(
+    title="42", code="U.S.C.", section="1983", start=0, end=1
+)
+
+
+def authorities(*groups):
+    caselaw = {
+        cits[0]: list(cits) for cits in groups if isinstance(cits[0], CaselawCitation)
+    }
+    statutes = {
+        cits[0]: list(cits) for cits in groups if isinstance(cits[0], StatuteCitation)
+    }
+    return Authorities(caselaw=caselaw, statutes=statutes)
+
+
+@pytest.fixture
+def graph():
+    builder = GraphBuilder()
+    # Casey cites Roe twice; two briefs cite both, one of them also a statute.
+    builder.add_document("casey", authorities((ROE, ROE)), key=authority_key(CASEY))
+    builder.add_document("brief-1", authorities((ROE,), (CASEY,), (SECTION_1983,)))
+    builder.add_document("brief-2", authorities((CASEY,)))
+    builder.add_document("brief-2", authorities((CASEY,)))  # delivered twice
+    return builder.build()
+
+
+def test_authority_key():
+    assert authority_key(ROE) == authority_key(case(410, "U. S.", 113))
+    assert authority_key(ROE) != authority_key(CASEY)
+    assert authority_key(SECTION_1983) == "statute:U.S.C.:1983"
+
+
+def test_structure(graph):
+    assert graph.n_nodes == 5
+    assert graph.n_edges == 5
+    assert graph.kinds[graph.node(authority_key(CASEY))] == DOCUMENT
+    assert graph.kinds[graph.node(authority_key(ROE))] == CASELAW
+
+    brief = graph.node(document_key("brief-1"))
+    assert sorted(graph.key(i) for i in graph.neighbors(brief)) == sorted(
+        [authority_key(ROE), authority_key(CASEY), authority_key(SECTION_1983)]
+    )
+    # Repeated edges are merged, their weights added up.
+    brief_2 = graph.node(document_key("brief-2"))
+    assert graph.weights[graph.indptr[brief_2]] == 2
+
+
+def test_in_degree(graph):
+    roe, casey = graph.node(authority_key(ROE)), graph.node(authority_key(CASEY))
+    in_degree = graph.in_degree()
+    assert (in_degree[roe], in_degree[casey]) == (2, 2)
+    weighted = graph.in_degree(weighted=True)
+    assert (weighted[roe], weighted[casey]) == (3, 3)
+
+
+def dense_pagerank(graph, damping=0.85):
+    n = graph.n_nodes
+    matrix = np.zeros((n, n))
+    for source in range(n):
+        for i in range(graph.indptr[source], graph.indptr[source + 1]):
+            matrix[graph.indices[i], source] = graph.weights[i]
+    out = matrix.sum(axis=0)
+    matrix[:, out == 0] = 1.0 / n
+    matrix /= matrix.sum(axis=0)
+    return np.linalg.solve(
+        np.eye(n) - damping * matrix, np.full(n, (1.0 - damping) / n)
+    )
+
+
+def test_pagerank(graph):
+    rank = graph.pagerank()
+    assert rank.sum() == pytest.approx(1.0)
+    np.testing.assert_allclose(rank, dense_pagerank(graph), atol=1e-8)
+    assert graph.top(rank, k=1, kind=CASELAW) == [(authority_key(ROE), rank.max())]
+
+
+def test_save_and_load(graph, tmp_path):
+    graph.save(tmp_path / "graph")
+    loaded = CitationGraph.load(tmp_path / "graph")
+    assert isinstance(loaded.indices, np.memmap)
+    assert list(loaded.keys()) == list(graph.keys())
+    np.testing.assert_allclose(loaded.pagerank(), graph.pagerank())
+
+    with pytest.raises(FileNotFoundError):
+        CitationGraph.load(tmp_path / "missing")
+
+
+def test_empty():
+    graph = GraphBuilder().build()
+    assert (graph.n_nodes, graph.n_edges) == (0, 0)
+    assert len(graph.pagerank()) == 0
@@ -0,0 +1,46 @@
+import json
+
+import pytest
+import torch
+
+from src.cit_parser.loading import (
+    load_local_model,
+    load_safetensors_mmap,
+    resolve_local_path,
+)
+
+
+@pytest.fixture
+def bundle(tmp_path, tiny_model, tiny_tokenizer):
+    tiny_model.save_pretrained(tmp_path, safe_serialization=True)
+    tiny_tokenizer.save_pretrained(tmp_path)
+    return tmp_path
+
+
+def test_load_safetensors_mmap(bundle, tiny_model):
+    tensors = load_safetensors_mmap(bundle / "model.safetensors")
+    expected = tiny_model.state_dict()
+    for name, tensor in tensors.items():
+        assert torch.equal(tensor, expected[name])
+
+
+def test_load_local_model_matches(bundle, tiny_model, tiny_tokenizer):
+    model = load_local_model(bundle)
+    inputs = tiny_tokenizer("Brown v. Board, 347 U.S. 483", return_tensors="pt")
+    with torch.no_grad():
+        assert torch.allclose(model(**inputs).logits, tiny_model(**inputs).logits)
+
+
+def test_load_sharded(tmp_path, tiny_model):
+    tiny_model.save_pretrained(tmp_path, safe_serialization=True, max_shard_size="20KB")
+    assert json.loads((tmp_path / "model.safetensors.index.json").read_text())
+
+    model = load_local_model(tmp_path)
+    for name, tensor in model.state_dict().items():
+        assert torch.equal(tensor, tiny_model.state_dict()[name])
+
+
+def test_resolve_local_path(tmp_path):
+    assert resolve_local_path(f"file://{tmp_path}") == tmp_path
+    with pytest.raises(FileNotFoundError):
+        resolve_local_path(str(tmp_path / "missing"))
@@ -0,0 +1,71 @@
+from typing import Dict, List, Tuple
+
+import pytest
+
+from src.cit_parser.metrics import MetricsRegistry, record_timings, timed
+
+
+def test_counter_labels():
+    registry = MetricsRegistry()
+    counter = registry.counter("hits_total", "Hits.")
+    counter.inc()
+    counter.inc(2, cache="model")
+    counter.inc(cache="model")
+
+    assert counter.value() == 1
+    assert counter.value(cache="model") == 3
+    assert registry.counter("hits_total") is counter
+
+    with pytest.raises(ValueError):
+        counter.inc(-1)
+    with pytest.raises(TypeError):
+        registry.histogram("hits_total")
+
+
+def test_prometheus_export():
+    registry = MetricsRegistry()
+    registry.counter("docs_total", "Documents.").inc(3)
+    hist = registry.histogram("latency_seconds", "Latency.", buckets=(0.1, 1.0))
+    hist.observe(0.05, stage="a")
+    hist.observe(0.5, stage="a")
+    hist.observe(5.0, stage="a")
+
+    assert registry.to_prometheus() == (
+        "# HELP docs_total Documents.\n"
+        "# TYPE docs_total counter\n"
+        "docs_total 3.0\n"
+        "# HELP latency_seconds Latency.\n"
+        "# TYPE latency_seconds histogram\n"
+        'latency_seconds_bucket{stage="a",le="0.1"} 1\n'
+        'latency_seconds_bucket{stage="a",le="1.0"} 2\n'
+        'latency_seconds_bucket{stage="a",le="+Inf"} 3\n'
+        'latency_seconds_sum{stage="a"} 5.55\n'
+        'latency_seconds_count{stage="a"} 3\n'
+    )
+
+
+def test_hooks():
+    registry = MetricsRegistry()
+    seen: List[Tuple[str, float, Dict[str, str]]] = []
+    registry.add_hook(lambda name, value, labels: seen.append((name, value, labels)))
+
+    registry.counter("c").inc(2, kind="x")
+    registry.histogram("h").observe(0.5)
+
+    assert seen == [("c", 2, {"kind": "x"}), ("h", 0.5, {})]
+
+
+def test_record_timings():
+    with record_timings() as t:
+        with timed("segmentation"):
+            pass
+        with timed("inference"):
+            pass
+        with timed("inference"):
+            pass
+
+    with timed("outside"):
+        pass
+
+    assert set(t.stages) == {"segmentation", "inference"}
+    assert t.total >= sum(t.stages.values())
@@ -0,0 +1,82 @@
+from typing import Optional
+
+import pytest
+
+from src.cit_parser import Authorities, CaselawCitation, StatuteCitation
+from src.cit_parser.normalize import (
+    normalize_code,
+    normalize_reporter,
+    reporter_key,
+    squash,
+)
+
+
+@pytest.mark.parametrize(
+    ["raw", "expected"],
+    [
+        ("F.3d", "F.3d"),
+        ("F. 3d", "F.3d"),
+        ("F 3d", "F.3d"),
+        ("f.3rd", "F.3d"),
+        ("F. Supp. 2d", "F. Supp. 2d"),
+        ("F.Supp.2nd", "F. Supp. 2d"),
+        ("Fed. Appx.", "F. App'x"),
+        ("U. S.", "U.S."),
+        ("S.Ct.", "S. Ct."),
+        ("Crim. L. Enjoyers", None),
+        (None, None),
+    ],
+)
+def test_normalize_reporter(raw: Optional[str], expected: Optional[str]):
+    assert normalize_reporter(raw) == expected
+
+
+@pytest.mark.parametrize(
+    ["raw", "expected"],
+    [
+        ("U.S.C.", "U.S.C."),
+        ("USC", "U.S.C."),
+        ("U. S. C.", "U.S.C."),
+        ("Cal. Civ. Code", "Cal. Civ. Code"),
+        ("California Civil Code", "Cal. Civ. Code"),
+        ("Pen. Code", "Cal. Penal Code"),
+        ("Made Up Code", None),
+    ],
+)
+def test_normalize_code(raw: Optional[str], expected: Optional[str]):
+    assert normalize_code(raw) == expected
+
+
+def test_unknown_reporters_still_squash():
+    assert reporter_key("Crim. L. Enjoyers") == reporter_key("Crim.L. Enjoyers")
+    assert squash("Crim. L. Enjoyers") == "crimlenjoyers"
+
+
+def test_canonical_fields_at_construction():
+    case = CaselawCitation(
+        case_name="A v. B", volume=1, reporter="F. 3d", starting_page=2, start=0, end=1
+    )
+    statute = StatuteCitation(code="USC", section="1983", start=0, end=1)
+    assert case.canonical_reporter == "F.3d"
+    assert statute.canonical_code == "U.S.C."
+
+
+def test_variant_spellings_group_together():
+    full = CaselawCitation(
+        case_name="T v. B.",
+        volume=300,
+        reporter="F.3d",
+        starting_page=87,
+        raw_court="2d Cir.",
+        year=1989,
+        start=0,
+        end=37,
+    )
+    variant = full.model_copy(update={"reporter": "F. 3d", "start": 50, "end": 80})
+    short = CaselawCitation(
+        case_name="T", volume=300, reporter="F 3d", raw_pin_cite="90", start=90, end=99
+    )
+
+    result = Authorities.construct([full, variant, short])
+    assert list(result.caselaw) == [full]
+    assert result.caselaw[full] == [full, variant, short]
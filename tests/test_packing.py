@@ -0,0 +1,61 @@
+import pytest
+import torch
+
+from src.cit_parser.invoke import infer_labels_batch, invoke
+from src.cit_parser.packing import (
+    block_diagonal_mask,
+    infer_labels_packed,
+    invoke_packed,
+    pack_sequences,
+)
+
+
+@pytest.mark.parametrize(
+    ["lengths", "capacity", "expected"],
+    [
+        ([3, 3, 3], 10, [[0, 1, 2]]),
+        ([6, 5, 4, 3], 10, [[0, 2], [1, 3]]),
+        ([10, 1], 10, [[0], [1]]),
+        ([], 10, []),
+    ],
+)
+def test_pack_sequences(lengths, capacity, expected):
+    assert pack_sequences(lengths, capacity) == expected
+
+
+def test_block_diagonal_mask():
+    segment_ids = torch.tensor([[1, 1, 2, 0]])
+    mask = block_diagonal_mask(segment_ids, torch.float32)
+    allowed = (mask == 0) if mask.dim() == 4 else mask.bool()[:, None]
+    assert allowed[0, 0].tolist() == [
+        [True, True, False, False],
+        [True, True, False, False],
+        [False, False, True, False],
+        [False, False, False, True],
+    ]
+
+
+@pytest.fixture
+def sentences():
+    return [
+        "See Roe v. Wade, 410 U.S. 113 (1973).",
+        "Id. at 120.",
+        "",
+        "Relief under 42 U.S.C. § 1983 is denied.",
+        "Nothing.",
+        "Cf. Smith v. Jones, 12 F.3d 1, 4 (9th Cir. 1994).",
+    ] * 3
+
+
+@pytest.mark.parametrize("rows", [1, 2, 8])
+def test_matches_padded_batching(sentences, tiny_model, tiny_tokenizer, rows):
+    packed = infer_labels_packed(sentences, tiny_model, tiny_tokenizer, batch_size=rows)
+    padded = infer_labels_batch(sentences, tiny_model, tiny_tokenizer)
+    assert packed == padded
+
+
+def test_invoke_packed(blank_nlp, sentences, tiny_model, tiny_tokenizer):
+    text = " ".join(sentences)
+    assert invoke_packed(text, tiny_model, tiny_tokenizer) == invoke(
+        text, tiny_model, tiny_tokenizer
+    )
@@ -0,0 +1,64 @@
+import threading
+
+import pytest
+
+from src.cit_parser.corpus import Document
+from src.cit_parser.invoke import invoke
+from src.cit_parser.pipeline import PipelineReport, run_pipeline
+
+
+@pytest.fixture
+def docs(blank_nlp):
+    texts = [
+        "See Roe v Wade, 410 US 113. Id at 120. Nothing here",
+        "",
+        "Under 42 USC 1983 relief is denied. Cf Smith v Jones, 12 F3d 1",
+        "No citations",
+    ] * 3
+    return [Document(id=str(i), text=text) for i, text in enumerate(texts)]
+
+
+@pytest.mark.parametrize("threaded", [True, False])
+def test_matches_invoke(docs, blank_nlp, tiny_model, tiny_tokenizer, threaded):
+    report = PipelineReport()
+    results = list(
+        run_pipeline(
+            docs,
+            tiny_model,
+            tiny_tokenizer,
+            batch_size=3,
+            queue_size=1,
+            threaded=threaded,
+            report=report,
+        )
+    )
+
+    assert [doc.id for doc, _ in results] == [doc.id for doc in docs]
+    for doc, citations in results:
+        expected = invoke(doc.text, tiny_model, tiny_tokenizer)
+        assert [c.model_dump() for c in citations] == [c.model_dump() for c in expected]
+
+    assert report.documents == len(docs)
+    assert report.sentences == sum(len(list(blank_nlp(d.text).sents)) for d in docs)
+    assert report.batches >= -(-report.sentences // 3)
+    assert report.overlap > 0
+
+
+def test_errors_propagate(docs, tiny_model, tiny_tokenizer):
+    def broken():
+        yield docs[0]
+        raise OSError("disk gone")
+
+    with pytest.raises(OSError, match="disk gone"):
+        list(run_pipeline(broken(), tiny_model, tiny_tokenizer))
+
+
+def test_early_exit_stops_stages(docs, tiny_model, tiny_tokenizer):
+    before = threading.active_count()
+    results = run_pipeline(docs * 20, tiny_model, tiny_tokenizer, queue_size=1)
+    next(results)
+    results.close()
+    for thread in threading.enumerate():
+        if thread.name.startswith("cit-parser-"):
+            thread.join(timeout=5)
+    assert threading.active_count() == before
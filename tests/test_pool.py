@@ -0,0 +1,67 @@
+import threading
+
+import pytest
+import torch
+
+from src.cit_parser.pool import ModelPool, partition_cpus
+
+
+@pytest.mark.parametrize(
+    ["cpus", "replicas", "threads", "expected"],
+    [
+        ([0, 1, 2, 3], 2, 2, [{0, 1}, {2, 3}]),
+        ([0, 1, 2, 3], 4, 1, [{0}, {1}, {2}, {3}]),
+        ([0, 1], 3, 1, [{0}, {1}, {0}]),
+    ],
+)
+def test_partition_cpus(cpus, replicas, threads, expected):
+    assert partition_cpus(cpus, replicas, threads) == expected
+
+
+def test_replicas_run_concurrently(tiny_model, tiny_tokenizer):
+    barrier = threading.Barrier(2, timeout=10)
+
+    def wait(replica):
+        barrier.wait()
+        return replica.index
+
+    with ModelPool(replicas=2, model=tiny_model, tokenizer=tiny_tokenizer) as pool:
+        futures = [pool.submit(wait) for _ in range(2)]
+        assert sorted(f.result(timeout=10) for f in futures) == [0, 1]
+
+
+def test_replica_resources(tiny_model, tiny_tokenizer):
+    before = torch.get_num_threads()
+    try:
+        with ModelPool(
+            replicas=2,
+            threads=1,
+            share_weights=False,
+            model=tiny_model,
+            tokenizer=tiny_tokenizer,
+        ) as pool:
+            first, second = pool.replicas
+            assert first.tokenizer is not second.tokenizer
+            assert first.model is not second.model
+
+            # One budget for the whole process, seen alike by the caller and every replica.
+            threads = [
+                pool.submit(lambda replica: torch.get_num_threads()).result()
+                for _ in range(4)
+            ]
+            assert threads == [1] * 4
+            assert torch.get_num_threads() == 1
+    finally:
+        torch.set_num_threads(before)
+
+
+def test_errors_propagate(tiny_model, tiny_tokenizer):
+    def fail(replica):
+        raise KeyError("boom")
+
+    pool = ModelPool(replicas=1, model=tiny_model, tokenizer=tiny_tokenizer)
+    with pytest.raises(KeyError):
+        pool.submit(fail).result()
+    pool.close()
+    with pytest.raises(RuntimeError):
+        pool.submit(fail)
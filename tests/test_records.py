@@ -0,0 +1,165 @@
+import pytest
+
+from src.cit_parser import CaselawCitation, LabelPrediction, StatuteCitation
+from src.cit_parser.constants import LABEL_MAP
+from src.cit_parser.invoke import (
+    decode_batch,
+    infer_labels_batch,
+    sentences_to_citations,
+)
+from src.cit_parser.postprocess import aggregate_entities, labels_to_cit
+from src.cit_parser.records import CaselawRecord, Label, StatuteRecord
+from src.cit_parser.serialize import citation_to_dict
+
+
+def entities(*parts):
+    start, res = 0, []
+    for token, label in parts:
+        res.append(Label(token, label, start, start + len(token)))
+        start += len(token) + 1
+    return res
+
+
+@pytest.mark.parametrize(
+    "parts",
+    [
+        [
+            ("Brown v. Board", "CASE_NAME"),
+            ("347", "VOLUME"),
+            ("US", "REPORTER"),
+            ("483", "PAGE"),
+            ("1954", "YEAR"),
+        ],
+        [
+            ("Jones v. Smith", "CASE_NAME"),
+            ("F. 2d", "REPORTER"),
+            ("101", "PAGE"),
+            ("at 67", "PIN"),
+            ("9th Cir.", "COURT"),
+            ("2000", "YEAR"),
+        ],
+        [("Jones", "CASE_NAME"), ("67", "PIN")],
+        [
+            ("Name", "CASE_NAME"),
+            ("1", "VOLUME"),
+            ("Unknown Rptr.", "REPORTER"),
+            ("2", "PAGE"),
+        ],
+    ],
+)
+def test_caselaw_record_matches_model(parts):
+    labels = entities(*parts)
+    model = CaselawCitation.from_token_label_pairs(labels)  # pyright: ignore
+    record = CaselawRecord.from_labels(labels)
+    assert model is not None and record is not None
+    assert record.is_full == model.is_full
+    assert record.formatted_court == model.formatted_court
+    assert record.canonical_reporter == model.canonical_reporter
+    converted = record.to_model()
+    assert converted == model
+    assert converted.model_fields_set == model.model_fields_set
+    assert type(converted.citation_type) is type(model.citation_type)
+    assert citation_to_dict(converted) == citation_to_dict(model)
+    assert str(converted) == str(model) and hash(converted) == hash(model)
+
+
+@pytest.mark.parametrize(
+    "parts",
+    [
+        [("42", "TITLE"), ("U.S.C.", "CODE"), ("1983", "SECTION"), ("2018", "YEAR")],
+        [("Cal. Civ. Code", "CODE"), ("1714", "SECTION")],
+        [("1983", "SECTION")],
+    ],
+)
+def test_statute_record_matches_model(parts):
+    labels = entities(*parts)
+    model = StatuteCitation.from_token_label_pairs(labels)  # pyright: ignore
+    record = StatuteRecord.from_labels(labels)
+    assert model is not None and record is not None
+    assert record.is_full == model.is_full
+    converted = record.to_model()
+    assert converted == model
+    assert converted.model_fields_set == model.model_fields_set
+    assert type(converted.citation_type) is type(model.citation_type)
+    assert citation_to_dict(converted) == citation_to_dict(model)
+
+
+def test_records_without_a_citation():
+    assert CaselawRecord.from_labels(entities(("347", "VOLUME"))) is None
+    assert StatuteRecord.from_labels(entities(("42", "TITLE"))) is None
+
+
+def test_records_are_slotted():
+    label = Label("347", "VOLUME", 0, 3)
+    with pytest.raises(AttributeError):
+        label.extra = True  # pyright: ignore
+    model = LabelPrediction(token="347", label="VOLUME", start=0, end=3)
+    assert label.to_model() == model
+    assert label.to_model().model_fields_set == model.model_fields_set
+    assert label.to_model().span == (0, 3)
+
+
+def test_public_functions_return_models():
+    text = "See 42 U.S.C. § 1983."
+    tokens = [
+        "[CLS]",
+        "See",
+        "42",
+        "U",
+        ".",
+        "S",
+        ".",
+        "C",
+        ".",
+        "§",
+        "1983",
+        ".",
+        "[SEP]",
+    ]
+    ids = [
+        "O",
+        "O",
+        "B-TITLE",
+        "B-CODE",
+        "I-CODE",
+        "I-CODE",
+        "I-CODE",
+        "I-CODE",
+        "I-CODE",
+        "O",
+        "B-SECTION",
+        "O",
+        "O",
+    ]
+    offsets = [
+        [0, 0],
+        [0, 3],
+        [4, 6],
+        [7, 8],
+        [8, 9],
+        [9, 10],
+        [10, 11],
+        [11, 12],
+        [12, 13],
+        [14, 15],
+        [16, 20],
+        [20, 21],
+        [0, 0],
+    ]
+    records = decode_batch([tokens], [[LABEL_MAP[i] for i in ids]], [offsets])[0]
+    assert all(type(label) is Label for label in records)
+    models = [label.to_model() for label in records]
+
+    assert aggregate_entities(records, text) == aggregate_entities(models, text)
+    assert all(type(e) is LabelPrediction for e in aggregate_entities(records, text))
+    cit = labels_to_cit(records, text)
+    assert cit == labels_to_cit(models, text)
+    assert isinstance(cit, StatuteCitation) and (cit.start, cit.end) == (4, 20)
+
+    (shifted,) = sentences_to_citations([(100, text)], [records])
+    assert isinstance(shifted, StatuteCitation) and shifted.span == (104, 120)
+
+
+def test_infer_labels_batch_returns_models(tiny_model, tiny_tokenizer):
+    (labels,) = infer_labels_batch(["See 410 U.S. 113."], tiny_model, tiny_tokenizer)
+    assert all(type(label) is LabelPrediction for label in labels)
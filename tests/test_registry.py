@@ -0,0 +1,132 @@
+import copy
+import threading
+
+import pytest
+
+from src.cit_parser.registry import ModelRegistry, estimate_model_mb, model_memory_mb
+
+
+@pytest.fixture
+def loads(tiny_model, tiny_tokenizer):
+    """
+    Loaders handing out fresh copies of the tiny model; "other-vocab/..." models get a tokenizer
+    with a different vocabulary.
+    """
+    seen = []
+
+    def model_loader(name, revision):
+        seen.append((name, revision))
+        return copy.deepcopy(tiny_model)
+
+    def tokenizer_loader(name, revision):
+        tokenizer = copy.deepcopy(tiny_tokenizer)
+        if name.startswith("other-vocab/"):
+            tokenizer.add_tokens(["§§"])
+        return tokenizer
+
+    return seen, model_loader, tokenizer_loader
+
+
+def test_loads_on_demand(loads, tiny_model):
+    seen, model_loader, tokenizer_loader = loads
+    registry = ModelRegistry(None, model_loader, tokenizer_loader)
+    registry.register("ca", "org/legal-bert-ca", revision="v2")
+
+    model, _ = registry.get("ca")
+    assert registry.get("org/legal-bert-ca", "v2")[0] is model
+    assert registry.get("ca", revision="v3")[0] is not model
+    assert seen == [("org/legal-bert-ca", "v2"), ("org/legal-bert-ca", "v3")]
+    assert registry.loaded() == ["org/legal-bert-ca@v2", "org/legal-bert-ca@v3"]
+    assert registry.memory_mb() == pytest.approx(2 * model_memory_mb(tiny_model))
+
+
+def test_evicts_least_recently_used(loads, tiny_model):
+    seen, model_loader, tokenizer_loader = loads
+    budget = 2.5 * model_memory_mb(tiny_model)
+    registry = ModelRegistry(budget, model_loader, tokenizer_loader)
+
+    registry.get("a")
+    registry.get("b")
+    registry.get("a")  # now "b" is the least recently used
+    registry.get("c")
+    assert registry.loaded() == ["a", "c"]
+    assert registry.evictions == 1
+
+    registry.get("b")
+    assert registry.loaded() == ["c", "b"]
+    assert [name for name, _ in seen] == ["a", "b", "c", "b"]
+
+    assert registry.evict("c")
+    assert not registry.evict("c")
+
+
+def test_evicts_before_loading(loads, tiny_model):
+    _, model_loader, tokenizer_loader = loads
+    size = model_memory_mb(tiny_model)
+    resident = []
+
+    def recording_loader(name, revision):
+        resident.append(registry.loaded())
+        return model_loader(name, revision)
+
+    registry = ModelRegistry(
+        2.5 * size, recording_loader, tokenizer_loader, lambda name, revision: size
+    )
+    for name in "abc":
+        registry.get(name)
+    # "a" made way for "c" before "c" was loaded, so the budget was never exceeded.
+    assert resident == [[], ["a"], ["b"]]
+    assert registry.loaded() == ["b", "c"]
+
+
+def test_estimate_model_mb(tmp_path, tiny_model):
+    tiny_model.save_pretrained(tmp_path, safe_serialization=True)
+    estimate = estimate_model_mb(str(tmp_path))
+    assert estimate == pytest.approx(model_memory_mb(tiny_model), rel=0.1)
+    assert estimate_model_mb(str(tmp_path / "missing")) is None
+    assert estimate_model_mb("org/not-in-the-cache") is None
+
+
+def test_model_over_budget_is_served_alone(loads):
+    _, model_loader, tokenizer_loader = loads
+    registry = ModelRegistry(0.001, model_loader, tokenizer_loader)
+    registry.get("a")
+    registry.get("b")
+    assert registry.loaded() == ["b"]
+
+
+def test_shares_identical_tokenizers(loads):
+    _, model_loader, tokenizer_loader = loads
+    registry = ModelRegistry(None, model_loader, tokenizer_loader)
+    _, a = registry.get("org/a")
+    _, b = registry.get("org/b")
+    _, other = registry.get("other-vocab/c")
+    assert a is b
+    assert other is not a
+
+    # The shared tokenizer outlives one of its users.
+    registry.evict("org/a")
+    assert registry.get("org/b")[1] is b
+
+
+def test_concurrent_requests_load_once(loads):
+    seen, model_loader, tokenizer_loader = loads
+    release = threading.Event()
+
+    def slow_loader(name, revision):
+        release.wait(5)
+        return model_loader(name, revision)
+
+    registry = ModelRegistry(None, slow_loader, tokenizer_loader)
+    models = []
+    threads = [
+        threading.Thread(target=lambda: models.append(registry.get("a")[0]))
+        for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert len(seen) == 1
+    assert len({id(m) for m in models}) == 1
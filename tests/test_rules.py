@@ -0,0 +1,105 @@
+import sys
+from typing import List
+
+import pytest
+
+from src.cit_parser import CaselawCitation, StatuteCitation
+from src.cit_parser.cascade import CascadeReport, invoke_cascade
+from src.cit_parser.rules import extract_canonical, needs_model
+from src.cit_parser.types import Citation
+
+
+@pytest.mark.parametrize(
+    ["text", "expected"],
+    [
+        (
+            "In the landmark case of Brown v. Board of Education, 347 U.S. 483 (1954), "
+            "the Court held.",
+            [
+                CaselawCitation(
+                    case_name="Brown v. Board of Education",
+                    volume=347,
+                    reporter="U.S.",
+                    starting_page=483,
+                    year=1954,
+                    start=24,
+                    end=72,
+                )
+            ],
+        ),
+        (
+            "See Doe v. Smith, 456 F. Supp. 2d 101, 105 (S.D.N.Y. 2000); "
+            "42 U.S.C. § 1983.",
+            [
+                CaselawCitation(
+                    case_name="Doe v. Smith",
+                    volume=456,
+                    reporter="F. Supp. 2d",
+                    starting_page=101,
+                    raw_pin_cite="105",
+                    raw_court="S.D.N.Y.",
+                    year=2000,
+                    start=4,
+                    end=58,
+                ),
+                StatuteCitation(
+                    title="42", code="U.S.C.", section="1983", start=60, end=76
+                ),
+            ],
+        ),
+        (
+            "shall do pursuant to Cal. Civ. Code § 1080 (2021)",
+            [
+                StatuteCitation(
+                    code="Cal. Civ. Code", section="1080", year=2021, start=21, end=49
+                )
+            ],
+        ),
+        # Unknown reporter: left for the model
+        ("Doe v. Smith, 12 Crim. L. Enjoyers 4 (1990).", []),
+        ("Id. at 490.", []),
+    ],
+)
+def test_extract_canonical(text: str, expected: List[Citation]):
+    cits, _ = extract_canonical(text)
+    assert cits == expected
+    assert [(c.start, c.end) for c in cits] == [(e.start, e.end) for e in expected]
+
+
+@pytest.mark.parametrize(
+    ["text", "expected"],
+    [
+        ("Roe v. Wade, 410 U.S. 113 (1973).", False),
+        ("Roe v. Wade, 410 U.S. 113 (1973); Id. at 120.", True),
+        ("The motion is denied.", False),
+        ("Jones, supra, held otherwise.", True),
+    ],
+)
+def test_needs_model(text: str, expected: bool):
+    _, residue = extract_canonical(text)
+    assert len(residue) == len(text)
+    assert needs_model(residue) == expected
+
+
+def test_cascade_report(monkeypatch):
+    cascade = sys.modules["src.cit_parser.cascade"]
+    monkeypatch.setattr(
+        cascade,
+        "segment",
+        lambda text: [
+            (0, "The motion is denied."),
+            (22, "Roe v. Wade, 410 U.S. 113 (1973)."),
+        ],
+    )
+    report = CascadeReport()
+    cits = invoke_cascade("ignored", report=report)
+
+    assert len(cits) == 1
+    assert (cits[0].start, cits[0].end) == (22, 54)
+    assert (report.sentences, report.rules, report.skipped, report.model) == (
+        2,
+        1,
+        1,
+        0,
+    )
+    assert report.fractions == {"rules": 0.5, "skipped": 0.5, "model": 0.0}
@@ -0,0 +1,120 @@
+import sys
+
+import pytest
+import spacy
+
+from src.cit_parser import LabelPrediction
+from src.cit_parser.invoke import (
+    _chunks,
+    invoke,
+    invoke_doc,
+    invoke_offsets,
+    segment_many,
+)
+
+
+@pytest.mark.parametrize(
+    ["text", "max_length", "expected"],
+    [
+        ("short", 10, [(0, "short")]),
+        ("aaaa\n\nbbbb cc", 10, [(0, "aaaa\n\n"), (6, "bbbb cc")]),
+        ("aaa bbb ccc", 8, [(0, "aaa bbb "), (8, "ccc")]),
+        ("abcdefghij", 4, [(0, "abcd"), (4, "efgh"), (8, "ij")]),
+    ],
+)
+def test_chunks(text, max_length, expected):
+    assert _chunks(text, max_length) == expected
+
+
+def test_segment_many(blank_nlp):
+    texts = ["First one. Second one.", "", "Only one here."]
+    assert list(segment_many(texts, batch_size=2)) == [
+        [(0, "First one."), (11, "Second one.")],
+        [],
+        [(0, "Only one here.")],
+    ]
+
+
+def test_long_documents_keep_offsets(blank_nlp):
+    paragraph = "The motion is denied. See 42 U.S.C. § 1983.\n\n"
+    texts = [paragraph * 30, "Short.", paragraph * 7]
+    contexts = [object() for _ in texts]
+
+    results = list(segment_many(zip(texts, contexts), as_tuples=True, max_length=200))
+    assert [context for _, context in results] == contexts
+    for text, (sentences, _) in zip(texts, results):
+        assert sentences
+        for start, sentence in sentences:
+            assert text[start : start + len(sentence)] == sentence
+
+    # Pieces end at paragraph breaks, so nothing is split mid-sentence.
+    unchunked = [s.text.strip() for s in blank_nlp(texts[0]).sents]
+    chunked = [s.strip() for _, s in results[0][0]]
+    assert [s for s in chunked if s] == [s for s in unchunked if s]
+
+
+TEXT = (
+    "See Roe v. Wade, 410 U.S. 113 (1973). Id. at 120. "
+    "Relief under 42 U.S.C. § 1983 is denied. Cf. Smith v. Jones, 12 F.3d 1, 4 (9th Cir. 1994)."
+)
+
+
+def test_presegmented_input_skips_segmentation(
+    blank_nlp, monkeypatch, tiny_model, tiny_tokenizer
+):
+    doc = blank_nlp(TEXT)
+    expected = invoke(TEXT, tiny_model, tiny_tokenizer)
+
+    def no_nlp():
+        raise AssertionError("segmented again")
+
+    no_nlp.cache_info = lambda: None
+    monkeypatch.setattr(sys.modules["src.cit_parser.invoke"], "_nlp", no_nlp)
+
+    assert invoke_doc(doc, tiny_model, tiny_tokenizer) == expected
+    assert invoke_doc(list(doc.sents), tiny_model, tiny_tokenizer) == expected
+    offsets = [(sent.start_char, sent.end_char) for sent in doc.sents]
+    assert invoke_offsets(TEXT, offsets, tiny_model, tiny_tokenizer) == expected
+
+
+def test_doc_without_sentences(tiny_model, tiny_tokenizer):
+    with pytest.raises(ValueError, match="sentence boundaries"):
+        invoke_doc(spacy.blank("en")(TEXT), tiny_model, tiny_tokenizer)
+
+
+@pytest.mark.parametrize("offsets", [[(-1, 5)], [(5, 4)], [(0, len(TEXT) + 1)]])
+def test_offsets_out_of_bounds(offsets, tiny_model, tiny_tokenizer):
+    with pytest.raises(ValueError, match="out of bounds"):
+        invoke_offsets(TEXT, offsets, tiny_model, tiny_tokenizer)
+
+
+def test_invoke_offsets_are_document_absolute(blank_nlp, monkeypatch, tiny_model):
+    # Until the CLI was added, `invoke()` returned offsets relative to each citation's sentence.
+    def fake_labels(texts, *args):
+        res = []
+        for sentence in texts:
+            labels = []
+            for token, label in [
+                ("42", "B-TITLE"),
+                ("U.S.C.", "B-CODE"),
+                ("1983", "B-SECTION"),
+            ]:
+                start = sentence.find(token)
+                if start >= 0:
+                    labels.append(
+                        LabelPrediction(
+                            token=token,
+                            label=label,
+                            start=start,
+                            end=start + len(token),
+                        )
+                    )
+            res.append(labels)
+        return res
+
+    monkeypatch.setattr(
+        sys.modules["src.cit_parser.invoke"], "_infer_labels_batch", fake_labels
+    )
+    (cit,) = invoke(TEXT, tiny_model)
+    assert cit.start == TEXT.index("42 U.S.C.") > 0
+    assert TEXT[cit.start : cit.end].startswith("42 U.S.C. § 1983")
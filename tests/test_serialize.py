@@ -0,0 +1,123 @@
+import io
+from typing import List
+
+from pydantic_core import from_json, to_json
+
+from src.cit_parser import Authorities, CaselawCitation, StatuteCitation
+from src.cit_parser.serialize import (
+    authority_key,
+    read_authorities,
+    read_citation_records,
+    read_citations,
+    write_authorities,
+    write_citations,
+)
+from src.cit_parser.types import Citation
+
+CITATIONS: List[Citation] = [
+    CaselawCitation(
+        case_name="Brown v. Board of Education",
+        volume=347,
+        reporter="U.S.",
+        starting_page=483,
+        raw_pin_cite="484",
+        year=1954,
+        start=0,
+        end=37,
+    ),
+    CaselawCitation(
+        case_name="Brown",
+        volume=347,
+        reporter="U. S.",
+        raw_pin_cite="490",
+        start=50,
+        end=65,
+    ),
+    StatuteCitation(title="42", code="U.S.C.", section="1983", start=70, end=86),
+    StatuteCitation(section="1983", start=90, end=96),
+    StatuteCitation(
+        code="Cal. Civ. Code", section="1080", year=2021, start=100, end=127
+    ),
+]
+
+
+def _fields(c: Citation):
+    return c.model_dump(), c.span
+
+
+def test_citations_round_trip():
+    buf = io.StringIO()
+    assert write_citations(CITATIONS, buf) == len(CITATIONS)
+    buf.seek(0)
+
+    result = list(read_citations(buf))
+    assert [_fields(c) for c in result] == [_fields(c) for c in CITATIONS]
+    assert [type(c) for c in result] == [type(c) for c in CITATIONS]
+
+
+def test_citations_match_validated_models():
+    buf = io.StringIO()
+    write_citations(CITATIONS, buf)
+    buf.seek(0)
+
+    for result, expected in zip(read_citations(buf), CITATIONS):
+        validated = type(expected).model_validate(expected.model_dump())
+        assert result == validated
+        assert type(result.citation_type) is type(validated.citation_type)
+
+
+def test_citations_without_canonical_fields():
+    # JSONL written before canonical names were stored.
+    buf = io.StringIO()
+    write_citations(CITATIONS, buf)
+    lines = []
+    for line in buf.getvalue().splitlines():
+        record = from_json(line)
+        record.pop("canonical_reporter", None)
+        record.pop("canonical_code", None)
+        lines.append(to_json(record).decode())
+
+    result = list(read_citations(io.StringIO("\n".join(lines))))
+    assert [_fields(c) for c in result] == [_fields(c) for c in CITATIONS]
+    assert result[1].canonical_reporter == "U.S."
+    assert result[2].canonical_code == "U.S.C."
+
+
+def test_citations_extra_fields():
+    buf = io.StringIO()
+    write_citations(CITATIONS[:2], buf, extra={"doc_id": "a.txt"})
+    buf.seek(0)
+
+    records = list(read_citation_records(buf))
+    assert [extra for _, extra in records] == [{"doc_id": "a.txt"}] * 2
+    assert [c for c, _ in records] == CITATIONS[:2]
+
+
+def test_authorities_round_trip():
+    authorities = Authorities.construct(CITATIONS)
+    buf = io.StringIO()
+    write_authorities(authorities, buf)
+    buf.seek(0)
+
+    ids = [
+        line.split('"id":"')[1].split('"')[0] for line in buf.getvalue().splitlines()
+    ]
+    assert ids == [
+        "case:347:U.S.:483",
+        "statute:U.S.C.:1983",
+        "statute:Cal. Civ. Code:1080",
+    ]
+
+    result = read_authorities(buf)
+    assert result.caselaw == authorities.caselaw
+    assert result.statutes == authorities.statutes
+    for authority, members in authorities.caselaw.items():
+        assert [_fields(c) for c in result.caselaw[authority]] == [
+            _fields(c) for c in members
+        ]
+
+
+def test_authority_key_is_canonical():
+    assert authority_key(CITATIONS[0]) == authority_key(
+        CITATIONS[0].model_copy(update={"reporter": "U. S."})
+    )
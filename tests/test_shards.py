@@ -0,0 +1,139 @@
+import multiprocessing
+import time
+
+import pytest
+
+from src.cit_parser.corpus import BACKENDS, resolve_inputs
+from src.cit_parser.serialize import read_citation_records
+from src.cit_parser.shards import (
+    DONE,
+    FAILED,
+    PENDING,
+    ShardQueue,
+    merge_authorities,
+    reduce_job,
+    run_worker,
+)
+from src.cit_parser.types import Authorities, StatuteCitation
+
+from .test_checkpoint import section_backend
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    corpus = tmp_path / "corpus"
+    corpus.mkdir()
+    for i in range(7):
+        (corpus / f"{i}.txt").write_text(f"See § {i % 3} and § 1983")
+    return corpus
+
+
+def failing_backend(replica, text, batch_size):
+    raise RuntimeError("model failed")
+
+
+def spawned_worker(job_dir, model, tokenizer, worker_id):
+    BACKENDS["sections"] = section_backend
+    run_worker(job_dir, model, tokenizer, worker_id=worker_id, idle_seconds=0.05)
+
+
+def test_merge_authorities_keeps_fullest_statute():
+    short = StatuteCitation(section="1983", start=0, end=6)
+    full = StatuteCitation(title="42", code="U.S.C.", section="1983", start=3, end=19)
+    merged = merge_authorities(
+        [Authorities.construct([short]), Authorities.construct([full, short])]
+    )
+    assert list(merged.statutes) == [full]
+    assert len(merged.statutes[full]) == 3
+
+
+def test_claims_are_exclusive_and_leases_expire(corpus, tmp_path):
+    queue = ShardQueue.create(
+        tmp_path / "job", resolve_inputs([str(corpus)]), shard_size=3, max_attempts=2
+    )
+    assert queue.status()[PENDING] == 3
+
+    a = queue.claim("a", lease_seconds=60)
+    b = queue.claim("b", lease_seconds=0)
+    assert (a.id, b.id) == (0, 1)
+    assert [doc_id for doc_id, _ in a.documents] == ["0.txt", "1.txt", "2.txt"]
+
+    # b's lease has expired: c takes the shard over and b can no longer renew it.
+    time.sleep(0.01)
+    c = queue.claim("c", lease_seconds=0)
+    assert (c.id, c.attempts) == (1, 2)
+    assert not queue.renew(b, "b")
+
+    # Out of attempts on shard 1, so shard 2 is next.
+    time.sleep(0.01)
+    assert queue.claim("d").id == 2
+    assert queue.status() == {PENDING: 0, "leased": 2, DONE: 0, FAILED: 1}
+
+    queue.complete(a, "a")
+    assert queue.status()[DONE] == 1
+
+
+def test_failed_shards_are_retried_then_given_up(
+    monkeypatch, corpus, tmp_path, tiny_model, tiny_tokenizer
+):
+    monkeypatch.setitem(BACKENDS, "failing", failing_backend)
+    job_dir = tmp_path / "job"
+    ShardQueue.create(
+        job_dir, resolve_inputs([str(corpus)]), shard_size=10, backend="failing"
+    )
+    report = run_worker(job_dir, tiny_model, tiny_tokenizer)
+    assert (report.shards, report.failed_shards) == (0, 3)
+    with pytest.raises(RuntimeError, match="model failed"):
+        reduce_job(job_dir)
+
+
+def test_refuses_another_model(corpus, tmp_path, tiny_model):
+    job_dir = tmp_path / "job"
+    queue = ShardQueue.create(job_dir, resolve_inputs([str(corpus)]))
+    queue.check_model("org/other@abc")
+    with pytest.raises(ValueError):
+        run_worker(job_dir, model=tiny_model)
+
+
+def test_local_processes_share_the_job(
+    monkeypatch, corpus, tmp_path, tiny_model, tiny_tokenizer
+):
+    monkeypatch.setitem(BACKENDS, "sections", section_backend)
+    job_dir = tmp_path / "job"
+    ShardQueue.create(
+        job_dir, resolve_inputs([str(corpus)]), shard_size=2, backend="sections"
+    )
+
+    context = multiprocessing.get_context("spawn")
+    workers = [
+        context.Process(
+            target=spawned_worker,
+            args=(
+                job_dir,
+                tiny_model,
+                tiny_tokenizer,
+                f"w{i}",
+            ),
+        )
+        for i in range(2)
+    ]
+    for worker in workers:
+        worker.start()
+    # This process works on the job too.
+    run_worker(job_dir, tiny_model, tiny_tokenizer, worker_id="main", idle_seconds=0.05)
+    for worker in workers:
+        worker.join(60)
+    assert [worker.exitcode for worker in workers] == [0, 0]
+    assert ShardQueue(job_dir).status()[DONE] == 4
+
+    authorities, n_citations = reduce_job(job_dir)
+    assert n_citations == 14
+    assert {a.section: len(m) for a, m in authorities.statutes.items()} == {
+        "0": 3,
+        "1": 2,
+        "2": 2,
+        "1983": 7,
+    }
+    with open(job_dir / "citations.jsonl") as fp:
+        doc_ids = [extra["doc_id"] for _, extra in read_citation_records(fp)]
+    assert doc_ids == [f"{i}.txt" for i in range(7) for _ in range(2)]
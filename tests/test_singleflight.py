@@ -0,0 +1,138 @@
+import asyncio
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from src.cit_parser.singleflight import (
+    SingleFlight,
+    ainvoke_coalesced,
+    invoke_coalesced,
+)
+from src.cit_parser.types import StatuteCitation
+
+
+@pytest.fixture
+def slow_invoke(monkeypatch):
+    """
+    Replaces `invoke` with a slow stand-in that records every text it runs on.
+    """
+    calls = []
+    release = threading.Event()
+
+    def invoke(text, model, tokenizer, batch_size):
+        calls.append(text)
+        release.wait(5)
+        if text == "boom":
+            raise RuntimeError("model failed")
+        return [StatuteCitation(section=text, start=0, end=len(text))]
+
+    monkeypatch.setattr(sys.modules["src.cit_parser.singleflight"], "invoke", invoke)
+    return calls, release
+
+
+def wait_for(condition):
+    deadline = time.monotonic() + 5
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+
+def test_concurrent_calls_share_one_flight(slow_invoke):
+    calls, release = slow_invoke
+    flight = SingleFlight()
+    results = []
+
+    def call(text):
+        results.append(invoke_coalesced(text, flight=flight))
+
+    threads = [threading.Thread(target=call, args=(t,)) for t in ["a"] * 4 + ["b"]]
+    for thread in threads:
+        thread.start()
+    wait_for(lambda: flight.calls == 5)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(calls) == ["a", "b"]
+    assert (flight.calls, flight.coalesced, flight.in_flight()) == (5, 3, 0)
+    assert sorted(r[0].section for r in results) == ["a"] * 4 + ["b"]
+    # Every caller gets its own list.
+    assert len({id(r) for r in results}) == 5
+
+
+def test_completed_flights_are_not_cached(slow_invoke):
+    calls, release = slow_invoke
+    release.set()
+    flight = SingleFlight()
+    invoke_coalesced("a", flight=flight)
+    invoke_coalesced("a", flight=flight)
+    assert calls == ["a", "a"]
+    assert flight.coalesced == 0
+
+
+def test_errors_reach_every_caller(slow_invoke):
+    calls, release = slow_invoke
+    flight = SingleFlight()
+    errors = []
+
+    def call():
+        try:
+            invoke_coalesced("boom", flight=flight)
+        except RuntimeError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    wait_for(lambda: flight.calls == 3)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert calls == ["boom"]
+    assert len(errors) == 3
+
+
+def test_async_and_sync_callers_share_flights(slow_invoke):
+    calls, release = slow_invoke
+    flight = SingleFlight()
+    sync_result = []
+
+    async def main():
+        tasks = [
+            asyncio.create_task(ainvoke_coalesced("a", flight=flight)) for _ in range(3)
+        ]
+        await asyncio.sleep(0)
+        thread = threading.Thread(
+            target=lambda: sync_result.append(invoke_coalesced("a", flight=flight))
+        )
+        thread.start()
+        await asyncio.to_thread(wait_for, lambda: flight.calls == 4)
+        release.set()
+        results = await asyncio.gather(*tasks)
+        thread.join()
+        return results
+
+    results = asyncio.run(main())
+    assert calls == ["a"]
+    assert flight.coalesced == 3
+    assert [r[0].section for r in results + sync_result] == ["a"] * 4
+
+
+def test_executor_failures_end_the_flight(slow_invoke):
+    calls, release = slow_invoke
+    release.set()
+    flight = SingleFlight()
+    executor = ThreadPoolExecutor(1)
+    executor.shutdown()
+
+    async def main():
+        with pytest.raises(RuntimeError):
+            await ainvoke_coalesced("a", flight=flight, executor=executor)
+        assert flight.in_flight() == 0
+        return await ainvoke_coalesced("a", flight=flight)
+
+    assert asyncio.run(main())[0].section == "a"
+    assert calls == ["a"]
@@ -0,0 +1,111 @@
+import random
+
+import pytest
+
+from src.cit_parser.spans import SpanIndex
+from src.cit_parser.types import StatuteCitation
+
+
+def cite(start, end, section="1983"):
+    return StatuteCitation(code="U.S.C.", section=section, start=start, end=end)
+
+
+@pytest.fixture
+def citations():
+    rng = random.Random(0)
+    res = []
+    for i in range(200):
+        start = rng.randrange(5000)
+        res.append(cite(start, start + rng.randrange(1, 60), section=str(i)))
+    # One citation spanning almost everything.
+    res.append(cite(10, 4900, section="long"))
+    return res
+
+
+def distance(c, offset):
+    if c.start <= offset < c.end:
+        return 0
+    return c.start - offset if c.start > offset else offset - c.end + 1
+
+
+def test_matches_linear_scan(citations):
+    index = SpanIndex(citations)
+    rng = random.Random(1)
+    for _ in range(300):
+        offset = rng.randrange(-10, 5100)
+        assert sorted(index.at(offset), key=lambda c: c.span) == sorted(
+            (c for c in citations if c.start <= offset < c.end), key=lambda c: c.span
+        )
+
+        start, end = sorted((offset, rng.randrange(5100)))
+        overlapping = [c for c in citations if c.start < end and c.end > start]
+        assert {c.section for c in index.overlapping(start, end)} == {
+            c.section for c in overlapping
+        }
+        inside = [c for c in citations if start <= c.start and c.end <= end]
+        assert {c.section for c in index.within(start, end)} == {
+            c.section for c in inside
+        }
+
+        nearest = index.nearest(offset)
+        assert distance(nearest, offset) == min(distance(c, offset) for c in citations)
+
+
+def test_queries():
+    index = SpanIndex([cite(20, 30), cite(0, 10), cite(5, 25)])
+    assert [c.span for c in index] == [(0, 10), (5, 25), (20, 30)]
+    assert [c.span for c in index.at(7)] == [(0, 10), (5, 25)]
+    assert index.at(30) == []
+    assert [c.span for c in index.overlapping(9, 21)] == [(0, 10), (5, 25), (20, 30)]
+    assert [c.span for c in index.within(0, 26)] == [(0, 10), (5, 25)]
+    assert index.nearest(40).span == (20, 30)  # type: ignore
+    assert SpanIndex().nearest(3) is None
+
+
+def test_updates():
+    long_one = cite(0, 100)
+    index = SpanIndex([long_one, cite(200, 210)])
+    index.add(cite(150, 160))
+    assert [c.span for c in index.at(155)] == [(150, 160)]
+
+    index.remove(long_one)
+    assert index.at(50) == []
+    with pytest.raises(KeyError):
+        index.remove(long_one)
+
+    index.replace(cite(150, 160), cite(150, 165, section="1985"))
+    assert [c.section for c in index.at(162)] == ["1985"]
+
+    # Ten characters inserted at offset 170.
+    index.shift(170, 10)
+    assert index.spans() == [(150, 165), (210, 220)]
+    assert index.at(215)[0].span == (210, 220)
+
+
+def test_shift_deletes():
+    index = SpanIndex(
+        [cite(0, 10), cite(12, 18), cite(20, 30), cite(25, 40), cite(50, 60)]
+    )
+    # Characters 15 to 35 deleted: the citations starting there go with them.
+    index.shift(15, -20)
+    assert index.spans() == [(0, 10), (12, 18), (30, 40)]
+    assert index.at(32)[0].span == (30, 40)
+    assert index.nearest(25).span == (30, 40)  # type: ignore
+
+
+def test_updates_match_linear_scan(citations):
+    index = SpanIndex()
+    rng = random.Random(2)
+    expected = []
+    for c in citations:
+        index.add(c)
+        expected.append(c)
+        if rng.random() < 0.3:
+            removed = expected.pop(rng.randrange(len(expected)))
+            index.remove(removed)
+        offset = rng.randrange(5000)
+        assert {c.section for c in index.at(offset)} == {
+            c.section for c in expected if c.start <= offset < c.end
+        }
+        nearest = index.nearest(offset)
+        assert distance(nearest, offset) == min(distance(c, offset) for c in expected)
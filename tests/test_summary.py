@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+
+from src.cit_parser.serialize import authority_key
+from src.cit_parser.summary import AuthoritySummary, summarize
+from src.cit_parser.types import CaselawCitation, StatuteCitation
+
+
+def roe(start, short=False):
+    return CaselawCitation(
+        case_name="Roe v. Wade",
+        volume=410,
+        reporter="U.S.",
+        starting_page=None if short else 113,
+        year=None if short else 1973,
+        start=start,
+        end=start + 10,
+    )
+
+
+def section(start):
+    return StatuteCitation(
+        title="42", code="U.S.C.", section="1983", start=start, end=start + 5
+    )
+
+
+ROE = authority_key(roe(0))
+SECTION = authority_key(section(0))
+
+DOCUMENTS = [
+    ("a", [roe(5), section(40), roe(80, short=True)]),
+    ("b", [section(3)]),
+    ("c", []),
+    ("d", [section(7), roe(12), section(30)]),
+]
+
+
+@pytest.mark.parametrize("keep_spans", [False, True])
+def test_counts_positions_and_frequencies(keep_spans):
+    summary = summarize(DOCUMENTS, keep_spans=keep_spans)
+    assert (len(summary), summary.n_documents, summary.n_citations) == (2, 4, 7)
+
+    roe_stats = summary[ROE]
+    assert (roe_stats.count, roe_stats.documents) == (3, 2)
+    assert (roe_stats.first, roe_stats.last) == ((0, 5), (3, 12))
+    assert roe_stats.authority.starting_page == 113
+
+    section_stats = summary[SECTION]
+    assert (section_stats.count, section_stats.documents) == (4, 3)
+    assert (section_stats.first, section_stats.last) == ((0, 40), (3, 30))
+    assert summary.doc_id(section_stats.last[0]) == "d"
+
+    assert [s.key for s in summary.top(1)] == [SECTION]
+    assert [s.key for s in summary.top(2, by="documents")] == [SECTION, ROE]
+
+
+def test_spans():
+    summary = summarize(DOCUMENTS, keep_spans=True)
+    assert summary.spans(ROE).tolist() == [[0, 5, 15], [0, 80, 90], [3, 12, 22]]
+    with pytest.raises(ValueError):
+        summarize(DOCUMENTS).spans(ROE)
+
+
+def test_merge_equals_single_pass():
+    whole = summarize(DOCUMENTS, keep_spans=True)
+    merged = summarize(DOCUMENTS[:2], keep_spans=True)
+    merged.merge(summarize(DOCUMENTS[2:], keep_spans=True))
+    assert merged.n_documents == whole.n_documents
+    for key in (ROE, SECTION):
+        assert repr(merged[key]) == repr(whole[key])
+        assert np.array_equal(merged.spans(key), whole.spans(key))
+
+
+def test_save_and_load(tmp_path):
+    summary = summarize(DOCUMENTS)
+    summary.save(tmp_path / "summary.jsonl")
+    loaded = AuthoritySummary.load(tmp_path / "summary.jsonl")
+    assert [repr(s) for s in loaded] == [repr(s) for s in summary]
+    assert loaded.doc_id(1) == "b"
+    assert loaded[ROE].authority == summary[ROE].authority
+
+
+def test_memory_grows_with_authorities_not_citations():
+    summary = AuthoritySummary()
+    for i in range(1000):
+        summary.add_citations(str(i), [section(j) for j in range(0, 50, 5)])
+    assert len(summary) == 1
+    assert summary.n_citations == 10000
+    assert len(summary._authorities) == 1
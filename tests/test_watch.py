@@ -0,0 +1,153 @@
+import json
+import sys
+import threading
+import time
+
+import pytest
+
+from src.cit_parser.watch import (
+    InotifyWatcher,
+    PollingWatcher,
+    WatchDaemon,
+    open_watcher,
+)
+
+
+def wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def collect(watcher, until, timeout=5):
+    seen = []
+    deadline = time.monotonic() + timeout
+    while not until(seen) and time.monotonic() < deadline:
+        seen.extend(watcher.changes(0.05))
+    return seen
+
+
+def test_polling_waits_for_stable_files(tmp_path):
+    watcher = PollingWatcher([tmp_path], interval=0.01)
+    (tmp_path / "a.txt").write_text("one")
+    (tmp_path / ".a.txt.tmp").write_text("partial")
+    (tmp_path / "a.txt.citations.jsonl").write_text("")
+    assert watcher.changes(1) == []  # first sighting
+    assert watcher.changes(1) == [tmp_path / "a.txt"]
+    assert watcher.changes(1) == []
+
+    (tmp_path / "a.txt").write_text("one, and then some more")
+    assert collect(watcher, lambda seen: seen) == [tmp_path / "a.txt"]
+
+
+@pytest.mark.skipif(
+    not sys.platform.startswith("linux"), reason="inotify is Linux only"
+)
+def test_inotify_reports_closed_and_moved_files(tmp_path):
+    (tmp_path / "old.txt").write_text("already there")
+    with InotifyWatcher([tmp_path]) as watcher:
+        assert watcher.changes(0) == [tmp_path / "old.txt"]
+
+        (tmp_path / "new.txt").write_text("written")
+        (tmp_path / "ignored.pdf").write_text("other pattern")
+        assert collect(watcher, lambda seen: seen) == [tmp_path / "new.txt"]
+
+        # A file moved in, and a subdirectory created with a file inside.
+        staging = tmp_path.parent / f"{tmp_path.name}-staging.txt"
+        staging.write_text("moved")
+        staging.rename(tmp_path / "moved.txt")
+        (tmp_path / "sub").mkdir()
+        (tmp_path / "sub" / "deep.txt").write_text("nested")
+        seen = collect(watcher, lambda seen: len(set(seen)) >= 2)
+        assert set(seen) == {tmp_path / "moved.txt", tmp_path / "sub" / "deep.txt"}
+
+
+def test_open_watcher_polls_on_request(tmp_path):
+    assert isinstance(open_watcher([tmp_path], poll_interval=0.1), PollingWatcher)
+
+
+@pytest.mark.parametrize("poll_interval", [None, 0.05])
+def test_daemon_processes_new_files(
+    tmp_path, tiny_model, tiny_tokenizer, poll_interval
+):
+    inbox, out = tmp_path / "inbox", tmp_path / "out"
+    inbox.mkdir()
+    (inbox / "backlog.txt").write_text("Relief under 42 U.S.C. § 1983 is denied.")
+    processed = []
+    daemon = WatchDaemon(
+        [inbox],
+        output_dir=out,
+        backend="window",
+        model=tiny_model,
+        tokenizer=tiny_tokenizer,
+        batch_window=0.05,
+        poll_interval=poll_interval,
+        on_document=lambda doc, citations: processed.append(doc.id),
+    )
+    stop = threading.Event()
+    thread = threading.Thread(target=daemon.run, args=(stop,))
+    thread.start()
+    try:
+        wait_for(lambda: processed == ["backlog.txt"])
+        (inbox / "filings").mkdir()
+        (inbox / "filings" / "new.txt").write_text("See 410 U.S. 113.")
+        wait_for(lambda: len(processed) == 2)
+    finally:
+        stop.set()
+        thread.join()
+
+    output = out / "filings" / "new.txt.citations.jsonl"
+    records = [json.loads(line) for line in output.read_text().splitlines()]
+    assert all(r["doc_id"] == "filings/new.txt" for r in records)
+    assert (out / "backlog.txt.citations.jsonl").exists()
+    assert daemon.report.documents == 2
+    assert not list(inbox.rglob("*.jsonl"))
+
+
+def test_daemon_skips_files_already_done(
+    tmp_path, tiny_model, tiny_tokenizer, blank_nlp
+):
+    (tmp_path / "a.txt").write_text("See 410 U.S. 113.")
+    (tmp_path / "b.txt").write_text("See 410 U.S. 113.")
+    daemon = WatchDaemon(
+        [tmp_path], model=tiny_model, tokenizer=tiny_tokenizer, batch_window=0.05
+    )
+    daemon.output_path(tmp_path / "a.txt").write_text("")
+    stop = threading.Event()
+    threading.Timer(0.5, stop.set).start()
+    assert daemon.run(stop).documents == 1
+    assert daemon.output_path(tmp_path / "a.txt").read_text() == ""
+
+
+def test_daemon_keeps_directories_apart(
+    tmp_path, tiny_model, tiny_tokenizer, blank_nlp
+):
+    filings, briefs, out = tmp_path / "filings", tmp_path / "briefs", tmp_path / "out"
+    for directory in (filings, briefs):
+        directory.mkdir()
+        (directory / "x.txt").write_text(f"See 410 U.S. 113, in {directory.name}.")
+    processed = []
+    daemon = WatchDaemon(
+        [filings, briefs],
+        output_dir=out,
+        model=tiny_model,
+        tokenizer=tiny_tokenizer,
+        batch_window=0.05,
+        on_document=lambda doc, citations: processed.append(doc.id),
+    )
+    stop = threading.Event()
+    threading.Timer(0.5, stop.set).start()
+    assert daemon.run(stop).documents == 2
+    assert sorted(processed) == ["briefs/x.txt", "filings/x.txt"]
+    assert (out / "filings" / "x.txt.citations.jsonl").exists()
+    assert (out / "briefs" / "x.txt.citations.jsonl").exists()
+
+    (tmp_path / "other" / "filings").mkdir(parents=True)
+    with pytest.raises(ValueError):
+        WatchDaemon([filings, tmp_path / "other" / "filings"])
+
+
+def test_daemon_rejects_missing_directory(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        WatchDaemon([tmp_path / "missing"])
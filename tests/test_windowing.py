@@ -0,0 +1,81 @@
+from typing import List, Tuple
+
+import pytest
+import torch
+
+from src.cit_parser import group_entities
+from src.cit_parser.constants import ALL_LABELS
+from src.cit_parser.types import LabelPrediction
+from src.cit_parser.windowing import infer_document, window_bounds
+
+
+@pytest.mark.parametrize(
+    ["n_tokens", "window", "stride", "expected"],
+    [
+        (10, 20, 5, [(0, 10)]),
+        (20, 20, 5, [(0, 20)]),
+        (30, 20, 5, [(0, 20), (15, 30)]),
+        (50, 20, 10, [(0, 20), (10, 30), (20, 40), (30, 50)]),
+    ],
+)
+def test_window_bounds(
+    n_tokens: int, window: int, stride: int, expected: List[Tuple[int, int]]
+):
+    assert window_bounds(n_tokens, window, stride) == expected
+
+
+def test_window_bounds_invalid():
+    with pytest.raises(ValueError):
+        window_bounds(100, 10, 10)
+
+
+def _entity(label: str, start: int, end: int) -> LabelPrediction:
+    return LabelPrediction(token=label.lower(), label=label, start=start, end=end)
+
+
+def test_group_entities():
+    entities = [
+        _entity("CASE_NAME", 0, 5),
+        _entity("CASE_NAME", 6, 14),
+        _entity("VOLUME", 16, 19),
+        _entity("REPORTER", 20, 24),
+        _entity("PAGE", 25, 28),
+        _entity("YEAR", 30, 34),
+        _entity("TITLE", 40, 42),
+        _entity("CODE", 43, 49),
+        _entity("SECTION", 50, 56),
+        _entity("SECTION", 150, 156),
+    ]
+    groups = [[e.label for e in g] for g in group_entities(entities)]
+    assert groups == [
+        ["CASE_NAME", "CASE_NAME", "VOLUME", "REPORTER", "PAGE", "YEAR"],
+        ["TITLE", "CODE", "SECTION"],
+        ["SECTION"],
+    ]
+
+
+def _direct_labels(text: str, model, tokenizer) -> List[Tuple[str, int, int]]:
+    inputs = tokenizer(text, return_offsets_mapping=True, return_tensors="pt")
+    offsets = inputs.pop("offset_mapping")[0].tolist()
+    with torch.no_grad():
+        predictions = model(**inputs).logits.argmax(-1)[0].tolist()
+    return [
+        (ALL_LABELS[p], start, end)
+        for p, (start, end) in zip(predictions, offsets)
+        if start != end and ALL_LABELS[p] != "O"
+    ]
+
+
+def test_infer_document_single_window_matches_direct(tiny_model, tiny_tokenizer):
+    text = "Brown v. Board, 347 U.S. 483 (1954)."
+    labels = infer_document(text, tiny_model, tiny_tokenizer)
+    assert [(p.label, p.start, p.end) for p in labels if p.label != "O"] == (
+        _direct_labels(text, tiny_model, tiny_tokenizer)
+    )
+
+
+def test_infer_document_covers_long_text(tiny_model, tiny_tokenizer):
+    text = "See 42 U.S.C. § 1983. " * 20
+    labels = infer_document(text, tiny_model, tiny_tokenizer, stride=16, batch_size=3)
+    assert all(0 <= p.start <= p.end <= len(text) for p in labels)
+    assert [p.start for p in labels] == sorted(p.start for p in labels)